@@ -0,0 +1,47 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+"""Latency of a cache hit: marker link lookup versus direct-keyed bridge lookup"""
+
+import tempfile
+import timeit
+
+from redast import CacheDrive, CacheMemory, Drive, Memory, Storage
+
+NUMBER = 10_000
+SIZE = 1024
+
+
+def link_hit(dst) -> float:
+    # the way Bridge used to resolve a cached key
+    storage = Storage(dst)
+    storage.link("key").push(b"x" * SIZE)
+    return timeit.timeit(lambda: storage.link("key").load(), number=NUMBER)
+
+
+def bridge_hit(cache) -> float:
+    cache.save("key", b"x" * SIZE)
+    return timeit.timeit(lambda: cache.load("key"), number=NUMBER)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as link_root:
+        with tempfile.TemporaryDirectory() as cache_root:
+            cases = dict(
+                CacheMemory=(
+                    lambda: link_hit(Memory()),
+                    lambda: bridge_hit(CacheMemory(Memory())),
+                ),
+                CacheDrive=(
+                    lambda: link_hit(Drive(link_root)),
+                    lambda: bridge_hit(CacheDrive(Memory(), cache_root)),
+                ),
+            )
+            for name, (before, after) in cases.items():
+                before_us = before() / NUMBER * 1e6
+                after_us = after() / NUMBER * 1e6
+                print(f"{name:12} link {before_us:8.2f} us  direct {after_us:8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
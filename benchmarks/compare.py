@@ -0,0 +1,53 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+"""Compares two results of the benchmark suite case by case
+
+    python benchmarks/compare.py before.json after.json --threshold 0.1
+
+Exits with 1 when a case got slower than the threshold, so it can guard a
+release. The median latency is compared, it is less noisy than the mean.
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+
+def load(path: Path) -> dict:
+    report = json.loads(path.read_text())
+    return {result["id"]: result for result in report["results"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before", type=Path)
+    parser.add_argument("after", type=Path)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative slowdown of the median latency that is a regression",
+    )
+    args = parser.parse_args()
+    before, after = load(args.before), load(args.after)
+    regressions = 0
+    for case_id in sorted(before.keys() & after.keys()):
+        old, new = before[case_id]["p50_us"], after[case_id]["p50_us"]
+        change = new / old - 1 if old else 0.0
+        mark = ""
+        if change > args.threshold:
+            mark = "  slower"
+            regressions += 1
+        elif change < -args.threshold:
+            mark = "  faster"
+        print(f"{case_id:56} {old:12.1f} -> {new:12.1f} us {change:+8.1%}{mark}")
+    for case_id in sorted(before.keys() ^ after.keys()):
+        side = "before" if case_id in before else "after"
+        print(f"{case_id:56} only {side}")
+    print(f"{regressions} regressions over {args.threshold:.0%}")
+    raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
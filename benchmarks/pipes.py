@@ -0,0 +1,41 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+"""Per-call overhead of a packaging chain for small objects"""
+
+import timeit
+
+from redast import Compression, Encryption, Memory, Pickling, Storage
+from redast.core.storage import Pipe
+
+NUMBER = 20_000
+DATA = {"id": 1, "name": "small"}
+
+
+def rebuilt(storage: Storage):
+    # the way every attribute access used to build the chain
+    encryption = Encryption(**storage._default["encryption"])
+    compression = Compression(**storage._default["compression"])
+    chain = Pipe(storage, encryption)
+    chain = Pipe(chain, compression)
+    return Pipe(chain, Pickling())
+
+
+def main():
+    storage = Storage(Memory())
+    key = storage.encryption.compression.pickling.push(DATA)
+    cases = dict(
+        rebuilt_access=lambda: rebuilt(storage),
+        cached_access=lambda: storage.encryption.compression.pickling,
+        rebuilt_save=lambda: rebuilt(storage).save(key, DATA),
+        cached_save=lambda: storage.encryption.compression.pickling.save(key, DATA),
+        rebuilt_load=lambda: rebuilt(storage).load(key),
+        cached_load=lambda: storage.encryption.compression.pickling.load(key),
+    )
+    for name, fn in cases.items():
+        us = timeit.timeit(fn, number=NUMBER) / NUMBER * 1e6
+        print(f"{name:16} {us:8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
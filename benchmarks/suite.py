@@ -0,0 +1,359 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+"""Offline benchmark suite of keepers, packagers, hashing and caches
+
+    python benchmarks/suite.py --output before.json
+    python benchmarks/suite.py --sizes 1KB,1MB,1GB --filter "keeper/Drive"
+    python benchmarks/compare.py before.json after.json
+
+Every case is timed call by call for about `--budget` seconds, so the
+results hold latency percentiles as well as throughput. The data is
+generated from a fixed seed, so runs on different commits are comparable.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from redast import (
+    Base64,
+    CacheDrive,
+    CacheMemory,
+    Compression,
+    Drive,
+    Encoding,
+    Encryption,
+    Json,
+    Memory,
+    NumpyArray,
+    Pack,
+    Pickling,
+    Sqlite,
+    SqliteNative,
+    Storage,
+    TieredStore,
+)
+from redast.__version__ import __version__
+from redast.core.compressors import registry as codecs
+from redast.core.dedup import Chunker
+from redast.core.hash import get_hash_fn, registry as algorithms
+from redast.core.packaging import ENCRYPTION_MODES
+
+SEED = 0
+UNITS = dict(B=1, KB=2**10, MB=2**20, GB=2**30)
+SIZES = "1KB,64KB,1MB,16MB"
+BATCH = 64
+TREE_ALGORITHMS = ("blake2b-tree", "sha256-tree")
+
+
+def parse_size(text: str) -> int:
+    match = re.fullmatch(r"(\d+)\s*([KMG]?B)", text.strip().upper())
+    if match is None:
+        raise argparse.ArgumentTypeError(f"bad size {text!r}")
+    return int(match.group(1)) * UNITS[match.group(2)]
+
+
+def format_size(size: int) -> str:
+    for unit in ("GB", "MB", "KB"):
+        if size >= UNITS[unit] and size % UNITS[unit] == 0:
+            return f"{size // UNITS[unit]}{unit}"
+    return f"{size}B"
+
+
+def payload(size: int) -> bytes:
+    # text-like data of a few symbols, so compressors have work to do
+    block = random.Random(SEED).choices(b"abcdefgh \n", k=min(size, 2**20))
+    block = bytes(block)
+    return (block * (size // len(block) + 1))[:size]
+
+
+class Suite:
+    def __init__(self, budget: float, min_ops: int, max_ops: int, pattern: str):
+        self.budget = budget
+        self.min_ops = min_ops
+        self.max_ops = max_ops
+        self.pattern = re.compile(pattern) if pattern else None
+        self.results: List[dict] = []
+
+    def selected(self, name: str) -> bool:
+        return self.pattern is None or self.pattern.search(name) is not None
+
+    def case(
+        self,
+        name: str,
+        size: int,
+        fn: Callable[[], object],
+        setup: Optional[Callable[[], object]] = None,
+        items: int = 1,
+    ):
+        """Times `fn`, `setup` is called before every call and is not timed"""
+        case_id = f"{name}/{format_size(size)}"
+        if not self.selected(case_id):
+            return
+        if setup is not None:
+            setup()
+        fn()  # warm up
+        latencies = []
+        deadline = time.perf_counter() + self.budget
+        while len(latencies) < self.max_ops and (
+            len(latencies) < self.min_ops or time.perf_counter() < deadline
+        ):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            fn()
+            latencies.append(time.perf_counter() - start)
+        total = sum(latencies)
+        latencies.sort()
+        result = dict(
+            id=case_id,
+            size=size,
+            items=items,
+            ops=len(latencies),
+            mean_us=total / len(latencies) * 1e6,
+            p50_us=statistics.median(latencies) * 1e6,
+            p99_us=latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            * 1e6,
+            ops_per_s=items * len(latencies) / total,
+            mb_per_s=items * size * len(latencies) / total / UNITS["MB"],
+        )
+        self.results.append(result)
+        print(
+            f"{case_id:56} {result['p50_us']:12.1f} us"
+            f" {result['mb_per_s']:10.1f} MB/s {result['ops']:7d} ops",
+            flush=True,
+        )
+
+    def skip(self, name: str, reason: str):
+        if self.selected(name):
+            print(f"{name:56} skipped: {reason}", flush=True)
+
+
+def keepers(suite: Suite, sizes: List[int], stack: ExitStack):
+    root = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+    factories = dict(
+        Memory=lambda path: Memory(),
+        Drive=lambda path: Drive(path, create=True),
+        Sqlite=lambda path: Sqlite(path, create=True),
+        SqliteNative=lambda path: SqliteNative(path, create=True),
+        Pack=lambda path: Pack(path, create=True),
+    )
+    for name, factory in factories.items():
+        for size in sizes:
+            prefix = f"keeper/{name}"
+            keeper = factory(root / f"{name}-{size}")
+            data = payload(size)
+            suite.case(f"{prefix}/save", size, lambda: keeper.save("key", data))
+            suite.case(f"{prefix}/load", size, lambda: keeper.load("key"))
+            suite.case(f"{prefix}/exists", size, lambda: keeper.exists("key"))
+            if size <= UNITS["MB"]:
+                items = [(f"key{i}", data) for i in range(BATCH)]
+                keys = [key for key, _ in items]
+                suite.case(
+                    f"{prefix}/save_many",
+                    size,
+                    lambda: keeper.save_many(items),
+                    items=BATCH,
+                )
+                suite.case(
+                    f"{prefix}/load_many",
+                    size,
+                    lambda: keeper.load_many(keys),
+                    items=BATCH,
+                )
+            keeper.delete("key")
+            close = getattr(keeper, "close", None)
+            if close is not None:
+                close()
+
+
+def packaging(suite: Suite, sizes: List[int]):
+    stages: Dict[str, object] = dict(
+        Pickling=Pickling(),
+        PicklingOutOfBand=Pickling(out_of_band=True),
+        Base64=Base64(),
+    )
+    for codec in codecs:
+        try:
+            stages[f"Compression[{codec}]"] = Compression(codec=codec)
+        except ImportError as e:
+            suite.skip(f"packaging/Compression[{codec}]", str(e))
+    for mode in ENCRYPTION_MODES:
+        stages[f"Encryption[{mode}]"] = Encryption(mode=mode)
+    storage = Storage(Memory())
+    chains = {
+        "compression.pickling": storage.compression.pickling._conveyor,
+        "encryption.compression.pickling": (
+            storage.encryption.compression.pickling._conveyor
+        ),
+    }
+    texts = {
+        "Json": Json(),
+        "Encoding": Encoding(),
+        "encoding.json": storage.encoding.json._conveyor,
+    }
+    for size in sizes:
+        data = payload(size)
+        text = data.decode("ascii")
+        for name, stage in {**stages, **chains}.items():
+            packed = stage.forward(data)
+            suite.case(f"packaging/{name}/forward", size, lambda: stage.forward(data))
+            suite.case(
+                f"packaging/{name}/backward", size, lambda: stage.backward(packed)
+            )
+        for name, stage in texts.items():
+            packed = stage.forward(text)
+            suite.case(f"packaging/{name}/forward", size, lambda: stage.forward(text))
+            suite.case(
+                f"packaging/{name}/backward", size, lambda: stage.backward(packed)
+            )
+    arrays(suite, sizes)
+
+
+def arrays(suite: Suite, sizes: List[int]):
+    try:
+        import numpy as np  # type: ignore
+    except ImportError as e:
+        suite.skip("packaging/NumpyArray", str(e))
+        return
+    stages = dict(
+        Pickling=Pickling(),
+        PicklingOutOfBand=Pickling(out_of_band=True),
+        NumpyArray=NumpyArray(),
+        NumpyArrayFiltered=NumpyArray(delta=True, shuffle=True),
+    )
+    for size in sizes:
+        array = np.frombuffer(payload(size - size % 8), dtype=np.int64)
+        for name, stage in stages.items():
+            packed = stage.forward(array)
+            suite.case(
+                f"packaging/array/{name}/forward", size, lambda: stage.forward(array)
+            )
+            suite.case(
+                f"packaging/array/{name}/backward",
+                size,
+                lambda: stage.backward(packed),
+            )
+
+
+def hashing(suite: Suite, sizes: List[int]):
+    for name in (*algorithms, *TREE_ALGORITHMS):
+        fn = get_hash_fn(name)
+        for size in sizes:
+            data = payload(size)
+            suite.case(f"hash/{name}", size, lambda: fn(data))
+
+
+def chunking(suite: Suite, sizes: List[int]):
+    chunker = Chunker()
+    for size in sizes:
+        data = payload(size)
+        suite.case("dedup/Chunker/split", size, lambda: list(chunker.split(data)))
+
+
+def evict(cache, key):
+    # bridges cache keys that are not digests under a digest of the key
+    cache._dst.delete(cache._key(key))
+
+
+def caches(suite: Suite, sizes: List[int], stack: ExitStack):
+    root = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+    bridges = dict(
+        CacheMemory=lambda path: CacheMemory(Memory()),
+        CacheDrive=lambda path: CacheDrive(Memory(), path, create=True),
+    )
+    for size in sizes:
+        data = payload(size)
+        for name, factory in bridges.items():
+            cache = factory(root / f"{name}-{size}")
+            cache.save("key", data)
+            suite.case(f"cache/{name}/hit", size, lambda: cache.load("key"))
+            suite.case(
+                f"cache/{name}/miss",
+                size,
+                lambda: cache.load("key"),
+                setup=lambda: evict(cache, "key"),
+            )
+        tiers = [Memory(), Drive(root / f"tiers-{size}", create=True), Memory()]
+        tiered = TieredStore(tiers)
+        tiered.save("key", data)
+        suite.case("cache/TieredStore/hit", size, lambda: tiered.load("key"))
+        suite.case(
+            "cache/TieredStore/promote",
+            size,
+            lambda: tiered.load("key"),
+            setup=lambda: tiers[0].delete("key"),
+        )
+
+
+def commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", type=Path, help="json file with the results")
+    parser.add_argument(
+        "--sizes",
+        default=SIZES,
+        help=f"comma separated object sizes from 1KB to 1GB, default {SIZES}",
+    )
+    parser.add_argument("--filter", default="", help="regex of the case ids")
+    parser.add_argument("--budget", type=float, default=0.5, help="seconds per case")
+    parser.add_argument("--min-ops", type=int, default=3)
+    parser.add_argument("--max-ops", type=int, default=10_000)
+    args = parser.parse_args()
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    suite = Suite(args.budget, args.min_ops, args.max_ops, args.filter)
+    started = time.perf_counter()
+    with ExitStack() as stack:
+        keepers(suite, sizes, stack)
+        packaging(suite, sizes)
+        hashing(suite, sizes)
+        chunking(suite, sizes)
+        caches(suite, sizes, stack)
+    report = dict(
+        meta=dict(
+            version=__version__,
+            commit=commit(),
+            date=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            python=sys.version.split()[0],
+            platform=platform.platform(),
+            machine=platform.machine(),
+            cpus=os.cpu_count(),
+            seed=SEED,
+            sizes=sizes,
+            budget=args.budget,
+            seconds=round(time.perf_counter() - started, 1),
+        ),
+        results=suite.results,
+    )
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=1))
+        print(f"{len(suite.results)} results are written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,5 +2,11 @@
 # Copyright (c) 2022 Vladislav A. Proskurov
 # see LICENSE for full details
 
+from .aio import *
+from .collector import *
+from .dedup import *
+from .eviction import *
+from .metrics import *
 from .packaging import *
 from .storage import *
+from .tiered import *
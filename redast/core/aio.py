@@ -0,0 +1,367 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+__all__ = (
+    "AsyncKeeper",
+    "AsyncAdapter",
+    "AsyncStorage",
+    "AsyncPipe",
+    "AsyncLink",
+)
+
+import asyncio
+import inspect
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Protocol,
+    Union,
+    runtime_checkable,
+)
+
+from .hash import encode, get_hash_fn, memoized
+from .packaging import *
+from .storage import (
+    Keeper,
+    PipeCache,
+    StorageMethod,
+    _LINK,
+    _decode,
+    _defaults,
+    _frozen,
+    as_items,
+    delete_many,
+    exists_many,
+    load_many,
+    save_many,
+)
+
+
+@runtime_checkable
+class AsyncKeeper(Protocol):
+    async def exists(self, key) -> bool:
+        pass
+
+    async def save(self, key, data) -> bool:
+        pass
+
+    async def load(self, key) -> Any:
+        pass
+
+    async def delete(self, key) -> bool:
+        pass
+
+
+class AsyncAdapter:
+    # runs the blocking calls of a keeper on a bounded thread pool
+    def __init__(
+        self,
+        keeper: Keeper,
+        *,
+        workers: int = 8,
+        executor: Optional[Executor] = None,
+    ):
+        if not isinstance(keeper, Keeper):
+            raise ValueError
+        self._keeper = keeper
+        # only the pool created here is shut down on close
+        self._owned = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=workers)
+
+    def close(self):
+        if self._owned:
+            self._executor.shutdown()
+
+    async def __aenter__(self) -> "AsyncAdapter":
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    async def _run(self, fn, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def exists(self, key) -> bool:
+        return await self._run(self._keeper.exists, key)
+
+    async def save(self, key, data) -> bool:
+        return await self._run(self._keeper.save, key, data)
+
+    async def load(self, key) -> Any:
+        return await self._run(self._keeper.load, key)
+
+    async def delete(self, key) -> bool:
+        return await self._run(self._keeper.delete, key)
+
+    async def exists_many(self, keys: Iterable) -> List[bool]:
+        return await self._run(exists_many, self._keeper, list(keys))
+
+    async def save_many(self, items) -> List[bool]:
+        return await self._run(save_many, self._keeper, as_items(items))
+
+    async def load_many(self, keys: Iterable) -> List[Any]:
+        return await self._run(load_many, self._keeper, list(keys))
+
+    async def delete_many(self, keys: Iterable) -> List[bool]:
+        return await self._run(delete_many, self._keeper, list(keys))
+
+
+async def _many(keeper, name: str, *args) -> list:
+    # uses the bulk method of the keeper or runs single-key calls concurrently
+    bulk = getattr(keeper, f"{name}_many", None)
+    if bulk is not None:
+        return await bulk(*args)
+    method = getattr(keeper, name)
+    if name == "save":
+        calls = [method(key, data) for key, data in as_items(*args)]
+    else:
+        calls = [method(key) for key in args[0]]
+    return list(await asyncio.gather(*calls))
+
+
+class AsyncStorage(PipeCache):
+    compression = StorageMethod(Compression)
+    pickling = StorageMethod(Pickling)
+    numpy = StorageMethod(NumpyArray)
+    encryption = StorageMethod(Encryption)
+    base64 = StorageMethod(Base64)
+    json = StorageMethod(Json)
+    encoding = StorageMethod(Encoding)
+
+    def __init__(
+        self,
+        keeper: Union[AsyncKeeper, Keeper],
+        *,
+        executor: Optional[Executor] = None,
+        hashing: str = "blake2b",
+        compression: int = -1,
+        compression_codec: str = "zlib",
+        compression_dictionary: Optional[bytes] = None,
+        encryption_key: Union[str, bytes] = None,
+        encryption_password: Union[str, bytes] = None,
+        encryption_seed: int = None,
+        encryption_kdf: str = "sha256",
+        encryption_mode: str = "ecb",
+        encoding: str = "utf-8",
+        hash_memo: int = 0,
+    ):
+        if not isinstance(keeper, AsyncKeeper):
+            raise ValueError
+        if not inspect.iscoroutinefunction(keeper.load):
+            keeper = AsyncAdapter(keeper)
+        self._keeper = keeper
+        self._executor = executor
+        self._pipes: Dict[Any, AsyncPipe] = dict()
+        self._hash_memo = hash_memo
+        self._markers = memoized(self.hash, hash_memo)
+        self._alg = get_hash_fn(hashing)
+        self._default = _defaults(
+            compression=compression,
+            compression_codec=compression_codec,
+            compression_dictionary=compression_dictionary,
+            encryption_key=encryption_key,
+            encryption_password=encryption_password,
+            encryption_seed=encryption_seed,
+            encryption_kdf=encryption_kdf,
+            encryption_mode=encryption_mode,
+            encoding=encoding,
+        )
+
+    def _pipe(self, wrapper: Packaging) -> "AsyncPipe":
+        return AsyncPipe(self, wrapper)
+
+    async def _compute(self, fn, *args) -> Any:
+        # cpu-bound work is offloaded when the storage has an executor
+        if self._executor is None:
+            return fn(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def exists(self, key) -> bool:
+        return await self._keeper.exists(key)
+
+    async def save(self, key, data) -> bool:
+        return await self._keeper.save(key, data)
+
+    async def load(self, key) -> Any:
+        return await self._keeper.load(key)
+
+    async def delete(self, key) -> bool:
+        return await self._keeper.delete(key)
+
+    async def exists_many(self, keys: Iterable) -> List[bool]:
+        return await _many(self._keeper, "exists", list(keys))
+
+    async def save_many(self, items) -> List[bool]:
+        return await _many(self._keeper, "save", as_items(items))
+
+    async def load_many(self, keys: Iterable) -> List[Any]:
+        return await _many(self._keeper, "load", list(keys))
+
+    async def delete_many(self, keys: Iterable) -> List[bool]:
+        return await _many(self._keeper, "delete", list(keys))
+
+    def hash(self, data) -> str:
+        return self._alg(encode(data))
+
+    def _hash_many(self, data: List[Any]) -> List[str]:
+        return [self.hash(item) for item in data]
+
+    async def push(self, data) -> str:
+        key = await self._compute(self.hash, data)
+        await self.save(key, data)
+        return key
+
+    async def push_many(self, data: Iterable) -> List[str]:
+        data = list(data)
+        keys = await self._compute(self._hash_many, data)
+        await self.save_many(zip(keys, data))
+        return keys
+
+    async def pop(self, key) -> Any:
+        data = await self.load(key)
+        await self.delete(key)
+        return data
+
+    def link(self, *markers) -> "AsyncLink":
+        return AsyncLink(*markers, storage=self)
+
+
+class AsyncPipe(AsyncStorage):
+    def __init__(self, storage: AsyncStorage, wrapper: Packaging):
+        if not isinstance(storage, AsyncStorage):
+            raise ValueError
+        if not isinstance(wrapper, Packaging):
+            raise ValueError
+        self._wrapper = wrapper
+        self._default = storage._default
+        self._executor = storage._executor
+        self._pipes = dict()
+        self._hash_memo = storage._hash_memo
+        self._markers = memoized(self.hash, self._hash_memo)
+        self._storage = storage
+        if isinstance(storage, AsyncPipe):
+            self._conveyor = Conveyor(wrapper, *storage._conveyor._packers)
+            self._base = storage._base
+        else:
+            self._conveyor = Conveyor(wrapper)
+            self._base = storage
+
+    def __call__(self, **kwargs) -> "AsyncPipe":
+        def build():
+            return self._storage._pipe(type(self._wrapper)(**kwargs))
+
+        frozen = _frozen(kwargs)
+        if frozen is None:
+            return build()
+        return self._storage._cached((type(self._wrapper), frozen), build)
+
+    def _forward_many(self, data: List[Any]) -> List[Any]:
+        return [self._conveyor.forward(item) for item in data]
+
+    def _backward_many(self, data: List[Any]) -> List[Any]:
+        return [self._conveyor.backward(item) for item in data]
+
+    async def exists(self, key) -> bool:
+        return await self._base.exists(key)
+
+    async def save(self, key, data) -> bool:
+        wrapped = await self._compute(self._conveyor.forward, data)
+        return await self._base.save(key, wrapped)
+
+    async def load(self, key) -> Any:
+        wrapped = await self._base.load(key)
+        return await self._compute(self._conveyor.backward, wrapped)
+
+    async def delete(self, key) -> bool:
+        return await self._base.delete(key)
+
+    async def exists_many(self, keys: Iterable) -> List[bool]:
+        return await self._base.exists_many(keys)
+
+    async def save_many(self, items) -> List[bool]:
+        items = as_items(items)
+        wrapped = await self._compute(self._forward_many, [data for _, data in items])
+        return await self._base.save_many(zip([key for key, _ in items], wrapped))
+
+    async def load_many(self, keys: Iterable) -> List[Any]:
+        wrapped = await self._base.load_many(keys)
+        return await self._compute(self._backward_many, wrapped)
+
+    async def delete_many(self, keys: Iterable) -> List[bool]:
+        return await self._base.delete_many(keys)
+
+    def hash(self, data) -> str:
+        return self._base.hash(self._conveyor.forward(data))
+
+    async def push(self, data) -> str:
+        wrapped = await self._compute(self._conveyor.forward, data)
+        return await self._base.push(wrapped)
+
+    async def push_many(self, data: Iterable) -> List[str]:
+        wrapped = await self._compute(self._forward_many, list(data))
+        return await self._base.push_many(wrapped)
+
+    async def pop(self, key) -> Any:
+        wrapped = await self._base.pop(key)
+        return await self._compute(self._conveyor.backward, wrapped)
+
+
+class AsyncLink:
+    def __init__(self, *markers, storage: AsyncStorage):
+        if not isinstance(storage, AsyncStorage):
+            raise ValueError
+        assert len(markers) > 0
+        if len(markers) == 1:
+            markers = markers[0]
+        digest = storage._markers(markers)
+        self._marker = digest + _LINK
+        # markers of links pushed before the suffix are still read
+        self._legacy = digest
+        self._storage = storage
+
+    async def _data_key(self, read: Callable[[Any], Awaitable]) -> str:
+        try:
+            return _decode(await read(self._marker))
+        except Exception:
+            if not await self._storage.exists(self._legacy):
+                raise
+            return _decode(await read(self._legacy))
+
+    async def exists(self) -> bool:
+        for marker in (self._marker, self._legacy):
+            if await self._storage.exists(marker):
+                data_key = _decode(await self._storage.load(marker))
+                return await self._storage.exists(data_key)
+        return False
+
+    async def load(self) -> Any:
+        data_key = await self._data_key(self._storage.load)
+        return await self._storage.load(data_key)
+
+    async def delete(self) -> bool:
+        data_key = await self._data_key(self._storage.pop)
+        # a legacy marker would otherwise bring back the previous object
+        await self._storage.delete(self._legacy)
+        return await self._storage.delete(data_key)
+
+    def hash(self, data) -> str:
+        return self._storage.hash(data)
+
+    async def push(self, data) -> str:
+        data_key = await self._storage.push(data)
+        await self._storage.save(self._marker, data_key.encode())
+        return data_key
+
+    async def pop(self) -> Any:
+        data_key = await self._data_key(self._storage.pop)
+        await self._storage.delete(self._legacy)
+        return await self._storage.pop(data_key)
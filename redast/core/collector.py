@@ -0,0 +1,183 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+__all__ = ("Collector",)
+
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from .storage import (
+    Pipe,
+    Storage,
+    _DIGEST,
+    _LINK,
+    _chunks,
+    _decode,
+    delete_many,
+    exists_many,
+    load_many,
+    scan,
+)
+
+
+def _is_marker(key) -> bool:
+    return isinstance(key, str) and key.endswith(_LINK)
+
+
+class Collector:
+    """Mark-and-sweep garbage collector of links and their objects
+
+    Markers of links are stored under keys ending with `.link` and are the
+    roots. A marker whose object no longer exists is stale and is collected.
+    With `unlinked=True`, every object that is neither a marker, nor the
+    target of a marker, nor listed in `keep` is collected too, including
+    objects saved without a link, e.g. by `storage.push`. Only markers are
+    loaded. Markers that can not be read, e.g. those of another pipe, are
+    counted in `unreadable_markers`, and while there are any, unlinked
+    objects are not collected, since their targets are unknown.
+
+    The collection runs in steps, so it can be spread over bounded time
+    slices with `step`. Only keys found by the mark phase are collected, and
+    keys written through the storage after the collector was created are
+    never collected, so links can be pushed again between the steps. Writes
+    of other processes are not tracked.
+    """
+
+    def __init__(
+        self,
+        storage: Storage,
+        *,
+        keep: Iterable = (),
+        unlinked: bool = False,
+        dry_run: bool = False,
+        window: int = 256,
+    ):
+        if not isinstance(storage, Storage):
+            raise ValueError
+        # links of a pipe store packed markers in the base storage
+        if isinstance(storage, Pipe):
+            self._base, self._conveyor = storage._base, storage._conveyor
+        else:
+            self._base, self._conveyor = storage, None
+        self._keeper = self._base._keeper
+        self._keep = set(keep)
+        self._unlinked = unlinked
+        self._dry_run = dry_run
+        self._window = window
+        self._sizes: Dict[Any, int] = dict()
+        self._markers: Dict[Any, str] = dict()
+        self._touched: Set[Any] = set()
+        self._report = dict(
+            objects=0,
+            markers=0,
+            garbage=0,
+            stale_markers=0,
+            unreadable_markers=0,
+            reclaimable_bytes=0,
+            deleted=0,
+        )
+        if not dry_run:
+            self._base._collectors.add(self)
+        self._work = self._run()
+        self._done = False
+
+    @property
+    def report(self) -> Dict[str, int]:
+        return dict(self._report)
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def _touch(self, keys: Iterable):
+        self._touched.update(keys)
+
+    @staticmethod
+    def _read(unpack, data) -> Optional[str]:
+        try:
+            target = _decode(unpack(data))
+        except Exception:
+            return None
+        return target if _DIGEST.fullmatch(target) else None
+
+    def _target(self, data) -> Optional[str]:
+        # markers of links pushed through the base storage are plain
+        target = None
+        if self._conveyor is not None:
+            target = self._read(self._conveyor.backward, data)
+        return target or self._read(bytes, data)
+
+    def _mark(self, markers: List[Any]):
+        # markers that can not be read are kept, they may belong to a pipe
+        for key, data in zip(markers, load_many(self._keeper, markers)):
+            target = self._target(data)
+            if target is None:
+                self._report["unreadable_markers"] += 1
+            else:
+                self._markers[key] = target
+
+    def _run(self) -> Iterator[None]:
+        markers = []
+        for key, size in scan(self._keeper):
+            self._sizes[key] = size
+            if _is_marker(key):
+                markers.append(key)
+            if len(markers) >= self._window:
+                self._mark(markers)
+                markers = []
+            yield
+        self._mark(markers)
+        yield
+
+        alive = set(self._sizes)
+        targets = set(self._markers.values())
+        for batch in _chunks(targets - alive, self._window):
+            found = exists_many(self._keeper, batch)
+            alive.update(key for key, ok in zip(batch, found) if ok)
+            yield
+
+        reachable = set(self._keep)
+        for marker, target in self._markers.items():
+            if target in alive:
+                reachable.add(marker)
+                reachable.add(target)
+        stale = [marker for marker in self._markers if marker not in reachable]
+        garbage = list(stale)
+        # targets of unreadable markers may be any of the unlinked objects
+        if self._unlinked and not self._report["unreadable_markers"]:
+            garbage += [
+                key
+                for key in self._sizes
+                if key not in reachable and not _is_marker(key)
+            ]
+        self._report.update(
+            objects=len(self._sizes),
+            markers=sum(map(_is_marker, self._sizes)),
+            garbage=len(garbage),
+            stale_markers=len(stale),
+            reclaimable_bytes=sum(self._sizes[key] for key in garbage),
+        )
+        yield
+
+        if self._dry_run:
+            return
+        for batch in _chunks(garbage, self._window):
+            batch = [key for key in batch if key not in self._touched]
+            deleted = delete_many(self._keeper, batch)
+            self._report["deleted"] += sum(map(bool, deleted))
+            yield
+
+    def step(self, budget: Optional[float] = None) -> bool:
+        """Works for about `budget` seconds, returns True when finished"""
+        deadline = None if budget is None else time.monotonic() + budget
+        for _ in self._work:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+        self._done = True
+        self._base._collectors.discard(self)
+        return True
+
+    def collect(self) -> Dict[str, int]:
+        self.step()
+        return self.report
@@ -0,0 +1,216 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import functools
+import importlib
+import zlib
+from typing import Iterable, Iterator, Optional
+
+# default size of chunks in streaming operations
+STREAM_CHUNK_SIZE = 2**20
+
+
+# modules are looked up on every call instead of being kept on the codecs,
+# so codecs and the pipelines holding them can be pickled
+@functools.lru_cache(maxsize=None)
+def _require(module: str, package: str):
+    try:
+        return importlib.import_module(module)
+    except ImportError as e:
+        raise ImportError(f"install `{package}` to use this compression") from e
+
+
+class _Reader:
+    # file-like view of a stream of chunks for decompressors that pull input
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._rest = memoryview(b"")
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._rest:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return b""
+            self._rest = memoryview(chunk).cast("B")
+        if size < 0:
+            size = len(self._rest)
+        data = bytes(self._rest[:size])
+        self._rest = self._rest[size:]
+        return data
+
+
+# decompressed output of a stream is produced in parts of at most about
+# STREAM_CHUNK_SIZE bytes, so a small chunk of input can not expand at once
+class Zlib:
+    id = 0
+
+    def __init__(self, level: int = -1, dictionary: Optional[bytes] = None):
+        if dictionary is not None:
+            raise ValueError("zlib compression does not support dictionaries")
+        self._level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, level=self._level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+    def compress_stream(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        compressor = zlib.compressobj(level=self._level)
+        for chunk in chunks:
+            yield compressor.compress(chunk)
+        yield compressor.flush()
+
+    def decompress_stream(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        decompressor = zlib.decompressobj()
+        for chunk in chunks:
+            while chunk:
+                yield decompressor.decompress(chunk, STREAM_CHUNK_SIZE)
+                chunk = decompressor.unconsumed_tail
+        yield decompressor.flush()
+
+
+class Zstd:
+    id = 1
+
+    def __init__(self, level: int = -1, dictionary: Optional[bytes] = None):
+        _require("zstandard", "zstandard")
+        self._level = 3 if level == -1 else level
+        self._dictionary = dictionary
+        self._prepared = None
+
+    def __getstate__(self):
+        # prepared dictionaries can not be pickled, they are prepared again
+        state = self.__dict__.copy()
+        state["_prepared"] = None
+        return state
+
+    def _dict(self):
+        if self._dictionary is None:
+            return None
+        if self._prepared is None:
+            zstd = _require("zstandard", "zstandard")
+            prepared = zstd.ZstdCompressionDict(self._dictionary)
+            prepared.precompute_compress(level=self._level)
+            self._prepared = prepared
+        return self._prepared
+
+    # compression contexts are not thread safe, so each call gets its own
+    def _compressor(self):
+        zstd = _require("zstandard", "zstandard")
+        return zstd.ZstdCompressor(level=self._level, dict_data=self._dict())
+
+    def _decompressor(self):
+        zstd = _require("zstandard", "zstandard")
+        return zstd.ZstdDecompressor(dict_data=self._dict())
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor().compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompressor().decompressobj().decompress(data)
+
+    def compress_stream(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        compressor = self._compressor().compressobj()
+        for chunk in chunks:
+            yield compressor.compress(chunk)
+        yield compressor.flush()
+
+    def decompress_stream(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        # the reader pulls input only as it needs it, and the stream ends
+        # with the frame
+        reader = self._decompressor().stream_reader(
+            _Reader(chunks), read_size=STREAM_CHUNK_SIZE, read_across_frames=False
+        )
+        with reader:
+            yield from iter(lambda: reader.read(STREAM_CHUNK_SIZE), b"")
+
+    @staticmethod
+    def train(samples: Iterable[bytes], size: int = 112_640) -> bytes:
+        zstd = _require("zstandard", "zstandard")
+        return zstd.train_dictionary(size, list(samples)).as_bytes()
+
+
+class Lz4:
+    id = 2
+
+    def __init__(self, level: int = -1, dictionary: Optional[bytes] = None):
+        if dictionary is not None:
+            raise ValueError("lz4 compression does not support dictionaries")
+        _require("lz4.frame", "lz4")
+        self._level = 0 if level == -1 else level
+
+    def compress(self, data: bytes) -> bytes:
+        frame = _require("lz4.frame", "lz4")
+        return frame.compress(data, compression_level=self._level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return _require("lz4.frame", "lz4").decompress(data)
+
+    def compress_stream(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        frame = _require("lz4.frame", "lz4")
+        compressor = frame.LZ4FrameCompressor(compression_level=self._level)
+        yield compressor.begin()
+        for chunk in chunks:
+            yield compressor.compress(chunk)
+        yield compressor.flush()
+
+    def decompress_stream(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        decompressor = _require("lz4.frame", "lz4").LZ4FrameDecompressor()
+        for chunk in chunks:
+            # input beyond the limit is kept until the output is taken
+            while chunk or not decompressor.needs_input:
+                if decompressor.eof:
+                    return
+                yield decompressor.decompress(chunk, STREAM_CHUNK_SIZE)
+                chunk = b""
+
+
+class Brotli:
+    id = 3
+
+    def __init__(self, level: int = -1, dictionary: Optional[bytes] = None):
+        if dictionary is not None:
+            raise ValueError("brotli compression does not support dictionaries")
+        _require("brotli", "brotli")
+        self._level = 11 if level == -1 else level
+
+    def compress(self, data: bytes) -> bytes:
+        return _require("brotli", "brotli").compress(data, quality=self._level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return _require("brotli", "brotli").decompress(bytes(data))
+
+    def compress_stream(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        compressor = _require("brotli", "brotli").Compressor(quality=self._level)
+        for chunk in chunks:
+            yield compressor.process(chunk)
+        yield compressor.finish()
+
+    def decompress_stream(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        decompressor = _require("brotli", "brotli").Decompressor()
+        limit = dict(output_buffer_limit=STREAM_CHUNK_SIZE)
+        for chunk in chunks:
+            if decompressor.is_finished():
+                return
+            if chunk:
+                yield decompressor.process(chunk, **limit)
+                while not decompressor.can_accept_more_data():
+                    yield decompressor.process(b"", **limit)
+        # the output left after the last input, a truncated stream gives none
+        while not decompressor.is_finished():
+            part = decompressor.process(b"", **limit)
+            if not part:
+                return
+            yield part
+
+
+registry = dict(
+    zlib=Zlib,
+    zstd=Zstd,
+    lz4=Lz4,
+    brotli=Brotli,
+)
+
+by_id = {codec.id: codec for codec in registry.values()}
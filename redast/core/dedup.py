@@ -0,0 +1,396 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+__all__ = ("Chunker", "Dedup")
+
+import functools
+import hashlib
+import json
+import threading
+from bisect import bisect_left
+from collections import Counter
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .hash import get_algorithm
+from .packaging import BUFFER_TYPES
+from .storage import (
+    Keeper,
+    delete_many,
+    exists_many,
+    load_many,
+    save_many,
+)
+
+_MASK = 2**64 - 1
+_MANIFEST = b"RDCM"
+
+# fixed random values of bytes for the gear rolling hash, they are derived
+# from blake2b so chunk boundaries never change between runs and versions
+_GEAR = tuple(
+    int.from_bytes(hashlib.blake2b(bytes([i]), digest_size=8).digest(), "little")
+    for i in range(256)
+)
+
+
+# bytes hashed with numpy at once, small enough to stay in the cpu cache
+_BLOCK = 2**16
+# a gear hash depends only on the last 64 bytes
+_WINDOW = 64
+
+
+def _mask(bits: int) -> int:
+    # the highest bits of the gear hash depend on the widest window of bytes
+    return ((1 << bits) - 1) << (64 - bits)
+
+
+@functools.lru_cache(maxsize=None)
+def _numpy():
+    # numpy is optional, without it chunk boundaries are found byte by byte
+    try:
+        import numpy  # type: ignore
+    except ImportError:
+        return None
+    return numpy
+
+
+class _Boundaries:
+    """Positions of data where the gear hash satisfies the chunking masks
+
+    The hash is computed as if it never restarted, so the positions are
+    valid from the 64th byte after a restart on. The hash at a position is
+    the sum of the gear values of the last 64 bytes shifted by their
+    distance, which numpy builds for a whole block in 6 doubling steps.
+    """
+
+    def __init__(self, np, strict_bits: int, loose_bits: int):
+        self._np = np
+        self._gear = np.array(_GEAR, dtype=np.uint64)
+        self._shift = np.uint64(64 - strict_bits)
+        self._loose_limit = 1 << (strict_bits - loose_bits)
+        self.hashed = 0
+        self._strict: List[int] = []
+        self._loose: List[int] = []
+
+    def update(self, data, end: int):
+        """Finds the positions up to `end`, hashing at least a block ahead"""
+        if end <= self.hashed:
+            return
+        np = self._np
+        start = self.hashed
+        end = min(len(data), max(end, start + _BLOCK))
+        context = max(0, start - _WINDOW + 1)
+        values = np.frombuffer(data, np.uint8, end - context, context)
+        fp = self._gear[values]
+        span = 1
+        while span < _WINDOW:
+            fp[span:] += fp[:-span] << np.uint64(span)
+            span *= 2
+        top = fp[start - context :] >> self._shift
+        loose = np.flatnonzero(top < self._loose_limit)
+        strict = loose[top[loose] == 0]
+        self._loose.extend((loose + start).tolist())
+        self._strict.extend((strict + start).tolist())
+        self.hashed = end
+
+    @staticmethod
+    def _first(positions: List[int], start: int, end: int) -> Optional[int]:
+        i = bisect_left(positions, start)
+        if i < len(positions) and positions[i] < end:
+            return positions[i]
+        return None
+
+    def strict(self, start: int, end: int) -> Optional[int]:
+        return self._first(self._strict, start, end)
+
+    def loose(self, start: int, end: int) -> Optional[int]:
+        return self._first(self._loose, start, end)
+
+    def drop(self, count: int):
+        """Forgets the first `count` bytes of the data"""
+        for positions in (self._strict, self._loose):
+            del positions[: bisect_left(positions, count)]
+            positions[:] = [position - count for position in positions]
+        self.hashed = max(0, self.hashed - count)
+
+
+class Chunker:
+    """Content-defined chunking with the FastCDC algorithm
+
+    Chunk boundaries depend only on the nearby bytes, so an insertion or
+    a deletion in the data changes only the chunks around it.
+    """
+
+    def __init__(
+        self,
+        avg_size: int = 2**16,
+        min_size: int = None,
+        max_size: int = None,
+    ):
+        if avg_size <= 0 or avg_size & (avg_size - 1):
+            raise ValueError("average chunk size must be a power of two")
+        self.avg_size = avg_size
+        self.min_size = avg_size // 4 if min_size is None else min_size
+        self.max_size = avg_size * 8 if max_size is None else max_size
+        if not 0 < self.min_size <= avg_size <= self.max_size:
+            raise ValueError("chunk sizes must satisfy min <= avg <= max")
+        # normalized chunking: boundaries are harder to find before the
+        # average size and easier after it
+        bits = avg_size.bit_length() - 1
+        self._strict_bits = bits + 1
+        self._loose_bits = max(bits - 1, 1)
+        self._strict = _mask(self._strict_bits)
+        self._loose = _mask(self._loose_bits)
+
+    def cut(self, data, start: int = 0, end: int = None) -> int:
+        """Offset of the end of the chunk that begins at `start`"""
+        end = len(data) if end is None else end
+        if end - start <= self.min_size:
+            return end
+        end = min(end, start + self.max_size)
+        normal = min(end, start + self.avg_size)
+        gear, fp = _GEAR, 0
+        i = start + self.min_size
+        for mask, barrier in ((self._strict, normal), (self._loose, end)):
+            for byte in data[i:barrier]:
+                fp = ((fp << 1) + gear[byte]) & _MASK
+                i += 1
+                if not fp & mask:
+                    return i
+        return end
+
+    def _boundaries(self) -> Optional[_Boundaries]:
+        np = _numpy()
+        if np is None:
+            return None
+        return _Boundaries(np, self._strict_bits, self._loose_bits)
+
+    def _cut(self, data, start: int, boundaries: Optional[_Boundaries]) -> int:
+        # the same offset as `cut`, the hash is computed byte by byte only
+        # until it covers a whole window, later positions are looked up
+        if boundaries is None:
+            return self.cut(data, start)
+        end = len(data)
+        if end - start <= self.min_size:
+            return end
+        end = min(end, start + self.max_size)
+        normal = min(end, start + self.avg_size)
+        head = min(end, start + self.min_size + _WINDOW - 1)
+        gear, fp = _GEAR, 0
+        for i in range(start + self.min_size, head):
+            fp = ((fp << 1) + gear[data[i]]) & _MASK
+            if not fp & (self._strict if i < normal else self._loose):
+                return i + 1
+        boundaries.update(data, end)
+        found = boundaries.strict(head, normal)
+        if found is None:
+            found = boundaries.loose(max(head, normal), end)
+        return end if found is None else found + 1
+
+    def split(self, data) -> Iterator[memoryview]:
+        data = memoryview(data).cast("B")
+        boundaries = self._boundaries()
+        start = 0
+        while start < len(data):
+            end = self._cut(data, start, boundaries)
+            yield data[start:end]
+            start = end
+
+    def split_stream(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        buffer = bytearray()
+        boundaries = self._boundaries()
+        for chunk in chunks:
+            buffer += chunk
+            start = 0
+            while len(buffer) - start >= self.max_size:
+                end = self._cut(buffer, start, boundaries)
+                yield bytes(buffer[start:end])
+                start = end
+            del buffer[:start]
+            if boundaries is not None:
+                boundaries.drop(start)
+        start = 0
+        while start < len(buffer):
+            end = self._cut(buffer, start, boundaries)
+            yield bytes(buffer[start:end])
+            start = end
+
+
+def _batches(items: Iterable, size: int) -> Iterator[list]:
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Dedup:
+    """Keeper that stores bytes as deduplicated content-defined chunks
+
+    Every object is saved as a manifest with the list of its chunks. Chunks
+    are stored once under their digests and hold a reference count of the
+    manifests that use them, so identical parts of different objects share
+    the same space. Chunks are written before the references and the
+    references before the manifest: an interrupted save can only leak
+    chunks, never lose them. With `verify=True` every loaded chunk is checked
+    against its digest, so partial reads of streams are verified too.
+    """
+
+    def __init__(
+        self,
+        keeper: Keeper,
+        *,
+        hashing: str = "blake2b",
+        avg_size: int = 2**16,
+        min_size: int = None,
+        max_size: int = None,
+        window: int = 64,
+        verify: bool = False,
+    ):
+        if not isinstance(keeper, Keeper):
+            raise ValueError
+        self._keeper = keeper
+        self._alg = get_algorithm(hashing)
+        self._verify = verify
+        self._chunker = Chunker(avg_size, min_size=min_size, max_size=max_size)
+        self._window = window
+        self._lock = threading.RLock()
+        self._stored = 0
+        self._reused = 0
+        self._stored_bytes = 0
+        self._reused_bytes = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return dict(
+            stored_chunks=self._stored,
+            reused_chunks=self._reused,
+            stored_bytes=self._stored_bytes,
+            reused_bytes=self._reused_bytes,
+        )
+
+    # the digest leads the key, so a sharded drive spreads chunks by it
+    @staticmethod
+    def _chunk_key(digest: str) -> str:
+        return f"{digest}.chunk"
+
+    @staticmethod
+    def _ref_key(digest: str) -> str:
+        return f"{digest}.ref"
+
+    def _manifest(self, key) -> List[Tuple[str, int]]:
+        data = self._keeper.load(key)
+        if bytes(data[: len(_MANIFEST)]) != _MANIFEST:
+            raise ValueError(f"`{key}` is not a deduplicated object")
+        return [tuple(item) for item in json.loads(bytes(data[len(_MANIFEST) :]))]
+
+    def _refs(self, digests: List[str]) -> List[int]:
+        keys = [self._ref_key(digest) for digest in digests]
+        found = exists_many(self._keeper, keys)
+        present = [key for key, ok in zip(keys, found) if ok]
+        counts = iter(load_many(self._keeper, present))
+        return [int(next(counts)) if ok else 0 for ok in found]
+
+    def _acquire(self, chunks: List[Any]) -> List[Tuple[str, int]]:
+        # stores the new chunks of a batch and increments references of all
+        entries = [(self._alg(chunk).hexdigest(), len(chunk)) for chunk in chunks]
+        uses = Counter(digest for digest, _ in entries)
+        digests = list(uses)
+        refs = self._refs(digests)
+        fresh = {digest for digest, ref in zip(digests, refs) if ref == 0}
+        new = dict()
+        for (digest, size), chunk in zip(entries, chunks):
+            if digest in fresh and digest not in new:
+                new[digest] = bytes(chunk)
+                self._stored += 1
+                self._stored_bytes += size
+            else:
+                self._reused += 1
+                self._reused_bytes += size
+        save_many(
+            self._keeper,
+            [(self._chunk_key(digest), chunk) for digest, chunk in new.items()],
+        )
+        save_many(
+            self._keeper,
+            [
+                (self._ref_key(digest), str(ref + uses[digest]).encode())
+                for digest, ref in zip(digests, refs)
+            ],
+        )
+        return entries
+
+    def _release(self, entries: List[Tuple[str, int]]):
+        # decrements references and removes chunks that are no longer used
+        uses = Counter(digest for digest, _ in entries)
+        for batch in _batches(uses, self._window):
+            refs = self._refs(batch)
+            left = [ref - uses[digest] for digest, ref in zip(batch, refs)]
+            alive = [(d, ref) for d, ref in zip(batch, left) if ref > 0]
+            dead = [d for d, ref in zip(batch, left) if ref <= 0]
+            save_many(
+                self._keeper,
+                [(self._ref_key(d), str(ref).encode()) for d, ref in alive],
+            )
+            delete_many(self._keeper, [self._chunk_key(digest) for digest in dead])
+            delete_many(self._keeper, [self._ref_key(digest) for digest in dead])
+
+    def _commit(self, key, chunks: Iterable) -> bool:
+        with self._lock:
+            previous = self._manifest(key) if self._keeper.exists(key) else None
+            entries: List[Tuple[str, int]] = list()
+            for batch in _batches(chunks, self._window):
+                entries.extend(self._acquire(batch))
+            manifest = _MANIFEST + json.dumps(entries).encode()
+            if not self._keeper.save(key, manifest):
+                # the previous manifest is still in place and keeps its chunks
+                self._release(entries)
+                return False
+            # chunks of the overwritten object are released after the new
+            # manifest is in place, so shared chunks are never removed
+            if previous is not None:
+                self._release(previous)
+            return True
+
+    def exists(self, key) -> bool:
+        return self._keeper.exists(key)
+
+    def save(self, key, data) -> bool:
+        if not isinstance(data, BUFFER_TYPES):
+            raise TypeError("deduplicated objects must be bytes-like")
+        return self._commit(key, self._chunker.split(data))
+
+    def load(self, key) -> Any:
+        return b"".join(self.load_stream(key))
+
+    def delete(self, key) -> bool:
+        with self._lock:
+            if not self._keeper.exists(key):
+                return False
+            entries = self._manifest(key)
+            deleted = self._keeper.delete(key)
+            if deleted:
+                self._release(entries)
+            return deleted
+
+    def save_stream(self, key, chunks: Iterable[bytes]) -> bool:
+        return self._commit(key, self._chunker.split_stream(chunks))
+
+    def load_stream(self, key, chunk_size: int = None) -> Iterator[bytes]:
+        # chunks are yielded as they were stored, the size is only a hint
+        entries = self._manifest(key)
+
+        def chunks():
+            for batch in _batches(entries, self._window):
+                keys = [self._chunk_key(digest) for digest, _ in batch]
+                for (digest, _), chunk in zip(batch, load_many(self._keeper, keys)):
+                    if self._verify and self._alg(chunk).hexdigest() != digest:
+                        raise ValueError(f"chunk {digest} is corrupted")
+                    yield chunk
+
+        return chunks()
+
+    def size(self, key) -> int:
+        return sum(size for _, size in self._manifest(key))
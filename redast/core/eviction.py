@@ -0,0 +1,212 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+__all__ = ("Bounded", "LRU", "LFU")
+
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Optional
+
+from .packaging import BUFFER_TYPES
+from .storage import Keeper, ScanKeeper, scan
+
+
+class LRU:
+    def __init__(self):
+        self._order: OrderedDict = OrderedDict()
+
+    def insert(self, key):
+        self._order[key] = None
+        self._order.move_to_end(key)
+
+    def touch(self, key):
+        self._order.move_to_end(key)
+
+    def remove(self, key):
+        self._order.pop(key, None)
+
+    def victim(self) -> Any:
+        return next(iter(self._order))
+
+
+class LFU:
+    # keys are grouped by access count, ties are broken by recency
+    def __init__(self):
+        self._counts: Dict[Any, int] = dict()
+        self._buckets: Dict[int, OrderedDict] = defaultdict(OrderedDict)
+        self._min = 0
+
+    def insert(self, key):
+        self.remove(key)
+        self._counts[key] = 1
+        self._buckets[1][key] = None
+        self._min = 1
+
+    def touch(self, key):
+        count = self._counts[key]
+        self._drop(key, count)
+        self._counts[key] = count + 1
+        self._buckets[count + 1][key] = None
+
+    def remove(self, key):
+        count = self._counts.pop(key, None)
+        if count is not None:
+            self._drop(key, count)
+
+    def _drop(self, key, count: int):
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+
+    def victim(self) -> Any:
+        if self._min not in self._buckets:
+            self._min = min(self._buckets)
+        return next(iter(self._buckets[self._min]))
+
+
+policies = dict(
+    lru=LRU,
+    lfu=LFU,
+)
+
+
+def _sizeof(data) -> int:
+    # `sys.getsizeof` is shallow, so the contents of containers and
+    # instances are added, objects referenced twice are counted once
+    size = 0
+    seen = set()
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, BUFFER_TYPES):
+            size += memoryview(item).nbytes
+            continue
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__") and not isinstance(item, type):
+            stack.append(vars(item))
+    return size
+
+
+class Bounded:
+    def __init__(
+        self,
+        keeper: Keeper,
+        *,
+        policy: str = "lru",
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        on_evict: Optional[Callable[[Any, Any], None]] = None,
+    ):
+        if not isinstance(keeper, Keeper):
+            raise ValueError
+        if policy not in policies:
+            raise ValueError(f"policy must be one of {tuple(policies)}")
+        self._keeper = keeper
+        self._policy = policies[policy]()
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        # receives the key and the data of every evicted object
+        self._on_evict = on_evict
+        self._sizes: Dict[Any, int] = dict()
+        self._expires: Dict[Any, float] = dict()
+        self._bytes = 0
+        self._evictions = 0
+        self._lock = threading.RLock()
+        # objects stored before the keeper was opened count against the limits
+        # at once, the next save evicts them if they exceed the limits
+        if isinstance(keeper, ScanKeeper):
+            for key, size in scan(keeper):
+                self._track(key, size)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return dict(
+            entries=len(self._sizes),
+            bytes=self._bytes,
+            evictions=self._evictions,
+        )
+
+    def _track(self, key, size: int):
+        self._forget(key)
+        self._sizes[key] = size
+        self._bytes += size
+        if self._ttl is not None:
+            self._expires[key] = time.monotonic() + self._ttl
+        self._policy.insert(key)
+
+    def _forget(self, key):
+        size = self._sizes.pop(key, None)
+        if size is None:
+            return
+        self._bytes -= size
+        self._expires.pop(key, None)
+        self._policy.remove(key)
+
+    def _evict(self, key):
+        self._forget(key)
+        if self._on_evict is not None:
+            self._on_evict(key, self._keeper.load(key))
+        self._keeper.delete(key)
+        self._evictions += 1
+
+    def _expired(self, key) -> bool:
+        expires = self._expires.get(key)
+        if expires is None or expires > time.monotonic():
+            return False
+        self._evict(key)
+        return True
+
+    def _overflow(self) -> bool:
+        if self._max_entries is not None and len(self._sizes) > self._max_entries:
+            return True
+        return self._max_bytes is not None and self._bytes > self._max_bytes
+
+    def _shrink(self):
+        while self._sizes and self._overflow():
+            self._evict(self._policy.victim())
+
+    def exists(self, key) -> bool:
+        with self._lock:
+            if self._expired(key):
+                return False
+            return self._keeper.exists(key)
+
+    def save(self, key, data) -> bool:
+        with self._lock:
+            saved = self._keeper.save(key, data)
+            if saved:
+                self._track(key, _sizeof(data))
+                self._shrink()
+            return saved
+
+    def load(self, key) -> Any:
+        with self._lock:
+            if self._expired(key):
+                raise KeyError(key)
+            data = self._keeper.load(key)
+            if key in self._sizes:
+                self._policy.touch(key)
+            else:
+                # objects stored before the keeper was opened
+                self._track(key, _sizeof(data))
+                self._shrink()
+            return data
+
+    def delete(self, key) -> bool:
+        with self._lock:
+            self._forget(key)
+            return self._keeper.delete(key)
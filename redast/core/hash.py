@@ -3,9 +3,22 @@
 # see LICENSE for full details
 
 import hashlib
+import os
+import pickle
+import struct
+import threading
 import xxhash
 
-from typing import Iterator
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from cloudpickle import DEFAULT_PROTOCOL, dumps  # type: ignore
+
+BUFFER_TYPES = (bytes, bytearray, memoryview)
+# types that the plain pickler encodes exactly as cloudpickle does
+_SCALARS = frozenset((str, int, float, bool, type(None), bytes))
+_MAX_DEPTH = 16
 
 
 def iterable_hexdigest(algorithm, iterator: Iterator[bytes]) -> str:
@@ -16,9 +29,11 @@ def iterable_hexdigest(algorithm, iterator: Iterator[bytes]) -> str:
 
 
 def hexdigest(algorithm, data: bytes, block_size=2 ** 20):
-    if not isinstance(data, bytes):
+    if not isinstance(data, BUFFER_TYPES):
         raise ValueError
-    iterator = (data[i : i + block_size] for i in range(0, len(data), block_size))
+    # slices of a memoryview share the memory of the data
+    view = memoryview(data).cast("B")
+    iterator = (view[i : i + block_size] for i in range(0, len(view), block_size))
     return iterable_hexdigest(algorithm=algorithm, iterator=iterator)
 
 
@@ -50,9 +65,334 @@ registry = dict(
 )
 
 
-def get_hash_fn(algorithm):
+# the digest of tree hashing depends on the chunk size, so it never changes
+TREE_CHUNK_SIZE = 2 ** 22
+TREE_SUFFIX = "-tree"
+_LEAF = b"\x00"
+_NODE = b"\x01"
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool, _pool_pid
+    # threads do not survive a fork, so every process starts its own pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(thread_name_prefix="redast-hash")
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _rechunk(chunks: Iterable[bytes], size: int) -> Iterator[bytes]:
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= size:
+            yield bytes(buffer[:size])
+            del buffer[:size]
+    if buffer:
+        yield bytes(buffer)
+
+
+class TreeHash:
+    """Merkle tree hashing over fixed chunks with any registered algorithm
+
+    The data is split into chunks of `chunk_size` bytes, the last chunk may
+    be shorter and empty data is a single empty chunk. The digest of a chunk
+    is `H(0x00 || chunk)`. Neighbouring digests are paired from left to
+    right into `H(0x01 || left || right)`, an unpaired last digest is
+    carried to the next level as it is, until one digest remains. Its hex
+    form is the digest of the data.
+
+    Chunks are hashed in parallel threads, since hashlib releases the GIL
+    on large buffers.
+    """
+
+    def __init__(self, algorithm, chunk_size: int = TREE_CHUNK_SIZE):
+        if chunk_size <= 0:
+            raise ValueError("chunk size must be positive")
+        self._alg = get_algorithm(algorithm)
+        self.chunk_size = chunk_size
+
+    def __call__(self) -> "TreeHasher":
+        return TreeHasher(self)
+
+    def leaf(self, chunk) -> bytes:
+        hasher = self._alg()
+        hasher.update(_LEAF)
+        hasher.update(chunk)
+        return hasher.digest()
+
+    def node(self, left: bytes, right: bytes) -> bytes:
+        hasher = self._alg()
+        hasher.update(_NODE)
+        hasher.update(left)
+        hasher.update(right)
+        return hasher.digest()
+
+    def tree(self, data) -> "MerkleTree":
+        if not isinstance(data, BUFFER_TYPES):
+            raise ValueError
+        view = memoryview(data).cast("B")
+        size = self.chunk_size
+        chunks = [view[i : i + size] for i in range(0, len(view), size)]
+        if len(chunks) > 1:
+            leaves = list(_executor().map(self.leaf, chunks))
+        else:
+            leaves = [self.leaf(view)]
+        return MerkleTree(self, leaves)
+
+    def tree_stream(self, chunks: Iterable[bytes]) -> "MerkleTree":
+        hasher = self()
+        for chunk in chunks:
+            hasher.update(chunk)
+        return hasher.tree()
+
+    def hexdigest(self, data) -> str:
+        return self.tree(data).hexdigest()
+
+
+class TreeHasher:
+    """Incremental tree hashing with the interface of hashlib objects"""
+
+    def __init__(self, tree_hash: TreeHash):
+        self._tree_hash = tree_hash
+        self._buffer = bytearray()
+        self._leaves: List[bytes] = []
+        self._pending: Deque = deque()
+        # the number of chunks in flight is bounded to bound the memory
+        self._window = 2 * (os.cpu_count() or 1)
+
+    def update(self, data):
+        self._buffer += data
+        size = self._tree_hash.chunk_size
+        while len(self._buffer) >= size:
+            chunk = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            future = _executor().submit(self._tree_hash.leaf, chunk)
+            self._pending.append(future)
+            while len(self._pending) > self._window:
+                self._leaves.append(self._pending.popleft().result())
+
+    def tree(self) -> "MerkleTree":
+        while self._pending:
+            self._leaves.append(self._pending.popleft().result())
+        leaves = list(self._leaves)
+        if self._buffer or not leaves:
+            leaves.append(self._tree_hash.leaf(self._buffer))
+        return MerkleTree(self._tree_hash, leaves)
+
+    def digest(self) -> bytes:
+        return self.tree().digest()
+
+    def hexdigest(self) -> str:
+        return self.tree().hexdigest()
+
+
+class MerkleTree:
+    """Digests of the chunks of an object, used to verify partial reads"""
+
+    def __init__(self, tree_hash: TreeHash, leaves: List[bytes]):
+        self._tree_hash = tree_hash
+        self.leaves = leaves
+
+    @property
+    def chunk_size(self) -> int:
+        return self._tree_hash.chunk_size
+
+    def __len__(self) -> int:
+        return len(self.leaves)
+
+    def _levels(self) -> List[List[bytes]]:
+        node = self._tree_hash.node
+        levels = [self.leaves]
+        while len(levels[-1]) > 1:
+            level = levels[-1]
+            pairs = range(0, len(level) - 1, 2)
+            upper = [node(level[i], level[i + 1]) for i in pairs]
+            if len(level) % 2:
+                upper.append(level[-1])
+            levels.append(upper)
+        return levels
+
+    def digest(self) -> bytes:
+        return self._levels()[-1][0]
+
+    def hexdigest(self) -> str:
+        return self.digest().hex()
+
+    def proof(self, index: int) -> List[Tuple[bool, bytes]]:
+        """Sibling digests on the path from a chunk to the root
+
+        Each sibling is paired with True when it lies on the left.
+        """
+        if not 0 <= index < len(self.leaves):
+            raise IndexError(index)
+        path = []
+        for level in self._levels()[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                path.append((sibling < index, level[sibling]))
+            index //= 2
+        return path
+
+    def verify(self, index: int, chunk) -> bool:
+        """Checks one chunk of the object without reading the others"""
+        if not 0 <= index < len(self.leaves):
+            return False
+        return self._tree_hash.leaf(chunk) == self.leaves[index]
+
+    def verified(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Yields the chunks of a stream only after each one is verified"""
+        count = 0
+        for index, chunk in enumerate(_rechunk(chunks, self.chunk_size)):
+            if not self.verify(index, chunk):
+                raise ValueError(f"chunk {index} does not match its digest")
+            count = index + 1
+            yield chunk
+        if count == 0:
+            # empty data is a single empty chunk
+            count = int(self.verify(0, b""))
+        if count != len(self.leaves):
+            raise ValueError("stream is shorter than the tree")
+
+
+def verify_proof(
+    tree_hash: TreeHash, digest: str, chunk, proof: List[Tuple[bool, bytes]]
+) -> bool:
+    """Checks one chunk against the digest of the object and its proof"""
+    node = tree_hash.leaf(chunk)
+    for left, sibling in proof:
+        node = tree_hash.node(sibling, node) if left else tree_hash.node(node, sibling)
+    return node.hex() == digest
+
+
+def checked(chunks: Iterable[bytes], hasher, digest: str) -> Iterator[bytes]:
+    """Yields a stream and raises ValueError if its digest does not match
+
+    The last chunk is held back until the whole stream is hashed, so an
+    unverified stream is never delivered completely.
+    """
+    last = None
+    for chunk in chunks:
+        hasher.update(chunk)
+        if last is not None:
+            yield last
+        last = chunk
+    if hasher.hexdigest() != digest:
+        raise ValueError("stream does not match its digest")
+    if last is not None:
+        yield last
+
+
+def get_algorithm(algorithm):
     if isinstance(algorithm, str):
+        # `<algorithm>-tree` names the tree hashing with a registered algorithm
+        if algorithm.endswith(TREE_SUFFIX):
+            return TreeHash(algorithm[: -len(TREE_SUFFIX)])
         if algorithm not in registry:
             raise ValueError
         algorithm = registry[algorithm]
+    return algorithm
+
+
+def get_hash_fn(algorithm):
+    algorithm = get_algorithm(algorithm)
+    if isinstance(algorithm, TreeHash):
+        return algorithm.hexdigest
     return get_hexdigest(algorithm)
+
+
+def get_iterable_hash_fn(algorithm):
+    algorithm = get_algorithm(algorithm)
+
+    def inner(iterator: Iterator[bytes]):
+        return iterable_hexdigest(algorithm=algorithm, iterator=iterator)
+
+    return inner
+
+
+def _plain(data, depth: int = 0) -> bool:
+    kind = type(data)
+    if kind in _SCALARS:
+        return True
+    if depth > _MAX_DEPTH:
+        return False
+    if kind is tuple or kind is list:
+        return all(_plain(item, depth + 1) for item in data)
+    if kind is dict:
+        return all(
+            _plain(key, depth + 1) and _plain(value, depth + 1)
+            for key, value in data.items()
+        )
+    return False
+
+
+def _is_ndarray(data) -> bool:
+    # arrays of objects may hold lambdas or classes only cloudpickle can dump
+    kind = type(data)
+    if kind.__name__ != "ndarray" or kind.__module__ != "numpy":
+        return False
+    return not data.dtype.hasobject
+
+
+def encode(data) -> Any:
+    """Bytes of an object that are hashed to get its key
+
+    Bytes-like objects are hashed as they are. Strings, numbers and
+    containers of them, as well as numpy arrays without objects, are encoded
+    by the C pickler: cloudpickle produces exactly the same bytes for them,
+    only several times slower, so the keys do not change.
+    """
+    if isinstance(data, BUFFER_TYPES):
+        return data
+    if _plain(data) or _is_ndarray(data):
+        return pickle.dumps(data, protocol=DEFAULT_PROTOCOL)
+    return dumps(data)
+
+
+def _typed(data, depth: int = 0) -> Optional[Hashable]:
+    # a memo key that tells apart equal values of different types,
+    # such as 1, 1.0 and True, and equal floats with different bits,
+    # such as 0.0 and -0.0, since they are encoded differently
+    kind = type(data)
+    if kind is float:
+        return kind, struct.pack("<d", data)
+    if kind in _SCALARS:
+        return kind, data
+    if depth > _MAX_DEPTH:
+        return None
+    if kind is tuple or kind is list:
+        items = tuple(_typed(item, depth + 1) for item in data)
+        if None in items:
+            return None
+        return kind, items
+    return None
+
+
+class HashMemo:
+    """Bounded memo of digests of small plain objects, such as link markers"""
+
+    def __init__(self, fn, size: int):
+        self._fn = fn
+        self._size = size
+        self._memo: dict = dict()
+
+    def __call__(self, data) -> str:
+        key = _typed(data)
+        if key is None:
+            return self._fn(data)
+        digest = self._memo.pop(key, None)
+        if digest is None:
+            digest = self._fn(data)
+            if len(self._memo) >= self._size:
+                self._memo.pop(next(iter(self._memo)), None)
+        self._memo[key] = digest
+        return digest
+
+
+def memoized(fn, size: int):
+    return HashMemo(fn, size) if size > 0 else fn
@@ -0,0 +1,259 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+__all__ = (
+    "Instrument",
+    "Recorder",
+    "PrometheusInstrument",
+    "OpenTelemetryInstrument",
+)
+
+import importlib
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+
+def _require(module: str, package: str):
+    try:
+        return importlib.import_module(module)
+    except ImportError as e:
+        raise ImportError(f"install `{package}` to use this instrument") from e
+
+
+def _nbytes(data) -> int:
+    # sizes of objects that are not bytes or strings are not known
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return memoryview(data).nbytes
+    if isinstance(data, str):
+        return len(data)
+    return 0
+
+
+class Instrument:
+    """Receiver of measurements, every hook does nothing by default
+
+    `operation` gets the duration of a keeper operation or of hashing and
+    the number of bytes it moved. `stage` gets the duration of one packager
+    and the sizes of its input and output. `cache` gets hits and misses of
+    bridges and tiered stores. Sizes of objects that are neither bytes nor
+    strings are 0.
+    """
+
+    def operation(self, component: str, name: str, seconds: float, size: int):
+        pass
+
+    def stage(
+        self,
+        packer: str,
+        direction: str,
+        seconds: float,
+        size_in: int,
+        size_out: int,
+    ):
+        pass
+
+    def cache(self, component: str, hit: bool, count: int = 1, tier: int = 0):
+        pass
+
+
+class Recorder(Instrument):
+    """Instrument that aggregates measurements in memory"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._operations: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(
+                lambda: dict(count=0, seconds=0.0, max_seconds=0.0, bytes=0)
+            )
+            self._stages: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(
+                lambda: dict(count=0, seconds=0.0, bytes_in=0, bytes_out=0)
+            )
+            self._caches: Dict[Tuple[str, int], Dict[str, int]] = defaultdict(
+                lambda: dict(hits=0, misses=0)
+            )
+
+    def operation(self, component: str, name: str, seconds: float, size: int):
+        with self._lock:
+            entry = self._operations[component, name]
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            entry["bytes"] += size
+
+    def stage(
+        self,
+        packer: str,
+        direction: str,
+        seconds: float,
+        size_in: int,
+        size_out: int,
+    ):
+        with self._lock:
+            entry = self._stages[packer, direction]
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["bytes_in"] += size_in
+            entry["bytes_out"] += size_out
+
+    def cache(self, component: str, hit: bool, count: int = 1, tier: int = 0):
+        with self._lock:
+            self._caches[component, tier]["hits" if hit else "misses"] += count
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Copies of the aggregates, stages also report their ratio of sizes"""
+        with self._lock:
+            operations = {
+                f"{component}.{name}": dict(entry)
+                for (component, name), entry in self._operations.items()
+            }
+            stages = dict()
+            for (packer, direction), entry in self._stages.items():
+                entry = dict(entry)
+                if entry["bytes_in"]:
+                    entry["ratio"] = entry["bytes_out"] / entry["bytes_in"]
+                stages[f"{packer}.{direction}"] = entry
+            caches = {
+                f"{component}[{tier}]": dict(entry)
+                for (component, tier), entry in self._caches.items()
+            }
+        return dict(operations=operations, stages=stages, caches=caches)
+
+
+# ratios of output to input sizes of packagers, compression is below 1
+_RATIO_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9, 1.0, 1.1, 1.5, 2.0)
+
+
+class PrometheusInstrument(Instrument):
+    """Instrument that exports histograms and counters with `prometheus_client`"""
+
+    def __init__(
+        self,
+        registry=None,
+        *,
+        prefix: str = "redast",
+        buckets: Optional[Sequence[float]] = None,
+    ):
+        client = _require("prometheus_client", "prometheus-client")
+        options: Dict[str, Any] = dict()
+        if registry is not None:
+            options["registry"] = registry
+        timing = dict(options)
+        if buckets is not None:
+            timing["buckets"] = tuple(buckets)
+        self._operation_seconds = client.Histogram(
+            f"{prefix}_operation_seconds",
+            "Duration of keeper operations and hashing",
+            ("component", "operation"),
+            **timing,
+        )
+        self._operation_bytes = client.Counter(
+            f"{prefix}_operation_bytes",
+            "Bytes moved by keeper operations and hashing",
+            ("component", "operation"),
+            **options,
+        )
+        self._stage_seconds = client.Histogram(
+            f"{prefix}_stage_seconds",
+            "Duration of packagers",
+            ("packer", "direction"),
+            **timing,
+        )
+        self._stage_bytes = client.Counter(
+            f"{prefix}_stage_bytes",
+            "Bytes passed in and out of packagers",
+            ("packer", "direction", "side"),
+            **options,
+        )
+        self._stage_ratio = client.Histogram(
+            f"{prefix}_stage_ratio",
+            "Ratio of output to input sizes of packagers",
+            ("packer", "direction"),
+            buckets=_RATIO_BUCKETS,
+            **options,
+        )
+        self._cache_requests = client.Counter(
+            f"{prefix}_cache_requests",
+            "Hits and misses of caches",
+            ("component", "tier", "result"),
+            **options,
+        )
+
+    def operation(self, component: str, name: str, seconds: float, size: int):
+        self._operation_seconds.labels(component, name).observe(seconds)
+        if size:
+            self._operation_bytes.labels(component, name).inc(size)
+
+    def stage(
+        self,
+        packer: str,
+        direction: str,
+        seconds: float,
+        size_in: int,
+        size_out: int,
+    ):
+        self._stage_seconds.labels(packer, direction).observe(seconds)
+        self._stage_bytes.labels(packer, direction, "in").inc(size_in)
+        self._stage_bytes.labels(packer, direction, "out").inc(size_out)
+        if size_in and size_out:
+            self._stage_ratio.labels(packer, direction).observe(size_out / size_in)
+
+    def cache(self, component: str, hit: bool, count: int = 1, tier: int = 0):
+        result = "hit" if hit else "miss"
+        self._cache_requests.labels(component, str(tier), result).inc(count)
+
+
+class OpenTelemetryInstrument(Instrument):
+    """Instrument that records spans with `opentelemetry-api`
+
+    Operations and stages become child spans of the current span with their
+    measured start and end times. Cache hits and misses become events of the
+    current span.
+    """
+
+    def __init__(self, tracer=None):
+        trace = _require("opentelemetry.trace", "opentelemetry-api")
+        self._trace = trace
+        self._tracer = tracer if tracer is not None else trace.get_tracer("redast")
+
+    def _span(self, name: str, seconds: float, attributes: Dict[str, Any]):
+        end = time.time_ns()
+        span = self._tracer.start_span(
+            name, start_time=end - int(seconds * 1e9), attributes=attributes
+        )
+        span.end(end_time=end)
+
+    def operation(self, component: str, name: str, seconds: float, size: int):
+        attributes = {"redast.component": component, "redast.bytes": size}
+        self._span(f"{component}.{name}", seconds, attributes)
+
+    def stage(
+        self,
+        packer: str,
+        direction: str,
+        seconds: float,
+        size_in: int,
+        size_out: int,
+    ):
+        attributes = {
+            "redast.packer": packer,
+            "redast.bytes_in": size_in,
+            "redast.bytes_out": size_out,
+        }
+        if size_in:
+            attributes["redast.ratio"] = size_out / size_in
+        self._span(f"{packer}.{direction}", seconds, attributes)
+
+    def cache(self, component: str, hit: bool, count: int = 1, tier: int = 0):
+        attributes = {
+            "redast.component": component,
+            "redast.tier": tier,
+            "redast.count": count,
+        }
+        name = "redast.cache.hit" if hit else "redast.cache.miss"
+        self._trace.get_current_span().add_event(name, attributes)
@@ -4,26 +4,53 @@
 
 __all__ = (
     "Packaging",
+    "StreamPackaging",
     "Conveyor",
     "Compression",
     "Pickling",
+    "NumpyArray",
     "Base64",
     "Json",
     "Encoding",
     "Encryption",
 )
 
+import ast
 import base64
+import functools
+import hmac
+import itertools
 import os
 import pickle
+import struct
+import tempfile
+import time
 import zlib
 import json
+from collections import deque
+from concurrent.futures import Executor
 from hashlib import sha256
-from typing import Any, Protocol, Union, runtime_checkable
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+    Protocol,
+    Union,
+    runtime_checkable,
+)
 
 import cloudpickle  # type: ignore
-from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives import hashes, padding
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+from . import compressors
+from .compressors import STREAM_CHUNK_SIZE
+from .metrics import Instrument, _nbytes
 
 
 @runtime_checkable
@@ -36,43 +63,368 @@ class Packaging(Protocol):
         pass
 
 
+@runtime_checkable
+class StreamPackaging(Packaging, Protocol):
+    def forward_stream(self, i: Iterable[bytes]) -> Iterator[bytes]:
+        pass
+
+    def backward_stream(self, o: Iterable[bytes]) -> Iterator[bytes]:
+        pass
+
+
+# packagers accept any of these in `backward`, so that memory mapped data is not copied
+BUFFER_TYPES = (bytes, bytearray, memoryview)
+
+
+def _regroup(chunks: Iterable[bytes], size: int) -> Iterator[bytes]:
+    # yields chunks whose length is a multiple of `size`, except the last one
+    tail = b""
+    for chunk in chunks:
+        tail += chunk
+        cut = len(tail) - len(tail) % size
+        if cut:
+            yield tail[:cut]
+            tail = tail[cut:]
+    if tail:
+        yield tail
+
+
+def imap(
+    fn: Callable,
+    items: Iterable,
+    executor: Optional[Executor] = None,
+    window: int = 64,
+) -> Iterator:
+    # ordered map with at most `window` items in flight
+    if executor is None:
+        yield from map(fn, items)
+        return
+    pending: deque = deque()
+    for item in items:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(executor.submit(fn, item))
+    while pending:
+        yield pending.popleft().result()
+
+
 class Conveyor:
-    def __init__(self, *packer: Packaging):
+    def __init__(self, *packer: Packaging, instrument: Optional[Instrument] = None):
         if not all([isinstance(p, Packaging) for p in packer]):
             raise TypeError
         self._packers = packer
+        self._instrument = instrument
+
+    def __getstate__(self):
+        # a conveyor sent to a worker process leaves its instrument behind,
+        # so stages packed by process pools are not measured
+        state = self.__dict__.copy()
+        state["_instrument"] = None
+        return state
 
     def forward(self, i) -> Any:
+        if self._instrument is not None:
+            return self._measured(i, "forward", self._packers)
         for p in self._packers:
             i = p.forward(i)
         return i
 
     def backward(self, o) -> Any:
+        if self._instrument is not None:
+            return self._measured(o, "backward", reversed(self._packers))
         for p in reversed(self._packers):
             o = p.backward(o)
         return o
 
+    def _measured(self, data, direction: str, packers: Iterable[Packaging]) -> Any:
+        for p in packers:
+            start = time.perf_counter()
+            out = getattr(p, direction)(data)
+            seconds = time.perf_counter() - start
+            self._instrument.stage(
+                type(p).__name__, direction, seconds, _nbytes(data), _nbytes(out)
+            )
+            data = out
+        return data
+
+    def forward_many(
+        self,
+        i: Iterable,
+        executor: Optional[Executor] = None,
+        window: int = 64,
+    ) -> Iterator:
+        return imap(self.forward, i, executor=executor, window=window)
+
+    def backward_many(
+        self,
+        o: Iterable,
+        executor: Optional[Executor] = None,
+        window: int = 64,
+    ) -> Iterator:
+        return imap(self.backward, o, executor=executor, window=window)
+
+    @property
+    def bytewise(self) -> bool:
+        # every packer maps bytes to bytes, so streams can pass the conveyor
+        return all([isinstance(p, StreamPackaging) for p in self._packers])
+
+    @property
+    def streaming(self) -> bool:
+        # packers that need the whole data, such as chacha20 encryption,
+        # report it, and the conveyor packs their stage of a stream at once
+        return self.bytewise and all(_streams(p) for p in self._packers)
+
+    def forward_stream(self, i: Iterable[bytes]) -> Iterator[bytes]:
+        for p in self._packers:
+            i = p.forward_stream(i) if _streams(p) else _whole(p.forward, i)
+        return iter(i)
+
+    def backward_stream(self, o: Iterable[bytes]) -> Iterator[bytes]:
+        for p in reversed(self._packers):
+            o = p.backward_stream(o) if _streams(p) else _whole(p.backward, o)
+        return iter(o)
+
+
+def _streams(packer: Packaging) -> bool:
+    return getattr(packer, "streaming", True)
+
+
+def _whole(fn: Callable[[bytes], bytes], chunks: Iterable[bytes]) -> Iterator[bytes]:
+    yield fn(b"".join(chunks))
+
 
 class Compression:
-    def __init__(self, level=3):
+    # data of every codec but zlib starts with the header and the codec id,
+    # zlib data is stored as is, so data compressed before codecs were added still loads
+    _HEADER = b"RDC"
+
+    def __init__(
+        self,
+        level=3,
+        codec: str = "zlib",
+        dictionary: Optional[bytes] = None,
+    ):
+        if codec not in compressors.registry:
+            raise ValueError(f"codec must be one of {tuple(compressors.registry)}")
         self._level = level
+        self._codec = compressors.registry[codec](level=level, dictionary=dictionary)
+
+    def _prefix(self) -> bytes:
+        if self._codec.id == compressors.Zlib.id:
+            return b""
+        return Compression._HEADER + bytes([self._codec.id])
+
+    def _detect(self, o) -> tuple:
+        # returns the codec of the data and the offset of the compressed payload
+        header = Compression._HEADER
+        if o[: len(header)] != header:
+            return compressors.Zlib(), 0
+        codec_id = o[len(header)]
+        if codec_id == self._codec.id:
+            return self._codec, len(header) + 1
+        return compressors.by_id[codec_id](), len(header) + 1
+
+    @staticmethod
+    def train(samples: Iterable[bytes], size: int = 112_640) -> bytes:
+        return compressors.Zstd.train(samples, size=size)
 
     def forward(self, i: bytes) -> bytes:
         assert isinstance(i, bytes)
-        return zlib.compress(i, level=self._level)
+        return self._prefix() + self._codec.compress(i)
 
     def backward(self, o: bytes) -> bytes:
-        assert isinstance(o, bytes)
-        return zlib.decompress(o)
+        assert isinstance(o, BUFFER_TYPES)
+        codec, offset = self._detect(o)
+        return codec.decompress(memoryview(o)[offset:] if offset else o)
+
+    def forward_stream(self, i: Iterable[bytes]) -> Iterator[bytes]:
+        prefix = self._prefix()
+        if prefix:
+            yield prefix
+        for chunk in self._codec.compress_stream(i):
+            if chunk:
+                yield chunk
+
+    def backward_stream(self, o: Iterable[bytes]) -> Iterator[bytes]:
+        o = iter(o)
+        head = b""
+        for chunk in o:
+            head += chunk
+            if len(head) > len(Compression._HEADER):
+                break
+        codec, offset = self._detect(head)
+        stream = itertools.chain([head[offset:]], o)
+        for chunk in codec.decompress_stream(stream):
+            if chunk:
+                yield chunk
 
 
 class Pickling:
+    # layout of out-of-band data: header, pickle, 64-byte aligned raw buffers
+    _MAGIC = b"RDOB"
+    _HEADER = struct.Struct("<4sIQ")
+    _ALIGN = 64
+
+    def __init__(self, out_of_band: bool = False):
+        self._out_of_band = out_of_band
+
     def forward(self, i) -> bytes:
-        return cloudpickle.dumps(i)
+        if not self._out_of_band:
+            return cloudpickle.dumps(i)
+        buffers: list = []
+        payload = cloudpickle.dumps(i, protocol=5, buffer_callback=buffers.append)
+        raws = [buffer.raw() for buffer in buffers]
+        header = Pickling._HEADER.pack(Pickling._MAGIC, len(raws), len(payload))
+        sizes = struct.pack(f"<{len(raws)}Q", *[raw.nbytes for raw in raws])
+        parts = [header, sizes, payload]
+        offset = len(header) + len(sizes) + len(payload)
+        for raw in raws:
+            pad = -offset % Pickling._ALIGN
+            parts += [bytes(pad), raw]
+            offset += pad + raw.nbytes
+        return b"".join(parts)
 
     def backward(self, o: bytes) -> Any:
-        assert isinstance(o, bytes)
-        return pickle.loads(o)
+        assert isinstance(o, BUFFER_TYPES)
+        view = memoryview(o)
+        if view[:4] != Pickling._MAGIC:
+            return pickle.loads(o)
+        _, count, size = Pickling._HEADER.unpack_from(view)
+        offset = Pickling._HEADER.size
+        sizes = struct.unpack_from(f"<{count}Q", view, offset)
+        offset += 8 * count
+        payload = view[offset : offset + size]
+        offset += size
+        buffers = []
+        for nbytes in sizes:
+            offset += -offset % Pickling._ALIGN
+            buffers.append(view[offset : offset + nbytes])
+            offset += nbytes
+        return pickle.loads(payload, buffers=buffers)
+
+
+def _numpy():
+    try:
+        import numpy  # type: ignore
+    except ImportError as e:
+        raise ImportError("install `numpy` to use `NumpyArray`") from e
+    return numpy
+
+
+@functools.lru_cache(maxsize=256)
+def _dtype(descr: bytes):
+    return _numpy().lib.format.descr_to_dtype(ast.literal_eval(str(descr, "utf-8")))
+
+
+class NumpyArray:
+    """Raw memory of a numpy array after a small header with its dtype and shape
+
+    The memory starts at a 64-byte aligned offset, so arrays without filters
+    are loaded with `numpy.frombuffer` without copying, also from memory
+    mapped files. The `delta` filter stores differences of neighbouring
+    elements and the `shuffle` filter groups bytes of the same significance,
+    both help a following compression. The filters are recorded in the
+    header, so data is loaded whatever filters the packager has.
+    """
+
+    # magic, version, filters, fortran order, number of dimensions, dtype length
+    _HEADER = struct.Struct("<4sBBBxII")
+    _MAGIC = b"RDNA"
+    _VERSION = 1
+    _ALIGN = 64
+    _DELTA = 1
+    _SHUFFLE = 2
+
+    def __init__(self, delta: bool = False, shuffle: bool = False):
+        # numpy is checked here but resolved on use, so packagers pickle
+        _numpy()
+        self._filters = 0
+        if delta:
+            self._filters |= NumpyArray._DELTA
+        if shuffle:
+            self._filters |= NumpyArray._SHUFFLE
+
+    def _words(self, itemsize: int):
+        # differences are taken between unsigned words of the element bytes,
+        # so they wrap around and are exact for any dtype
+        size = next(size for size in (8, 4, 2, 1) if itemsize % size == 0)
+        return _numpy().dtype(f"<u{size}")
+
+    def _encode(self, raw, itemsize: int):
+        np = _numpy()
+        if self._filters & NumpyArray._DELTA and raw.size:
+            words = raw.view(self._words(itemsize))
+            delta = np.empty_like(words)
+            delta[0] = words[0]
+            np.subtract(words[1:], words[:-1], out=delta[1:])
+            raw = delta.view(np.uint8)
+        if self._filters & NumpyArray._SHUFFLE and itemsize > 1:
+            raw = raw.reshape(-1, itemsize).T.ravel()
+        return raw
+
+    def _decode(self, raw, filters: int, itemsize: int):
+        np = _numpy()
+        if filters & NumpyArray._SHUFFLE and itemsize > 1:
+            raw = raw.reshape(itemsize, -1).T.ravel()
+        if filters & NumpyArray._DELTA and raw.size:
+            words = self._words(itemsize)
+            raw = np.cumsum(raw.view(words), dtype=words).view(np.uint8)
+        return raw
+
+    def forward(self, i) -> bytes:
+        np = _numpy()
+        if not isinstance(i, np.ndarray):
+            raise TypeError("numpy array expected")
+        if i.dtype.hasobject:
+            raise TypeError("arrays of python objects must be pickled")
+        fortran = i.flags.f_contiguous and not i.flags.c_contiguous
+        if not (i.flags.c_contiguous or fortran):
+            i = np.ascontiguousarray(i)
+        raw = i.reshape(-1, order="A").view(np.uint8)
+        raw = self._encode(raw, i.dtype.itemsize)
+        descr = repr(np.lib.format.dtype_to_descr(i.dtype)).encode()
+        header = NumpyArray._HEADER.pack(
+            NumpyArray._MAGIC,
+            NumpyArray._VERSION,
+            self._filters,
+            fortran,
+            i.ndim,
+            len(descr),
+        )
+        shape = struct.pack(f"<{i.ndim}Q", *i.shape)
+        size = len(header) + len(descr) + len(shape)
+        pad = bytes(-size % NumpyArray._ALIGN)
+        return b"".join([header, descr, shape, pad, raw])
+
+    def backward(self, o):
+        assert isinstance(o, BUFFER_TYPES)
+        np = _numpy()
+        view = memoryview(o).cast("B")
+        magic, version, filters, fortran, ndim, size = NumpyArray._HEADER.unpack_from(
+            view
+        )
+        if magic != NumpyArray._MAGIC or version != NumpyArray._VERSION:
+            raise ValueError("data is not a packed numpy array")
+        offset = NumpyArray._HEADER.size
+        dtype = _dtype(bytes(view[offset : offset + size]))
+        offset += size
+        shape = struct.unpack_from(f"<{ndim}Q", view, offset)
+        offset += 8 * ndim
+        offset += -offset % NumpyArray._ALIGN
+        count = 1
+        for length in shape:
+            count *= length
+        order = "F" if fortran else "C"
+        if count == 0 or dtype.itemsize == 0:
+            return np.empty(shape, dtype=dtype, order=order)
+        if not filters:
+            flat = np.frombuffer(view, dtype=dtype, count=count, offset=offset)
+        else:
+            raw = np.frombuffer(
+                view, dtype=np.uint8, count=count * dtype.itemsize, offset=offset
+            )
+            flat = self._decode(raw, filters, dtype.itemsize).view(dtype)
+        return flat.reshape(shape, order=order)
 
 
 class Base64:
@@ -81,12 +433,19 @@ class Base64:
         return base64.urlsafe_b64encode(i)
 
     def backward(self, o: bytes) -> bytes:
-        assert isinstance(o, bytes)
+        assert isinstance(o, BUFFER_TYPES)
         return base64.urlsafe_b64decode(o)
 
+    def forward_stream(self, i: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in _regroup(i, 3):
+            yield base64.urlsafe_b64encode(chunk)
+
+    def backward_stream(self, o: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in _regroup(o, 4):
+            yield base64.urlsafe_b64decode(chunk)
+
 
 class Json:
-    # TODO: numpy array?
     def forward(self, i) -> str:
         return json.dumps(i)
 
@@ -105,10 +464,35 @@ class Encoding:
         return i.encode(encoding=self._encoding)
 
     def backward(self, o: bytes) -> str:
-        assert isinstance(o, bytes)
+        assert isinstance(o, BUFFER_TYPES)
         return str(o, encoding=self._encoding)
 
 
+KDF = ("sha256", "pbkdf2", "scrypt")
+ENCRYPTION_MODES = ("ecb", "gcm", "chacha20")
+_NONCE_SIZE = 12
+_TAG_SIZE = 16
+
+
+@functools.lru_cache(maxsize=64)
+def _derive_key(password: bytes, seed: int, kdf: str) -> bytes:
+    # derivation is slow by design, so keys are memoized per password and seed
+    salt = Encryption._hash((seed).to_bytes(16, byteorder="big"))
+    if kdf == "pbkdf2":
+        return PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=salt,
+            iterations=390_000,
+        ).derive(password)
+    if kdf == "scrypt":
+        return Scrypt(salt=salt, length=32, n=2**15, r=8, p=1).derive(password)
+    password += salt
+    for _ in range(390_000):
+        password = Encryption._hash(password)
+    return password
+
+
 class Encryption:
     def __init__(
         self,
@@ -116,20 +500,54 @@ class Encryption:
         key: Union[str, bytes] = None,
         password: Union[str, bytes] = None,
         seed: int = None,
+        kdf: str = "sha256",
+        mode: str = "ecb",
     ):
         if key is not None:
             if isinstance(key, str):
                 key = base64.urlsafe_b64decode(key)
             if not isinstance(key, bytes):
                 raise ValueError("key must be represented in bytes")
+        elif password is not None:
+            if seed is None:
+                raise ValueError(
+                    "when using a password, you must specify the salt seed"
+                )
+            if kdf not in KDF:
+                raise ValueError(f"kdf must be one of {KDF}")
+            if isinstance(password, str):
+                password = password.encode("utf-8")
+        if mode not in ENCRYPTION_MODES:
+            raise ValueError(f"mode must be one of {ENCRYPTION_MODES}")
+        self._key = key
+        self._password = password
+        self._seed = seed
+        self._kdf = kdf
+        self._mode = mode
 
-        self._key = key or base64.urlsafe_b64decode(
-            Encryption.generate_key(password=password, seed=seed)
-        )
+    @property
+    def _secret(self) -> bytes:
+        # the key is derived from the password on first use
+        if self._key is None:
+            if self._password is None:
+                self._key = os.urandom(32)
+            else:
+                self._key = _derive_key(self._password, self._seed, self._kdf)
+        return self._key
 
     @property
     def key(self) -> str:
-        return str(base64.urlsafe_b64encode(self._key), "utf-8")
+        return str(base64.urlsafe_b64encode(self._secret), "utf-8")
+
+    @property
+    def _nonce_secret(self) -> bytes:
+        return Encryption._hash(b"redast-nonce" + self._secret)
+
+    def _nonce(self, data: bytes) -> bytes:
+        # a synthetic nonce (SIV) computed from the data itself, so equal
+        # objects get equal keys and links stay valid; it reveals only that
+        # two objects are equal, as their content keys do anyway
+        return hmac.new(self._nonce_secret, data, "sha256").digest()[:_NONCE_SIZE]
 
     @staticmethod
     def _hash(data: bytes) -> bytes:
@@ -146,29 +564,111 @@ class Encryption:
         return padding.PKCS7(algorithms.AES.block_size)
 
     @staticmethod
-    def generate_key(password: Union[str, bytes] = None, seed: int = None) -> str:
-        if password is None:
-            return str(base64.urlsafe_b64encode(os.urandom(32)), "utf-8")
-        if seed is None:
-            raise ValueError("when using a password, you must specify the salt seed")
-        if isinstance(password, str):
-            password = password.encode("utf-8")
-        salt = Encryption._hash((seed).to_bytes(16, byteorder="big"))
-        password += salt
-        for _ in range(390_000):
-            password = Encryption._hash(password)
-        return str(base64.urlsafe_b64encode(password), "utf-8")
+    def generate_key(
+        password: Union[str, bytes] = None,
+        seed: int = None,
+        kdf: str = "sha256",
+    ) -> str:
+        encryption = Encryption(password=password, seed=seed, kdf=kdf)
+        return encryption.key
+
+    def _aead(self):
+        if self._mode == "gcm":
+            return AESGCM(self._secret)
+        return ChaCha20Poly1305(self._secret)
 
     def forward(self, i: bytes) -> bytes:
         assert isinstance(i, bytes)
+        if self._mode != "ecb":
+            nonce = self._nonce(i)
+            return nonce + self._aead().encrypt(nonce, i, None)
         padder = Encryption._padding().padder()
-        encryptor = Encryption._cipher(self._key).encryptor()
+        encryptor = Encryption._cipher(self._secret).encryptor()
         padded = padder.update(i) + padder.finalize()
         return encryptor.update(padded) + encryptor.finalize()
 
     def backward(self, o: bytes) -> bytes:
-        assert isinstance(o, bytes)
+        assert isinstance(o, BUFFER_TYPES)
+        if self._mode != "ecb":
+            o = memoryview(o)
+            return self._aead().decrypt(o[:_NONCE_SIZE], o[_NONCE_SIZE:], None)
         unpadder = Encryption._padding().unpadder()
-        decryptor = Encryption._cipher(self._key).decryptor()
+        decryptor = Encryption._cipher(self._secret).decryptor()
         padded = decryptor.update(o) + decryptor.finalize()
         return unpadder.update(padded) + unpadder.finalize()
+
+    @property
+    def streaming(self) -> bool:
+        return self._mode != "chacha20"
+
+    def _check_stream(self):
+        # checked before the stream starts, so nothing is written
+        if not self.streaming:
+            raise TypeError("chacha20 encryption does not support streaming")
+
+    def forward_stream(self, i: Iterable[bytes]) -> Iterator[bytes]:
+        self._check_stream()
+        if self._mode == "gcm":
+            return self._gcm_forward_stream(i)
+        return self._ecb_forward_stream(i)
+
+    def backward_stream(self, o: Iterable[bytes]) -> Iterator[bytes]:
+        self._check_stream()
+        if self._mode == "gcm":
+            return self._gcm_backward_stream(o)
+        return self._ecb_backward_stream(o)
+
+    def _ecb_forward_stream(self, i: Iterable[bytes]) -> Iterator[bytes]:
+        padder = Encryption._padding().padder()
+        encryptor = Encryption._cipher(self._secret).encryptor()
+        for chunk in i:
+            yield encryptor.update(padder.update(chunk))
+        yield encryptor.update(padder.finalize()) + encryptor.finalize()
+
+    def _ecb_backward_stream(self, o: Iterable[bytes]) -> Iterator[bytes]:
+        unpadder = Encryption._padding().unpadder()
+        decryptor = Encryption._cipher(self._secret).decryptor()
+        for chunk in o:
+            yield unpadder.update(decryptor.update(chunk))
+        yield unpadder.update(decryptor.finalize()) + unpadder.finalize()
+
+    # streamed gcm data has the same layout as `forward`: nonce, ciphertext, tag
+    def _gcm_forward_stream(self, i: Iterable[bytes]) -> Iterator[bytes]:
+        # the nonce depends on the whole plaintext, which is spooled to a
+        # temporary file while it is authenticated and then encrypted
+        with tempfile.SpooledTemporaryFile(max_size=STREAM_CHUNK_SIZE) as spool:
+            mac = hmac.new(self._nonce_secret, digestmod="sha256")
+            for chunk in i:
+                mac.update(chunk)
+                spool.write(chunk)
+            nonce = mac.digest()[:_NONCE_SIZE]
+            spool.seek(0)
+            cipher = Cipher(algorithms.AES(self._secret), modes.GCM(nonce))
+            encryptor = cipher.encryptor()
+            yield nonce
+            for chunk in iter(lambda: spool.read(STREAM_CHUNK_SIZE), b""):
+                yield encryptor.update(chunk)
+        yield encryptor.finalize() + encryptor.tag
+
+    def _gcm_backward_stream(self, o: Iterable[bytes]) -> Iterator[bytes]:
+        # plaintext is spooled until the tag at the end of the stream is
+        # verified, so unauthenticated data never reaches the caller
+        with tempfile.SpooledTemporaryFile(max_size=STREAM_CHUNK_SIZE) as spool:
+            buffer = b""
+            decryptor = None
+            for chunk in o:
+                buffer += chunk
+                if decryptor is None:
+                    if len(buffer) < _NONCE_SIZE:
+                        continue
+                    nonce, buffer = buffer[:_NONCE_SIZE], buffer[_NONCE_SIZE:]
+                    cipher = Cipher(algorithms.AES(self._secret), modes.GCM(nonce))
+                    decryptor = cipher.decryptor()
+                if len(buffer) > _TAG_SIZE:
+                    spool.write(decryptor.update(buffer[:-_TAG_SIZE]))
+                    buffer = buffer[-_TAG_SIZE:]
+            if decryptor is None or len(buffer) != _TAG_SIZE:
+                raise ValueError("encrypted stream is truncated")
+            spool.write(decryptor.finalize_with_tag(buffer))
+            spool.seek(0)
+            yield from iter(lambda: spool.read(STREAM_CHUNK_SIZE), b"")
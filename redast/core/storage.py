@@ -2,14 +2,66 @@
 # Copyright (c) 2022 Vladislav A. Proskurov
 # see LICENSE for full details
 
-__all__ = ("Storage", "Keeper", "Bridge")
-
-from typing import Any, Protocol, Type, Union, runtime_checkable
-
-from cloudpickle import dumps  # type: ignore
-
-from .hash import get_hash_fn
+__all__ = (
+    "Storage",
+    "Keeper",
+    "BatchKeeper",
+    "Bridge",
+    "Measured",
+    "exists_many",
+    "save_many",
+    "load_many",
+    "delete_many",
+    "StreamKeeper",
+    "save_stream",
+    "load_stream",
+    "ScanKeeper",
+    "scan",
+    "iter_keys",
+)
+
+import re
+import tempfile
+import time
+import weakref
+from concurrent.futures import Executor
+from itertools import islice
+
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Protocol,
+    Tuple,
+    Type,
+    Union,
+    runtime_checkable,
+)
+
+from .hash import (
+    MerkleTree,
+    TreeHash,
+    checked,
+    encode,
+    get_algorithm,
+    get_hash_fn,
+    get_iterable_hash_fn,
+    memoized,
+)
+from .metrics import Instrument, _nbytes
 from .packaging import *
+from .packaging import STREAM_CHUNK_SIZE
+
+# hex digests produced by the supported hashing algorithms
+_DIGEST = re.compile(r"[0-9a-f]{16,128}")
+# link markers are told apart from objects by their suffix, the digest
+# leads the key, so sharded keepers spread markers like any other object
+_LINK = ".link"
 
 
 @runtime_checkable
@@ -27,6 +79,110 @@ class Keeper(Protocol):
         pass
 
 
+@runtime_checkable
+class BatchKeeper(Keeper, Protocol):
+    def exists_many(self, keys: Iterable) -> List[bool]:
+        pass
+
+    def save_many(self, items) -> List[bool]:
+        pass
+
+    def load_many(self, keys: Iterable) -> List[Any]:
+        pass
+
+    def delete_many(self, keys: Iterable) -> List[bool]:
+        pass
+
+
+def as_items(items) -> List[Tuple[Any, Any]]:
+    if isinstance(items, Mapping):
+        items = items.items()
+    return list(items)
+
+
+def exists_many(keeper: Keeper, keys: Iterable) -> List[bool]:
+    if isinstance(keeper, BatchKeeper):
+        return keeper.exists_many(keys)
+    return [keeper.exists(key) for key in keys]
+
+
+def save_many(keeper: Keeper, items) -> List[bool]:
+    if isinstance(keeper, BatchKeeper):
+        return keeper.save_many(items)
+    return [keeper.save(key, data) for key, data in as_items(items)]
+
+
+def load_many(keeper: Keeper, keys: Iterable) -> List[Any]:
+    if isinstance(keeper, BatchKeeper):
+        return keeper.load_many(keys)
+    return [keeper.load(key) for key in keys]
+
+
+def delete_many(keeper: Keeper, keys: Iterable) -> List[bool]:
+    if isinstance(keeper, BatchKeeper):
+        return keeper.delete_many(keys)
+    return [keeper.delete(key) for key in keys]
+
+
+@runtime_checkable
+class StreamKeeper(Keeper, Protocol):
+    def save_stream(self, key, chunks: Iterable[bytes]) -> bool:
+        pass
+
+    def load_stream(self, key, chunk_size: int) -> Iterator[bytes]:
+        pass
+
+
+def save_stream(keeper: Keeper, key, chunks: Iterable[bytes]) -> bool:
+    if isinstance(keeper, StreamKeeper):
+        return keeper.save_stream(key, chunks)
+    return keeper.save(key, b"".join(chunks))
+
+
+def load_stream(
+    keeper: Keeper, key, chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[bytes]:
+    if isinstance(keeper, StreamKeeper):
+        return keeper.load_stream(key, chunk_size)
+    data = keeper.load(key)
+    return (data[i : i + chunk_size] for i in range(0, len(data), chunk_size))
+
+
+@runtime_checkable
+class ScanKeeper(Keeper, Protocol):
+    def keys(self, prefix: Optional[str] = None) -> Iterator:
+        pass
+
+    def scan(self, prefix: Optional[str] = None) -> Iterator[Tuple[Any, int]]:
+        pass
+
+
+def _scannable(keeper: Keeper) -> ScanKeeper:
+    if not isinstance(keeper, ScanKeeper):
+        raise TypeError(f"`{type(keeper).__name__}` cannot enumerate its keys")
+    return keeper
+
+
+def iter_keys(keeper: Keeper, prefix: Optional[str] = None) -> Iterator:
+    return _scannable(keeper).keys(prefix)
+
+
+def scan(keeper: Keeper, prefix: Optional[str] = None) -> Iterator[Tuple[Any, int]]:
+    # lazily yields keys with the size of stored data, payloads are not loaded
+    return _scannable(keeper).scan(prefix)
+
+
+def _streaming(wrapper: Packaging) -> StreamPackaging:
+    if isinstance(wrapper, Conveyor):
+        # stages that do not stream are packed whole by the conveyor
+        supported = wrapper.bytewise
+    else:
+        supported = isinstance(wrapper, StreamPackaging)
+    if not supported:
+        raise TypeError(f"`{type(wrapper).__name__}` does not support streaming")
+    return wrapper
+
+
 class StorageMethod:
     def __init__(self, packaging: Type[Packaging]):
         if not issubclass(packaging, Packaging):
@@ -34,14 +190,16 @@ class StorageMethod:
         self._type = packaging
 
     def __get__(self, instance: "Storage", owner):
-        if not issubclass(owner, Storage):
+        if not hasattr(owner, "_pipe"):
             raise ValueError
         if self.key in instance._default:
             default = instance._default[self.key]
         else:
             default = dict()
-        value = self._type(**default)
-        return Pipe(instance, value)
+        return instance._cached(
+            self.key,
+            lambda: instance._pipe(self._type(**default)),
+        )
 
     def __set__(self, instance, value):
         raise AttributeError
@@ -50,9 +208,70 @@ class StorageMethod:
         self.key = name
 
 
-class Storage:
+def _frozen(kwargs: dict):
+    frozen = tuple(sorted(kwargs.items()))
+    try:
+        hash(frozen)
+    except TypeError:
+        return None
+    return frozen
+
+
+# pipes with distinct arguments that a storage keeps built
+_PIPE_CACHE_SIZE = 128
+
+
+class PipeCache:
+    _pipes: Dict[Any, Any]
+
+    def _cached(self, key, build: Callable[[], Any]) -> Any:
+        # pipes are immutable, so the recently used ones are built only once
+        pipe = self._pipes.pop(key, None)
+        if pipe is None:
+            pipe = build()
+            if len(self._pipes) >= _PIPE_CACHE_SIZE:
+                self._pipes.pop(next(iter(self._pipes)), None)
+        self._pipes[key] = pipe
+        return pipe
+
+
+def _defaults(
+    compression: int,
+    compression_codec: str,
+    compression_dictionary: Optional[bytes],
+    encryption_key: Union[str, bytes],
+    encryption_password: Union[str, bytes],
+    encryption_seed: int,
+    encryption_kdf: str,
+    encryption_mode: str,
+    encoding: str,
+) -> Dict[str, dict]:
+    if encryption_key is None and encryption_password is None:
+        encryption_key = Encryption.generate_key()
+    encryption = dict(
+        key=encryption_key,
+        password=encryption_password,
+        seed=encryption_seed,
+        kdf=encryption_kdf,
+        mode=encryption_mode,
+    )
+    # validates the arguments, the key is derived only when it is used
+    Encryption(**encryption)
+    return dict(
+        compression=dict(
+            level=compression,
+            codec=compression_codec,
+            dictionary=compression_dictionary,
+        ),
+        encryption=encryption,
+        encoding=dict(encoding=encoding),
+    )
+
+
+class Storage(PipeCache):
     compression = StorageMethod(Compression)
     pickling = StorageMethod(Pickling)
+    numpy = StorageMethod(NumpyArray)
     encryption = StorageMethod(Encryption)
     base64 = StorageMethod(Base64)
     json = StorageMethod(Json)
@@ -64,31 +283,60 @@ class Storage:
         *,
         hashing: str = "blake2b",
         compression: int = -1,
+        compression_codec: str = "zlib",
+        compression_dictionary: Optional[bytes] = None,
         encryption_key: Union[str, bytes] = None,
         encryption_password: Union[str, bytes] = None,
         encryption_seed: int = None,
+        encryption_kdf: str = "sha256",
+        encryption_mode: str = "ecb",
         encoding: str = "utf-8",
+        executor: Optional[Executor] = None,
+        window: int = 64,
+        hash_memo: int = 0,
+        instrument: Optional[Instrument] = None,
     ):
         if not isinstance(keeper, Keeper):
             raise ValueError
+        if instrument is not None:
+            keeper = Measured(keeper, instrument)
         self._keeper = keeper
+        self._instrument = instrument
+        self._executor = executor
+        self._window = window
+        self._pipes: Dict[Any, Pipe] = dict()
+        self._collectors: "weakref.WeakSet" = weakref.WeakSet()
+        # digests of the last `hash_memo` link markers are remembered
+        self._hash_memo = hash_memo
+        self._markers = memoized(self.hash, hash_memo)
+        self._algorithm = get_algorithm(hashing)
         self._alg = get_hash_fn(hashing)
-        self._default = dict(
-            compression=dict(level=compression),
-            encryption=dict(
-                key=encryption_key
-                or Encryption.generate_key(
-                    password=encryption_password,
-                    seed=encryption_seed,
-                )
-            ),
-            encoding=dict(encoding=encoding),
+        self._iterable_alg = get_iterable_hash_fn(hashing)
+        self._default = _defaults(
+            compression=compression,
+            compression_codec=compression_codec,
+            compression_dictionary=compression_dictionary,
+            encryption_key=encryption_key,
+            encryption_password=encryption_password,
+            encryption_seed=encryption_seed,
+            encryption_kdf=encryption_kdf,
+            encryption_mode=encryption_mode,
+            encoding=encoding,
         )
 
+    def _pipe(self, wrapper: Packaging) -> "Pipe":
+        return Pipe(self, wrapper)
+
     def exists(self, key) -> bool:
         return self._keeper.exists(key)
 
+    def _touch(self, keys: Iterable):
+        # running collectors never delete keys written after they started
+        for collector in self._collectors:
+            collector._touch(keys)
+
     def save(self, key, data) -> bool:
+        self._touch((key,))
         return self._keeper.save(key, data)
 
     def load(self, key) -> Any:
@@ -97,16 +345,99 @@ class Storage:
     def delete(self, key) -> bool:
         return self._keeper.delete(key)
 
+    def exists_many(self, keys: Iterable) -> List[bool]:
+        return exists_many(self._keeper, keys)
+
+    def save_many(self, items) -> List[bool]:
+        items = as_items(items)
+        self._touch([key for key, _ in items])
+        return save_many(self._keeper, items)
+
+    def load_many(self, keys: Iterable) -> List[Any]:
+        return load_many(self._keeper, keys)
+
+    def delete_many(self, keys: Iterable) -> List[bool]:
+        return delete_many(self._keeper, keys)
+
+    def save_stream(self, key, chunks: Iterable[bytes]) -> bool:
+        self._touch((key,))
+        return save_stream(self._keeper, key, chunks)
+
+    def load_stream(
+        self,
+        key,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+        verify: Union[bool, MerkleTree] = False,
+    ) -> Iterator[bytes]:
+        """Reads an object by chunks, optionally checking it against its key
+
+        With `verify=True` the digest of the whole stream is checked before
+        its last chunk is yielded. With the tree of the object, every chunk
+        is checked before it is yielded, so a partial read is verified too.
+        """
+        chunks = load_stream(self._keeper, key, chunk_size)
+        if isinstance(verify, MerkleTree):
+            if verify.hexdigest() != key:
+                raise ValueError(f"tree does not belong to {key}")
+            return verify.verified(chunks)
+        if verify:
+            return checked(chunks, self._algorithm(), key)
+        return chunks
+
+    def tree(self, key) -> MerkleTree:
+        """Merkle tree of a stored object, requires a tree hashing mode"""
+        if not isinstance(self._algorithm, TreeHash):
+            raise ValueError("storage does not use tree hashing")
+        tree = self._algorithm.tree_stream(self.load_stream(key))
+        if tree.hexdigest() != key:
+            raise ValueError(f"object {key} does not match its key")
+        return tree
+
+    def keys(self, prefix: Optional[str] = None) -> Iterator:
+        return iter_keys(self._keeper, prefix)
+
+    def scan(self, prefix: Optional[str] = None) -> Iterator[Tuple[Any, int]]:
+        return scan(self._keeper, prefix)
+
     def hash(self, data) -> str:
-        if not isinstance(data, bytes):
-            data = dumps(data)
-        return self._alg(data)
+        if self._instrument is None:
+            return self._alg(encode(data))
+        start = time.perf_counter()
+        encoded = encode(data)
+        key = self._alg(encoded)
+        seconds = time.perf_counter() - start
+        self._instrument.operation("Storage", "hash", seconds, _nbytes(encoded))
+        return key
+
+    def hash_stream(self, chunks: Iterable[bytes]) -> str:
+        return self._iterable_alg(chunks)
 
     def push(self, data) -> str:
         key = self.hash(data)
         self.save(key, data)
         return key
 
+    def push_stream(self, chunks: Iterable[bytes]) -> str:
+        # the key is known only at the end of the stream, so the data is
+        # spooled to a temporary file while it is being hashed
+        with tempfile.SpooledTemporaryFile(max_size=STREAM_CHUNK_SIZE) as spool:
+
+            def spooled():
+                for chunk in chunks:
+                    spool.write(chunk)
+                    yield chunk
+
+            key = self.hash_stream(spooled())
+            spool.seek(0)
+            self.save_stream(key, iter(lambda: spool.read(STREAM_CHUNK_SIZE), b""))
+        return key
+
+    def push_many(self, data: Iterable) -> List[str]:
+        data = list(data)
+        keys = [self.hash(item) for item in data]
+        self.save_many(zip(keys, data))
+        return keys
+
     def pop(self, key) -> Any:
         data = self.load(key)
         self.delete(key)
@@ -124,37 +455,138 @@ class Pipe(Storage):
             raise ValueError
         self._wrapper = wrapper
         self._default = storage._default
+        self._executor = storage._executor
+        self._window = storage._window
+        self._pipes = dict()
+        self._hash_memo = storage._hash_memo
+        self._markers = memoized(self.hash, self._hash_memo)
+        self._instrument = storage._instrument
         self._storage = storage
+        # the chain of pipes is fused into one conveyor over the base storage
+        if isinstance(storage, Pipe):
+            packers = (wrapper, *storage._conveyor._packers)
+            self._base = storage._base
+        else:
+            packers = (wrapper,)
+            self._base = storage
+        self._conveyor = Conveyor(*packers, instrument=self._instrument)
+
+    def __call__(self, **kwargs) -> "Pipe":
+        def build():
+            return self._storage._pipe(type(self._wrapper)(**kwargs))
+
+        frozen = _frozen(kwargs)
+        if frozen is None:
+            return build()
+        return self._storage._cached((type(self._wrapper), frozen), build)
 
-    def __call__(self, **kwargs):
-        self._wrapper = type(self._wrapper)(**kwargs)
-        return self
+    def _forward_many(self, data: Iterable) -> Iterator[list]:
+        wrapped = self._conveyor.forward_many(data, self._executor, self._window)
+        return _chunks(wrapped, self._window)
 
     def exists(self, key) -> bool:
-        return self._storage.exists(key=key)
+        return self._base.exists(key)
 
     def save(self, key, data) -> bool:
-        wrapped = self._wrapper.forward(data)
-        return self._storage.save(key=key, data=wrapped)
+        return self._base.save(key, self._conveyor.forward(data))
 
     def load(self, key) -> Any:
-        wrapped = self._storage.load(key=key)
-        return self._wrapper.backward(wrapped)
+        return self._conveyor.backward(self._base.load(key))
 
     def delete(self, key) -> bool:
-        return self._storage.delete(key=key)
+        return self._base.delete(key)
+
+    def exists_many(self, keys: Iterable) -> List[bool]:
+        return self._base.exists_many(keys)
+
+    def save_many(self, items) -> List[bool]:
+        items = as_items(items)
+        if self._executor is None:
+            forward = self._conveyor.forward
+            return self._base.save_many([(key, forward(data)) for key, data in items])
+        chunks = self._forward_many([data for _, data in items])
+        keys = _chunks([key for key, _ in items], self._window)
+        saved = []
+        for chunk_keys, chunk in zip(keys, chunks):
+            saved += self._base.save_many(zip(chunk_keys, chunk))
+        return saved
+
+    def load_many(self, keys: Iterable) -> List[Any]:
+        if self._executor is None:
+            backward = self._conveyor.backward
+            return [backward(item) for item in self._base.load_many(keys)]
+        data = []
+        for chunk in _chunks(keys, self._window):
+            wrapped = self._base.load_many(chunk)
+            data += self._conveyor.backward_many(wrapped, self._executor, self._window)
+        return data
+
+    def delete_many(self, keys: Iterable) -> List[bool]:
+        return self._base.delete_many(keys)
+
+    def save_stream(self, key, chunks: Iterable[bytes]) -> bool:
+        wrapped = _streaming(self._conveyor).forward_stream(chunks)
+        return self._base.save_stream(key, wrapped)
+
+    def load_stream(
+        self,
+        key,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+        verify: Union[bool, MerkleTree] = False,
+    ) -> Iterator[bytes]:
+        conveyor = _streaming(self._conveyor)
+        # packed chunks are verified before they are unpacked
+        chunks = self._base.load_stream(key, chunk_size, verify)
+        return conveyor.backward_stream(chunks)
+
+    def tree(self, key) -> MerkleTree:
+        return self._base.tree(key)
+
+    def keys(self, prefix: Optional[str] = None) -> Iterator:
+        return self._base.keys(prefix)
+
+    def scan(self, prefix: Optional[str] = None) -> Iterator[Tuple[Any, int]]:
+        return self._base.scan(prefix)
 
     def hash(self, data) -> str:
-        wrapped = self._wrapper.forward(data)
-        return self._storage.hash(wrapped)
+        return self._base.hash(self._conveyor.forward(data))
+
+    def hash_stream(self, chunks: Iterable[bytes]) -> str:
+        wrapped = _streaming(self._conveyor).forward_stream(chunks)
+        return self._base.hash_stream(wrapped)
 
     def push(self, data) -> Any:
-        wrapped = self._wrapper.forward(data)
-        return self._storage.push(wrapped)
+        return self._base.push(self._conveyor.forward(data))
+
+    def push_stream(self, chunks: Iterable[bytes]) -> str:
+        wrapped = _streaming(self._conveyor).forward_stream(chunks)
+        return self._base.push_stream(wrapped)
+
+    def push_many(self, data: Iterable) -> List[str]:
+        if self._executor is None:
+            forward = self._conveyor.forward
+            return self._base.push_many([forward(item) for item in data])
+        keys = []
+        for chunk in self._forward_many(data):
+            keys += self._base.push_many(chunk)
+        return keys
 
     def pop(self, key) -> Any:
-        wrapped = self._storage.pop(key)
-        return self._wrapper.backward(wrapped)
+        return self._conveyor.backward(self._base.pop(key))
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _decode(data_key) -> str:
+    # keepers may return memory mapped buffers instead of bytes
+    return str(data_key, "utf-8")
 
 
 class Link:
@@ -164,23 +596,35 @@ class Link:
         assert len(markers) > 0
         if len(markers) == 1:
             markers = markers[0]
-        self._marker = storage.hash(markers)
+        digest = storage._markers(markers)
+        self._marker = digest + _LINK
+        # markers of links pushed before the suffix are still read
+        self._legacy = digest
         self._storage = storage
 
-    # TODO: garbage collection
+    def _data_key(self, read: Callable[[Any], Any]) -> str:
+        try:
+            return _decode(read(self._marker))
+        except Exception:
+            if not self._storage.exists(self._legacy):
+                raise
+            return _decode(read(self._legacy))
 
     def exists(self) -> bool:
-        if not self._storage.exists(self._marker):
-            return False
-        data_key = self._storage.load(self._marker).decode()
-        return self._storage.exists(data_key)
+        for marker in (self._marker, self._legacy):
+            if self._storage.exists(marker):
+                data_key = _decode(self._storage.load(marker))
+                return self._storage.exists(data_key)
+        return False
 
     def load(self) -> Any:
-        data_key = self._storage.load(self._marker).decode()
+        data_key = self._data_key(self._storage.load)
         return self._storage.load(data_key)
 
     def delete(self) -> bool:
-        data_key = self._storage.pop(self._marker).decode()
+        data_key = self._data_key(self._storage.pop)
+        # a legacy marker would otherwise bring back the previous object
+        self._storage.delete(self._legacy)
         return self._storage.delete(data_key)
 
     def hash(self, data) -> str:
@@ -192,36 +636,320 @@ class Link:
         return data_key
 
     def pop(self) -> Any:
-        data_key = self._storage.pop(self._marker).decode()
+        data_key = self._data_key(self._storage.pop)
+        self._storage.delete(self._legacy)
         return self._storage.pop(data_key)
 
+    def load_stream(
+        self,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+        verify: Union[bool, MerkleTree] = False,
+    ) -> Iterator[bytes]:
+        data_key = self._data_key(self._storage.load)
+        return self._storage.load_stream(data_key, chunk_size, verify)
+
+    def tree(self) -> MerkleTree:
+        data_key = self._data_key(self._storage.load)
+        return self._storage.tree(data_key)
+
+    def push_stream(self, chunks: Iterable[bytes]) -> str:
+        data_key = self._storage.push_stream(chunks)
+        self._storage.save(self._marker, data_key.encode())
+        return data_key
+
+    @staticmethod
+    def _common_storage(links: List["Link"]) -> Storage:
+        storage = links[0]._storage
+        if not all(link._storage is storage for link in links):
+            raise ValueError("links must share the same storage")
+        return storage
+
+    @staticmethod
+    def _located(storage: Storage, links: List["Link"]) -> Tuple[list, list]:
+        # markers that exist, falling back to the legacy ones
+        markers = [link._marker for link in links]
+        found = storage.exists_many(markers)
+        missing = [i for i, ok in enumerate(found) if not ok]
+        if missing:
+            legacy = storage.exists_many([links[i]._legacy for i in missing])
+            for i, ok in zip(missing, legacy):
+                if ok:
+                    markers[i], found[i] = links[i]._legacy, True
+        return markers, found
+
+    @staticmethod
+    def _data_keys(storage: Storage, links: List["Link"], read) -> List[str]:
+        try:
+            data_keys = read([link._marker for link in links])
+        except Exception:
+            markers, found = Link._located(storage, links)
+            if all(found):
+                data_keys = read(markers)
+            else:
+                raise
+        return [_decode(key) for key in data_keys]
+
+    @staticmethod
+    def exists_many(links: Iterable["Link"]) -> List[bool]:
+        links = list(links)
+        if not links:
+            return []
+        storage = Link._common_storage(links)
+        markers, found = Link._located(storage, links)
+        found = [m for m, ok in zip(markers, found) if ok]
+        data_keys = [_decode(key) for key in storage.load_many(found)]
+        exists = dict(zip(found, storage.exists_many(data_keys)))
+        return [exists.get(marker, False) for marker in markers]
+
+    @staticmethod
+    def load_many(links: Iterable["Link"]) -> List[Any]:
+        links = list(links)
+        if not links:
+            return []
+        storage = Link._common_storage(links)
+        data_keys = Link._data_keys(storage, links, storage.load_many)
+        return storage.load_many(data_keys)
+
+    @staticmethod
+    def delete_many(links: Iterable["Link"]) -> List[bool]:
+        links = list(links)
+        if not links:
+            return []
+        storage = Link._common_storage(links)
+        data_keys = Link._data_keys(storage, links, storage.load_many)
+        storage.delete_many([link._marker for link in links])
+        storage.delete_many([link._legacy for link in links])
+        return storage.delete_many(data_keys)
+
+    @staticmethod
+    def push_many(links: Iterable["Link"], data: Iterable) -> List[str]:
+        links = list(links)
+        if not links:
+            return []
+        storage = Link._common_storage(links)
+        data_keys = storage.push_many(data)
+        markers = [link._marker for link in links]
+        storage.save_many(zip(markers, [key.encode() for key in data_keys]))
+        return data_keys
+
 
 class Bridge:
-    def __init__(self, src: Keeper, dst: Keeper):
+    def __init__(
+        self,
+        src: Keeper,
+        dst: Keeper,
+        *,
+        instrument: Optional[Instrument] = None,
+    ):
         assert isinstance(src, Keeper)
         assert isinstance(dst, Keeper)
         self._src = src
-        self._dst = dst if isinstance(dst, Storage) else Storage(dst)
+        self._dst = dst
+        self._alg = get_hash_fn("blake2b")
+        self._hits = 0
+        self._misses = 0
+        self._instrument = instrument
+
+    def _count(self, hits: int, misses: int):
+        self._hits += hits
+        self._misses += misses
+        if self._instrument is not None:
+            name = type(self).__name__
+            if hits:
+                self._instrument.cache(name, True, hits)
+            if misses:
+                self._instrument.cache(name, False, misses)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        stats = dict(hits=self._hits, misses=self._misses)
+        stats.update(getattr(self._dst, "stats", {}))
+        return stats
+
+    def _key(self, key) -> str:
+        # objects pushed by content are cached directly under their digest,
+        # any other key is hashed, so it can not escape a path-based cache
+        if isinstance(key, str) and _DIGEST.fullmatch(key):
+            return key
+        return self._alg(encode(key))
 
     def exists(self, key) -> bool:
-        return self._dst.link(key).exists() or self._src.exists(key)
+        return self._dst.exists(self._key(key)) or self._src.exists(key)
 
     def save(self, key, data) -> bool:
         # check for adequacy
         saved = self._src.save(key, data)
         if not saved:
             return False
-        self._dst.link(key).push(data)
+        self._dst.save(self._key(key), data)
         return True
 
     def load(self, key) -> Any:
+        cache_key = self._key(key)
         try:
-            data = self._dst.link(key).load()
+            data = self._dst.load(cache_key)
+            self._count(1, 0)
         except Exception:
             data = self._src.load(key)
-            self._dst.link(key).push(data)
+            self._count(0, 1)
+            self._dst.save(cache_key, data)
         return data
 
     def delete(self, key) -> bool:
-        self._dst.link(key).delete()
+        self._dst.delete(self._key(key))
         return self._src.delete(key)
+
+    def exists_many(self, keys: Iterable) -> List[bool]:
+        keys = list(keys)
+        cached = exists_many(self._dst, [self._key(key) for key in keys])
+        missed = [key for key, hit in zip(keys, cached) if not hit]
+        found = iter(exists_many(self._src, missed))
+        return [hit or next(found) for hit in cached]
+
+    def save_many(self, items) -> List[bool]:
+        items = as_items(items)
+        saved = save_many(self._src, items)
+        items = [(self._key(key), data) for (key, data), ok in zip(items, saved) if ok]
+        save_many(self._dst, items)
+        return saved
+
+    def load_many(self, keys: Iterable) -> List[Any]:
+        keys = list(keys)
+        cache_keys = [self._key(key) for key in keys]
+        cached = exists_many(self._dst, cache_keys)
+        hits = [key for key, hit in zip(cache_keys, cached) if hit]
+        missed = [i for i, hit in enumerate(cached) if not hit]
+        self._count(len(hits), len(missed))
+        # hits are read before the misses are cached, a bounded cache could
+        # evict them otherwise
+        hit_data = iter(load_many(self._dst, hits))
+        loaded = load_many(self._src, [keys[i] for i in missed])
+        save_many(self._dst, zip([cache_keys[i] for i in missed], loaded))
+        miss_data = iter(loaded)
+        return [next(hit_data) if hit else next(miss_data) for hit in cached]
+
+    def delete_many(self, keys: Iterable) -> List[bool]:
+        keys = list(keys)
+        delete_many(self._dst, [self._key(key) for key in keys])
+        return delete_many(self._src, keys)
+
+    # the source holds every object, the cache holds only a part of them
+    def keys(self, prefix: Optional[str] = None) -> Iterator:
+        return iter_keys(self._src, prefix)
+
+    def scan(self, prefix: Optional[str] = None) -> Iterator[Tuple[Any, int]]:
+        return scan(self._src, prefix)
+
+
+class Measured:
+    """Keeper that reports the duration and the size of every operation
+
+    Storages with an `instrument` wrap their keeper with it, other keepers,
+    such as the tiers of a cache, can be wrapped directly.
+    """
+
+    def __init__(
+        self,
+        keeper: Keeper,
+        instrument: Instrument,
+        name: Optional[str] = None,
+    ):
+        if not isinstance(keeper, Keeper):
+            raise ValueError
+        self._keeper = keeper
+        self._instrument = instrument
+        self._name = type(keeper).__name__ if name is None else name
+
+    @property
+    def keeper(self) -> Keeper:
+        return self._keeper
+
+    def _report(self, operation: str, start: float, size: int = 0):
+        seconds = time.perf_counter() - start
+        self._instrument.operation(self._name, operation, seconds, size)
+
+    def exists(self, key) -> bool:
+        start = time.perf_counter()
+        found = self._keeper.exists(key)
+        self._report("exists", start)
+        return found
+
+    def save(self, key, data) -> bool:
+        start = time.perf_counter()
+        saved = self._keeper.save(key, data)
+        self._report("save", start, _nbytes(data))
+        return saved
+
+    def load(self, key) -> Any:
+        start = time.perf_counter()
+        data = self._keeper.load(key)
+        self._report("load", start, _nbytes(data))
+        return data
+
+    def delete(self, key) -> bool:
+        start = time.perf_counter()
+        deleted = self._keeper.delete(key)
+        self._report("delete", start)
+        return deleted
+
+    def exists_many(self, keys: Iterable) -> List[bool]:
+        start = time.perf_counter()
+        found = exists_many(self._keeper, keys)
+        self._report("exists_many", start)
+        return found
+
+    def save_many(self, items) -> List[bool]:
+        items = as_items(items)
+        start = time.perf_counter()
+        saved = save_many(self._keeper, items)
+        size = sum(_nbytes(data) for _, data in items)
+        self._report("save_many", start, size)
+        return saved
+
+    def load_many(self, keys: Iterable) -> List[Any]:
+        start = time.perf_counter()
+        data = load_many(self._keeper, keys)
+        self._report("load_many", start, sum(map(_nbytes, data)))
+        return data
+
+    def delete_many(self, keys: Iterable) -> List[bool]:
+        start = time.perf_counter()
+        deleted = delete_many(self._keeper, keys)
+        self._report("delete_many", start)
+        return deleted
+
+    def save_stream(self, key, chunks: Iterable[bytes]) -> bool:
+        size = 0
+
+        def counted():
+            nonlocal size
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+
+        start = time.perf_counter()
+        saved = save_stream(self._keeper, key, counted())
+        self._report("save_stream", start, size)
+        return saved
+
+    def load_stream(
+        self, key, chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        start = time.perf_counter()
+        chunks = load_stream(self._keeper, key, chunk_size)
+
+        # the stream is reported when it is exhausted
+        def counted():
+            size = 0
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+            self._report("load_stream", start, size)
+
+        return counted()
+
+    def keys(self, prefix: Optional[str] = None) -> Iterator:
+        return iter_keys(self._keeper, prefix)
+
+    def scan(self, prefix: Optional[str] = None) -> Iterator[Tuple[Any, int]]:
+        return scan(self._keeper, prefix)
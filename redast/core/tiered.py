@@ -0,0 +1,286 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+__all__ = ("TieredStore", "WRITING")
+
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .eviction import Bounded, _sizeof
+from .metrics import Instrument
+from .storage import (
+    Keeper,
+    as_items,
+    delete_many,
+    exists_many,
+    iter_keys,
+    load_many,
+    save_many,
+    scan,
+)
+
+# how saved objects reach the last tier: at once or when they are evicted
+WRITING = ("through", "back")
+
+
+def _limit(limits: Sequence[Optional[int]], level: int) -> Optional[int]:
+    return limits[level] if level < len(limits) else None
+
+
+class TieredStore:
+    """Keeper over an ordered list of tiers, from the fastest to the slowest
+
+    Lookups go through the tiers one after another and stop at the first
+    one that holds the object, which is then promoted to the first tier.
+    Every tier except the last can be bounded by `max_entries` and
+    `max_bytes`, given per tier. An object evicted from a bounded tier is
+    demoted to the next tier unless that tier already holds it. An
+    `instrument` receives the hits of every tier, misses are reported with
+    the number of tiers as their tier.
+
+    With `write="through"` saved objects go to the first and the last tier
+    at once. With `write="back"` they go only to the first tier and reach
+    the last one when they are demoted or flushed, so `flush` must be
+    called before the store is dropped.
+    """
+
+    def __init__(
+        self,
+        tiers: Sequence[Keeper],
+        *,
+        write: str = "through",
+        promote: bool = True,
+        policy: str = "lru",
+        max_entries: Sequence[Optional[int]] = (),
+        max_bytes: Sequence[Optional[int]] = (),
+        instrument: Optional[Instrument] = None,
+    ):
+        if len(tiers) < 2:
+            raise ValueError("at least two tiers are required")
+        if not all(isinstance(tier, Keeper) for tier in tiers):
+            raise ValueError
+        if write not in WRITING:
+            raise ValueError(f"write must be one of {WRITING}")
+        if max(len(max_entries), len(max_bytes)) >= len(tiers):
+            raise ValueError("the last tier can not be bounded")
+        self._write = write
+        self._promote = promote
+        self._lock = threading.RLock()
+        self._tiers: List[Keeper] = list()
+        for level, tier in enumerate(tiers):
+            entries = _limit(max_entries, level)
+            size = _limit(max_bytes, level)
+            if entries is not None or size is not None:
+                tier = Bounded(
+                    tier,
+                    policy=policy,
+                    max_entries=entries,
+                    max_bytes=size,
+                    on_evict=self._demotion(level),
+                )
+            self._tiers.append(tier)
+        self._last = self._tiers[-1]
+        # sizes of objects that are not yet saved to the last tier,
+        # recorded when they are saved, so scans do not load them
+        self._dirty: Dict[Any, int] = dict()
+        self._hits = [0] * len(tiers)
+        self._misses = 0
+        self._promotions = 0
+        self._demotions = 0
+        self._instrument = instrument
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return dict(
+            hits=list(self._hits),
+            misses=self._misses,
+            promotions=self._promotions,
+            demotions=self._demotions,
+            dirty=len(self._dirty),
+        )
+
+    def _demotion(self, level: int):
+        def demote(key, data):
+            lower = self._tiers[level + 1]
+            # clean objects are always held by the last tier
+            if lower is self._last and key not in self._dirty:
+                return
+            if key in self._dirty or not lower.exists(key):
+                lower.save(key, data)
+                self._demotions += 1
+            if lower is self._last:
+                self._dirty.pop(key, None)
+
+        return demote
+
+    def _count(self, level: int, hits: int):
+        self._hits[level] += hits
+        if self._instrument is not None and hits:
+            self._instrument.cache(type(self).__name__, True, hits, level)
+
+    def _miss(self, misses: int):
+        self._misses += misses
+        if self._instrument is not None:
+            self._instrument.cache(type(self).__name__, False, misses, len(self._tiers))
+
+    def _promote_many(self, items: List[Tuple[Any, Any]]):
+        if self._promote and items:
+            save_many(self._tiers[0], items)
+            self._promotions += len(items)
+
+    def exists(self, key) -> bool:
+        with self._lock:
+            return any(tier.exists(key) for tier in self._tiers)
+
+    def save(self, key, data) -> bool:
+        with self._lock:
+            # stale copies in the middle tiers must not be found first
+            for tier in self._tiers[1:-1]:
+                tier.delete(key)
+            if self._write == "back":
+                # the object may be demoted while it is being saved
+                previous = self._dirty.get(key)
+                self._dirty[key] = _sizeof(data)
+                saved = self._tiers[0].save(key, data)
+                if not saved:
+                    self._restore({key: previous})
+                return saved
+            saved = self._last.save(key, data)
+            if saved:
+                self._tiers[0].save(key, data)
+            return saved
+
+    def load(self, key) -> Any:
+        with self._lock:
+            for level, tier in enumerate(self._tiers):
+                try:
+                    data = tier.load(key)
+                except Exception:
+                    continue
+                self._count(level, 1)
+                if level:
+                    self._promote_many([(key, data)])
+                return data
+            self._miss(1)
+            raise KeyError(key)
+
+    def delete(self, key) -> bool:
+        with self._lock:
+            self._dirty.pop(key, None)
+            deleted = [tier.delete(key) for tier in self._tiers]
+            return any(deleted)
+
+    def exists_many(self, keys: Iterable) -> List[bool]:
+        keys = list(keys)
+        found = [False] * len(keys)
+        with self._lock:
+            missing = list(range(len(keys)))
+            for tier in self._tiers:
+                if not missing:
+                    break
+                hits = exists_many(tier, [keys[i] for i in missing])
+                for i, hit in zip(missing, hits):
+                    found[i] = hit
+                missing = [i for i, hit in zip(missing, hits) if not hit]
+        return found
+
+    def save_many(self, items) -> List[bool]:
+        items = as_items(items)
+        keys = [key for key, _ in items]
+        with self._lock:
+            for tier in self._tiers[1:-1]:
+                delete_many(tier, keys)
+            if self._write == "back":
+                # objects of the batch may be demoted by the rest of it
+                previous = {key: self._dirty.get(key) for key in keys}
+                self._dirty.update((key, _sizeof(data)) for key, data in items)
+                saved = save_many(self._tiers[0], items)
+                self._restore(
+                    {key: previous[key] for key, ok in zip(keys, saved) if not ok}
+                )
+                return saved
+            saved = save_many(self._last, items)
+            save_many(self._tiers[0], [i for i, ok in zip(items, saved) if ok])
+            return saved
+
+    def load_many(self, keys: Iterable) -> List[Any]:
+        keys = list(keys)
+        data: List[Any] = [None] * len(keys)
+        with self._lock:
+            missing = list(range(len(keys)))
+            for level, tier in enumerate(self._tiers):
+                if not missing:
+                    break
+                found = exists_many(tier, [keys[i] for i in missing])
+                hits = [i for i, hit in zip(missing, found) if hit]
+                for i, item in zip(hits, load_many(tier, [keys[i] for i in hits])):
+                    data[i] = item
+                self._count(level, len(hits))
+                if level:
+                    self._promote_many([(keys[i], data[i]) for i in hits])
+                missing = [i for i, hit in zip(missing, found) if not hit]
+            if missing:
+                self._miss(len(missing))
+                raise KeyError(keys[missing[0]])
+        return data
+
+    def delete_many(self, keys: Iterable) -> List[bool]:
+        keys = list(keys)
+        with self._lock:
+            for key in keys:
+                self._dirty.pop(key, None)
+            deleted = [False] * len(keys)
+            for tier in self._tiers:
+                removed = delete_many(tier, keys)
+                deleted = [a or b for a, b in zip(deleted, removed)]
+            return deleted
+
+    def _restore(self, sizes: Dict[Any, Optional[int]]):
+        # objects that failed to save keep the state they had before
+        for key, size in sizes.items():
+            if size is None:
+                self._dirty.pop(key, None)
+            else:
+                self._dirty[key] = size
+
+    def _peek(self, key) -> Any:
+        # the newest copy of an unsaved object, without promotion
+        for tier in self._tiers[:-1]:
+            if tier.exists(key):
+                return tier.load(key)
+        raise KeyError(key)
+
+    def flush(self) -> int:
+        """Saves the objects written back to the last tier, returns their number"""
+        with self._lock:
+            dirty = list(self._dirty)
+            for key in dirty:
+                self._last.save(key, self._peek(key))
+                self._dirty.pop(key, None)
+            return len(dirty)
+
+    # the last tier holds every object except those not yet written back
+    def _unsaved(self, prefix: Optional[str]) -> List:
+        with self._lock:
+            return [
+                key
+                for key in self._dirty
+                if prefix is None or isinstance(key, str) and key.startswith(prefix)
+            ]
+
+    def keys(self, prefix: Optional[str] = None) -> Iterator:
+        yield from self._unsaved(prefix)
+        for key in iter_keys(self._last, prefix):
+            if key not in self._dirty:
+                yield key
+
+    def scan(self, prefix: Optional[str] = None) -> Iterator[Tuple[Any, int]]:
+        for key in self._unsaved(prefix):
+            with self._lock:
+                size = self._dirty.get(key)
+            if size is not None:
+                yield key, size
+        for key, size in scan(self._last, prefix):
+            if key not in self._dirty:
+                yield key, size
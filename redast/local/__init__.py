@@ -5,4 +5,5 @@
 from .cache import *
 from .drive import *
 from .memory import *
+from .pack import *
 from .sqlite import *
@@ -5,23 +5,83 @@
 __all__ = (
     "CacheDrive",
     "CacheMemory",
+    "CachePack",
 )
 
 from pathlib import Path
-from typing import Union
+from typing import Optional, Union
 
-from ..core import Bridge, Keeper
+from ..core import Bounded, Bridge, Instrument, Keeper
 from .drive import Drive
 from .memory import Memory
+from .pack import Pack
+
+
+def _bounded(
+    keeper: Keeper,
+    policy: str,
+    max_entries: Optional[int],
+    max_bytes: Optional[int],
+    ttl: Optional[float],
+) -> Keeper:
+    if max_entries is None and max_bytes is None and ttl is None:
+        return keeper
+    return Bounded(
+        keeper,
+        policy=policy,
+        max_entries=max_entries,
+        max_bytes=max_bytes,
+        ttl=ttl,
+    )
 
 
 class CacheDrive(Bridge):
-    def __init__(self, src: Keeper, root: Union[Path, str], create: bool = False):
+    def __init__(
+        self,
+        src: Keeper,
+        root: Union[Path, str],
+        create: bool = False,
+        *,
+        policy: str = "lru",
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        instrument: Optional[Instrument] = None,
+    ):
         dst = Drive(root=root, create=create)
-        super().__init__(src=src, dst=dst)
+        dst = _bounded(dst, policy, max_entries, max_bytes, ttl)
+        super().__init__(src=src, dst=dst, instrument=instrument)
+
+
+class CachePack(Bridge):
+    def __init__(
+        self,
+        src: Keeper,
+        root: Union[Path, str],
+        create: bool = False,
+        *,
+        policy: str = "lru",
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        instrument: Optional[Instrument] = None,
+    ):
+        # evicted objects are reclaimed by compaction in the background
+        dst = Pack(root=root, create=create, background=True)
+        dst = _bounded(dst, policy, max_entries, max_bytes, ttl)
+        super().__init__(src=src, dst=dst, instrument=instrument)
 
 
 class CacheMemory(Bridge):
-    def __init__(self, src: Keeper):
-        dst = Memory()
-        super().__init__(src=src, dst=dst)
+    def __init__(
+        self,
+        src: Keeper,
+        *,
+        policy: str = "lru",
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        instrument: Optional[Instrument] = None,
+    ):
+        dst = _bounded(Memory(), policy, max_entries, max_bytes, ttl)
+        super().__init__(src=src, dst=dst, instrument=instrument)
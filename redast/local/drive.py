@@ -7,19 +7,52 @@ __all__ = (
     "DriveTemp",
 )
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import mmap
+import os
 import typing as tp
 import tempfile
 
+from ..core.packaging import BUFFER_TYPES
+from ..core.storage import as_items
+from ..tool.share import SHARING, SharedDirectory
+
+DURABILITY = ("none", "file", "batch")
+_TEMP_PREFIX = "."
+_TEMP_SUFFIX = ".tmp"
+
+
+def _is_temp(name: str) -> bool:
+    return name.startswith(_TEMP_PREFIX) and name.endswith(_TEMP_SUFFIX)
+
+
+def _fsync_dir(path: Path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        # directories cannot be opened on some platforms (windows)
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
 
 class Drive:
-    # TODO: split hash by dir parts
     def __init__(
         self,
         root: tp.Union[Path, str],
         create: bool = False,
         unstable: bool = True,
+        workers: int = 16,
+        depth: int = 0,
+        width: int = 2,
+        fallback: bool = False,
+        durability: str = "none",
+        memory_map: bool = False,
     ):
+        # writes are atomic, so `unstable` is kept only for compatibility
         root = Path(root)
         if create:
             root.mkdir(
@@ -29,85 +62,262 @@ class Drive:
             )
         assert root.exists() and root.is_dir()
         self._root = root
-        self._unstable = unstable
+        self._workers = workers
+        assert depth >= 0 and width > 0
+        self._depth = depth
+        self._width = width
+        self._fallback = fallback and depth > 0
+        if durability not in DURABILITY:
+            raise ValueError(f"durability must be one of {DURABILITY}")
+        self._durability = durability
+        self._memory_map = memory_map
 
     @staticmethod
     def _assert_type_key(key):
         assert isinstance(key, str)
 
     @staticmethod
-    def _assert_type_data(key):
-        assert isinstance(key, bytes)
+    def _assert_type_data(data):
+        # memory mapped loads return buffers, which can be saved again
+        assert isinstance(data, BUFFER_TYPES)
+
+    def _path(self, key: str) -> Path:
+        if not self._depth:
+            return self._root / key
+        w = self._width
+        prefix = key.ljust(self._depth * w, "_")
+        parts = (prefix[i * w : (i + 1) * w] for i in range(self._depth))
+        return self._root.joinpath(*parts, key)
+
+    def _paths(self, key: str) -> tp.Iterator[Path]:
+        yield self._path(key)
+        if self._fallback:
+            yield self._root / key
 
     def exists(self, key: str) -> bool:
         self._assert_type_key(key)
-        path = self._root / key
-        if self._unstable:
-            try:
-                with open(path, "rb"):
-                    return True
-            except FileNotFoundError:
-                return False
-            except Exception:
-                pass
-        return path.exists()
+        return any(os.path.exists(path) for path in self._paths(key))
 
-    def save(self, key: str, data: bytes) -> bool:
+    def _write(self, path: Path, chunks: tp.Iterable[bytes]):
+        suffix = os.urandom(6).hex() + _TEMP_SUFFIX
+        temp = path.with_name(f"{_TEMP_PREFIX}{path.name}.{suffix}")
+        try:
+            file = open(temp, "xb")
+        except FileNotFoundError:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            file = open(temp, "xb")
+        try:
+            with file:
+                for chunk in chunks:
+                    file.write(chunk)
+                if self._durability != "none":
+                    file.flush()
+                    os.fsync(file.fileno())
+            os.replace(temp, path)
+        except BaseException:
+            temp.unlink(missing_ok=True)
+            raise
+
+    def _save(self, key: str, chunks: tp.Iterable[bytes], sync: bool) -> bool:
         self._assert_type_key(key)
-        self._assert_type_data(data)
+        path = self._path(key)
         try:
-            with open(self._root / key, "wb") as file:
-                file.write(data)
+            self._write(path, chunks)
+            if sync:
+                _fsync_dir(path.parent)
             return True
         except Exception:
             return False
 
-    def load(self, key: str) -> bytes:
+    def save(self, key: str, data: bytes) -> bool:
+        self._assert_type_data(data)
+        return self._save(key, (data,), sync=self._durability != "none")
+
+    def save_stream(self, key: str, chunks: tp.Iterable[bytes]) -> bool:
+        return self._save(key, chunks, sync=self._durability != "none")
+
+    def _open(self, key: str) -> tp.BinaryIO:
         self._assert_type_key(key)
-        with open(self._root / key, "rb") as file:
+        *paths, last = self._paths(key)
+        for path in paths:
+            try:
+                return open(path, "rb")
+            except FileNotFoundError:
+                pass
+        return open(last, "rb")
+
+    def load(self, key: str) -> bytes:
+        if self._memory_map:
+            return self.view(key)
+        with self._open(key) as file:
             data = file.read()
         return data
 
+    def view(self, key: str) -> memoryview:
+        # read-only zero-copy view, the page cache is shared between processes
+        with self._open(key) as file:
+            if not os.fstat(file.fileno()).st_size:
+                return memoryview(b"")
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mapped)
+
+    def load_stream(self, key: str, chunk_size: int) -> tp.Iterator[bytes]:
+        file = self._open(key)
+
+        def stream():
+            with file:
+                yield from iter(lambda: file.read(chunk_size), b"")
+
+        return stream()
+
     def delete(self, key: str) -> bool:
         self._assert_type_key(key)
-        try:
-            Path(self._root / key).unlink()
-            return True
-        except Exception:
-            return False
+        # a stale copy in the previous layout would bring the object back
+        deleted = False
+        for path in self._paths(key):
+            try:
+                path.unlink()
+                deleted = True
+            except Exception:
+                pass
+        return deleted
+
+    def _entries(
+        self, path, prefix: tp.Optional[str], level: int = 0
+    ) -> tp.Iterator[os.DirEntry]:
+        # streams the tree without building the list of all files,
+        # shard directories that cannot hold the prefix are skipped
+        w = self._width
+        part = None
+        if prefix is not None and level < self._depth:
+            part = prefix[level * w : (level + 1) * w]
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if part is None or entry.name.startswith(part):
+                        yield from self._entries(entry.path, prefix, level + 1)
+                elif not _is_temp(entry.name):
+                    yield entry
+
+    def _files(self, prefix: tp.Optional[str] = None) -> tp.Iterator[Path]:
+        for entry in self._entries(self._root, prefix):
+            path = Path(entry.path)
+            if prefix is None or self._key(path).startswith(prefix):
+                yield path
+
+    def keys(self, prefix: tp.Optional[str] = None) -> tp.Iterator[str]:
+        return (self._key(path) for path in self._files(prefix))
+
+    def scan(
+        self, prefix: tp.Optional[str] = None
+    ) -> tp.Iterator[tp.Tuple[str, int]]:
+        for path in self._files(prefix):
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                continue
+            yield self._key(path), size
+
+    def _key(self, path: Path) -> str:
+        if self._depth:
+            return path.name
+        return str(path.relative_to(self._root))
+
+    def reshard(self) -> int:
+        # moves objects stored with any other layout into the layout of this drive
+        moved = 0
+        for path in self._files():
+            target = self._path(path.name)
+            if path == target:
+                continue
+            if target.exists():
+                # objects are saved into the layout of this drive,
+                # so the object there is newer than the one to move
+                path.unlink(missing_ok=True)
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(path, target)
+            moved += 1
+        for top, dirs, files in os.walk(self._root, topdown=False):
+            if Path(top) != self._root and not dirs and not files:
+                try:
+                    os.rmdir(top)
+                except OSError:
+                    pass
+        return moved
+
+    def _map(self, fn, *iterables) -> list:
+        with ThreadPoolExecutor(max_workers=self._workers) as pool:
+            return list(pool.map(fn, *iterables))
+
+    def exists_many(self, keys: tp.Iterable[str]) -> tp.List[bool]:
+        return self._map(self.exists, keys)
+
+    def save_many(self, items) -> tp.List[bool]:
+        items = as_items(items)
+        keys = [key for key, _ in items]
+        for _, data in items:
+            self._assert_type_data(data)
+        data = [(data,) for _, data in items]
+        sync = [self._durability == "file"] * len(items)
+        saved = self._map(self._save, keys, data, sync)
+        if self._durability == "batch":
+            parents = {self._path(key).parent for key, ok in zip(keys, saved) if ok}
+            for parent in parents:
+                _fsync_dir(parent)
+        return saved
+
+    def load_many(self, keys: tp.Iterable[str]) -> tp.List[bytes]:
+        return self._map(self.load, keys)
+
+    def delete_many(self, keys: tp.Iterable[str]) -> tp.List[bool]:
+        return self._map(self.delete, keys)
 
 
 class DriveTemp(Drive):
-    def __init__(self):
-        self._temp = tempfile.TemporaryDirectory()
+    def __init__(self, depth: int = 0, width: int = 2, share: str = "copy"):
+        # `reference` pickles only the path, so processes of the same host
+        # work with one directory that is removed when the last one is done
+        if share not in SHARING:
+            raise ValueError(f"share must be one of {SHARING}")
+        self._share = share
+        if share == "reference":
+            self._temp = SharedDirectory()
+        else:
+            self._temp = tempfile.TemporaryDirectory()
         super().__init__(
             root=self._temp.name,
             create=False,
-            unstable=False,
+            depth=depth,
+            width=width,
         )
 
     def __del__(self):
-        self._temp.cleanup()
+        temp = getattr(self, "_temp", None)
+        if temp is not None:
+            temp.cleanup()
 
     def __getstate__(self):
-        root = self._root
+        state = self.__dict__.copy()
+        if self._share == "reference":
+            return state
         storage = dict()
-        for path in root.rglob("*"):
-            key = str(path.relative_to(root))
+        for path in self._files():
             with open(path, "rb") as file:
-                storage[key] = file.read()
+                storage[self._key(path)] = file.read()
 
-        state = self.__dict__.copy()
         state.pop("_temp")
         state.pop("_root")
         state["__storage__"] = storage
         return state
 
     def __setstate__(self, state):
+        if "__storage__" not in state:
+            self.__dict__ = state
+            return
         temp = tempfile.TemporaryDirectory()
         state["_temp"] = temp
         state["_root"] = Path(temp.name)
         storage = state.pop("__storage__")
         self.__dict__ = state
-        for key in storage:
-            self.save(key, storage[key])
+        self.save_many(storage)
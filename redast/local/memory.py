@@ -4,7 +4,10 @@
 
 __all__ = ("Memory",)
 
-from typing import Any
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+from ..core.eviction import _sizeof
+from ..core.storage import as_items
 
 
 class Memory:
@@ -26,3 +29,36 @@ class Memory:
             del self._memory[key]
             return True
         return False
+
+    def exists_many(self, keys: Iterable) -> List[bool]:
+        return [key in self._memory for key in keys]
+
+    def save_many(self, items) -> List[bool]:
+        items = as_items(items)
+        self._memory.update(items)
+        return [True] * len(items)
+
+    def load_many(self, keys: Iterable) -> List[Any]:
+        return [self._memory[key] for key in keys]
+
+    def delete_many(self, keys: Iterable) -> List[bool]:
+        return [self.delete(key) for key in keys]
+
+    def save_stream(self, key, chunks: Iterable[bytes]) -> bool:
+        return self.save(key, b"".join(chunks))
+
+    def load_stream(self, key, chunk_size: int) -> Iterator[bytes]:
+        data = memoryview(self._memory[key])
+        offsets = range(0, len(data), chunk_size)
+        return (bytes(data[i : i + chunk_size]) for i in offsets)
+
+    def keys(self, prefix: Optional[str] = None) -> Iterator:
+        # the keys are copied, so the memory can be changed while iterating
+        for key in list(self._memory):
+            if prefix is None or isinstance(key, str) and key.startswith(prefix):
+                yield key
+
+    def scan(self, prefix: Optional[str] = None) -> Iterator[Tuple[Any, int]]:
+        for key in self.keys(prefix):
+            if key in self._memory:
+                yield key, _sizeof(self._memory[key])
@@ -0,0 +1,412 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+__all__ = ("Pack",)
+
+import mmap
+import os
+import pickle
+import struct
+import threading
+import warnings
+import zlib
+from pathlib import Path
+import typing as tp
+
+from ..core.packaging import BUFFER_TYPES
+from ..core.storage import as_items
+from .drive import DURABILITY, _fsync_dir
+
+# magic, flags, key length, data length, crc32 of the key and the data
+_RECORD = struct.Struct("<4sBIQI")
+_MAGIC = b"RDPK"
+_TOMBSTONE = 1
+_SUFFIX = ".seg"
+_INDEX = "index"
+_INDEX_VERSION = 1
+
+
+class _Segment:
+    def __init__(self, path: Path):
+        self.path = path
+        self.id = int(path.stem)
+        self._map: tp.Optional[mmap.mmap] = None
+
+    def read(self, offset: int, length: int) -> bytes:
+        # the map of the active segment is renewed when it has grown
+        if self._map is None or offset + length > len(self._map):
+            self.close()
+            with open(self.path, "rb") as file:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map[offset : offset + length]
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+def _records(path: Path, offset: int = 0) -> tp.Generator[tuple, None, int]:
+    # yields flags, record offset, key, data offset and data length of every
+    # valid record and returns the offset where the valid records end
+    with open(path, "rb") as file:
+        if not os.fstat(file.fileno()).st_size:
+            return offset
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    with data:
+        while offset + _RECORD.size <= len(data):
+            magic, flags, key_size, size, crc = _RECORD.unpack_from(data, offset)
+            start = offset + _RECORD.size
+            end = start + key_size + size
+            if magic != _MAGIC or end > len(data):
+                break
+            if zlib.crc32(data[start:end]) != crc:
+                break
+            key = str(data[start : start + key_size], "utf-8")
+            yield flags, offset, key, start + key_size, size
+            offset = end
+    return offset
+
+
+class Pack:
+    """Log-structured keeper that appends objects into large segment files
+
+    Small objects share a few big files instead of taking one file each.
+    Every save or delete appends a record to the active segment, and the
+    index of the newest records is kept in memory and saved to the `index`
+    file whenever a segment is sealed or the pack is closed. On opening,
+    records written after the saved index are replayed and a torn tail is
+    cut off. Space of overwritten and deleted objects is reclaimed by
+    `compact`, in the background when `background=True`.
+
+    Only one process may write to a pack at a time.
+    """
+
+    def __init__(
+        self,
+        root: tp.Union[Path, str],
+        create: bool = False,
+        *,
+        segment_size: int = 2**26,
+        durability: str = "none",
+        compact_ratio: float = 0.5,
+        background: bool = False,
+    ):
+        root = Path(root)
+        if create:
+            root.mkdir(mode=0o750, parents=False, exist_ok=True)
+        assert root.exists() and root.is_dir()
+        if durability not in DURABILITY:
+            raise ValueError(f"durability must be one of {DURABILITY}")
+        assert 0 < compact_ratio <= 1
+        self._root = root
+        self._segment_size = segment_size
+        self._durability = durability
+        self._compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        # compactions of the worker and of callers run one at a time
+        self._compacting = threading.Lock()
+        self._pid = os.getpid()
+        # key -> segment id, data offset, data length
+        self._index: tp.Dict[str, tp.Tuple[int, int, int]] = dict()
+        self._segments: tp.Dict[int, _Segment] = dict()
+        self._live: tp.Dict[int, int] = dict()
+        self._sizes: tp.Dict[int, int] = dict()
+        self._recover()
+        self._file = open(self._active.path, "ab")
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._worker = None
+        if background:
+            self._worker = threading.Thread(target=self._background, daemon=True)
+            self._worker.start()
+
+    def _path(self, segment_id: int) -> Path:
+        return self._root / f"{segment_id:08d}{_SUFFIX}"
+
+    @property
+    def _active(self) -> _Segment:
+        return self._segments[max(self._segments)]
+
+    def _recover(self):
+        paths = sorted(self._root.glob(f"*{_SUFFIX}"))
+        for path in paths:
+            segment = _Segment(path)
+            self._segments[segment.id] = segment
+        positions: tp.Dict[int, int] = dict()
+        try:
+            with open(self._root / _INDEX, "rb") as file:
+                version, positions, index = pickle.load(file)
+            if version == _INDEX_VERSION:
+                self._index = {
+                    key: entry
+                    for key, entry in index.items()
+                    if entry[0] in self._segments
+                }
+            else:
+                positions = dict()
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            pass
+        for segment_id, segment in sorted(self._segments.items()):
+            self._replay(segment, positions.get(segment_id, 0))
+        if not self._segments:
+            self._segments[1] = _Segment(self._path(1))
+            self._segments[1].path.touch()
+        for segment_id, segment in self._segments.items():
+            self._sizes[segment_id] = segment.path.stat().st_size
+            self._live[segment_id] = 0
+        for segment_id, _, size in self._index.values():
+            self._live[segment_id] += size
+
+    def _replay(self, segment: _Segment, position: int):
+        # only records written after the saved index are read
+        records = _records(segment.path, position)
+        while True:
+            try:
+                flags, _, key, start, size = next(records)
+            except StopIteration as stop:
+                end = stop.value
+                break
+            if flags & _TOMBSTONE:
+                self._index.pop(key, None)
+            else:
+                self._index[key] = (segment.id, start, size)
+        if end < segment.path.stat().st_size:
+            warnings.warn(f"torn tail of {segment.path} is truncated at {end}")
+            os.truncate(segment.path, end)
+
+    def _save_index(self):
+        positions = {i: self._sizes[i] for i in self._segments}
+        state = (_INDEX_VERSION, positions, self._index)
+        temp = self._root / f".{_INDEX}.tmp"
+        with open(temp, "wb") as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+            if self._durability != "none":
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(temp, self._root / _INDEX)
+
+    def _roll(self):
+        # the active segment is sealed and a new one is started
+        self._file.close()
+        segment = _Segment(self._path(max(self._segments) + 1))
+        segment.path.touch()
+        self._segments[segment.id] = segment
+        self._sizes[segment.id] = 0
+        self._live[segment.id] = 0
+        self._file = open(segment.path, "ab")
+        if self._durability != "none":
+            _fsync_dir(self._root)
+        self._save_index()
+
+    def _append(self, key: str, data, flags: int = 0):
+        if self._sizes[self._active.id] >= self._segment_size:
+            self._roll()
+        segment_id = self._active.id
+        encoded = key.encode("utf-8")
+        crc = zlib.crc32(data, zlib.crc32(encoded))
+        header = _RECORD.pack(_MAGIC, flags, len(encoded), len(data), crc)
+        self._file.write(header)
+        self._file.write(encoded)
+        self._file.write(data)
+        start = self._sizes[segment_id] + len(header) + len(encoded)
+        self._sizes[segment_id] = start + len(data)
+        self._forget(key)
+        if not flags & _TOMBSTONE:
+            self._index[key] = (segment_id, start, len(data))
+            self._live[segment_id] += len(data)
+
+    def _forget(self, key: str) -> bool:
+        entry = self._index.pop(key, None)
+        if entry is None:
+            return False
+        self._live[entry[0]] -= entry[2]
+        return True
+
+    def _sync(self):
+        self._file.flush()
+        if self._durability != "none":
+            os.fsync(self._file.fileno())
+
+    @staticmethod
+    def _assert_type_key(key):
+        assert isinstance(key, str)
+
+    @staticmethod
+    def _assert_type_data(data):
+        assert isinstance(data, BUFFER_TYPES)
+
+    def exists(self, key: str) -> bool:
+        self._assert_type_key(key)
+        return key in self._index
+
+    def save(self, key: str, data) -> bool:
+        self._assert_type_key(key)
+        self._assert_type_data(data)
+        with self._lock:
+            self._append(key, data)
+            self._sync()
+        return True
+
+    def load(self, key: str) -> bytes:
+        self._assert_type_key(key)
+        with self._lock:
+            segment_id, offset, size = self._index[key]
+            if segment_id == self._active.id:
+                self._file.flush()
+            return self._segments[segment_id].read(offset, size)
+
+    def delete(self, key: str) -> bool:
+        self._assert_type_key(key)
+        with self._lock:
+            if key not in self._index:
+                return False
+            self._append(key, b"", _TOMBSTONE)
+            self._sync()
+        self._wake()
+        return True
+
+    def exists_many(self, keys: tp.Iterable[str]) -> tp.List[bool]:
+        return [self.exists(key) for key in keys]
+
+    def save_many(self, items) -> tp.List[bool]:
+        items = as_items(items)
+        for key, data in items:
+            self._assert_type_key(key)
+            self._assert_type_data(data)
+        with self._lock:
+            for key, data in items:
+                self._append(key, data)
+            self._sync()
+        return [True] * len(items)
+
+    def load_many(self, keys: tp.Iterable[str]) -> tp.List[bytes]:
+        with self._lock:
+            return [self.load(key) for key in keys]
+
+    def delete_many(self, keys: tp.Iterable[str]) -> tp.List[bool]:
+        deleted = []
+        with self._lock:
+            for key in keys:
+                self._assert_type_key(key)
+                deleted.append(key in self._index)
+                if deleted[-1]:
+                    self._append(key, b"", _TOMBSTONE)
+            self._sync()
+        self._wake()
+        return deleted
+
+    def keys(self, prefix: tp.Optional[str] = None) -> tp.Iterator[str]:
+        with self._lock:
+            keys = list(self._index)
+        return (key for key in keys if prefix is None or key.startswith(prefix))
+
+    def scan(
+        self, prefix: tp.Optional[str] = None
+    ) -> tp.Iterator[tp.Tuple[str, int]]:
+        for key in self.keys(prefix):
+            entry = self._index.get(key)
+            if entry is not None:
+                yield key, entry[2]
+
+    @property
+    def stats(self) -> tp.Dict[str, int]:
+        with self._lock:
+            return dict(
+                segments=len(self._segments),
+                entries=len(self._index),
+                bytes=sum(self._sizes.values()),
+                live_bytes=sum(self._live.values()),
+            )
+
+    def _garbage(self) -> tp.List[int]:
+        # sealed segments where the share of dead space exceeds the ratio
+        with self._lock:
+            active = self._active.id
+            ratio = self._compact_ratio
+            return [
+                i
+                for i, size in self._sizes.items()
+                if i != active and size and 1 - self._live[i] / size >= ratio
+            ]
+
+    def _compact(self, segment_id: int, batch: int = 1024) -> int:
+        segment = self._segments.get(segment_id)
+        if segment is None:
+            return 0
+        oldest = segment_id == min(self._segments)
+        moved = 0
+        records = list(_records(segment.path))
+        for i in range(0, len(records), batch):
+            # the lock is released between batches, so writers are not stalled
+            with self._lock:
+                for flags, _, key, start, size in records[i : i + batch]:
+                    if flags & _TOMBSTONE:
+                        # an older segment may still hold the deleted object
+                        if not oldest and key not in self._index:
+                            self._append(key, b"", _TOMBSTONE)
+                    elif self._index.get(key) == (segment_id, start, size):
+                        self._append(key, segment.read(start, size))
+                        moved += 1
+                self._sync()
+        with self._lock:
+            self._save_index()
+            segment.close()
+            del self._segments[segment_id]
+            del self._sizes[segment_id]
+            del self._live[segment_id]
+            os.remove(segment.path)
+            self._save_index()
+        return moved
+
+    def compact(self) -> int:
+        """Rewrites segments with much dead space, returns the number of moved objects
+
+        Records that are still alive are appended to the active segment.
+        """
+        moved = 0
+        with self._compacting:
+            for segment_id in self._garbage():
+                moved += self._compact(segment_id)
+        if moved and self._durability != "none":
+            _fsync_dir(self._root)
+        return moved
+
+    def _wake(self):
+        if self._worker is not None:
+            self._wakeup.set()
+
+    def _background(self):
+        while not self._closed:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._closed:
+                return
+            try:
+                self.compact()
+            except Exception as e:
+                warnings.warn(f"compaction of {self._root} failed: {e}")
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._worker is not None:
+            self._worker.join()
+        with self._lock:
+            self._sync()
+            self._file.close()
+            self._save_index()
+            for segment in self._segments.values():
+                segment.close()
+
+    def __del__(self):
+        if getattr(self, "_pid", None) != os.getpid() or not hasattr(self, "_file"):
+            return
+        # modules and files may already be torn down at interpreter shutdown
+        try:
+            self.close()
+        except Exception:
+            pass
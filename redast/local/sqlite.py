@@ -2,11 +2,63 @@
 # Copyright (c) 2022 Vladislav A. Proskurov
 # see LICENSE for full details
 
-__all__ = ("Sqlite", "SqliteTemp")
+__all__ = ("Sqlite", "SqliteTemp", "SqliteNative", "SqliteNativeTemp")
 
 from sqlitedict import SqliteDict # type: ignore
+import os
+import sqlite3
+import sys
 import tempfile
+import threading
 from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..core.packaging import BUFFER_TYPES, STREAM_CHUNK_SIZE
+from ..core.storage import as_items
+from ..tool.share import SHARING, SharedDirectory
+
+# stay below SQLITE_MAX_VARIABLE_NUMBER of older sqlite builds
+_MAX_VARIABLES = 900
+# rows fetched per query when keys are enumerated
+_PAGE = 1000
+
+
+def _chunks(keys: List[str]) -> Iterator[List[str]]:
+    for i in range(0, len(keys), _MAX_VARIABLES):
+        yield keys[i : i + _MAX_VARIABLES]
+
+
+def _bounds(prefix: Optional[str]) -> List[Tuple[str, str]]:
+    # a prefix is turned into a range of keys served by the primary key index
+    bounds = []
+    if prefix:
+        bounds.append(("key >= ?", prefix))
+        if prefix[-1] != chr(0x10FFFF):
+            bounds.append(("key < ?", prefix[:-1] + chr(ord(prefix[-1]) + 1)))
+    return bounds
+
+
+def _pages(select, table: str, columns: str, prefix: Optional[str]) -> Iterator:
+    # keyset pagination keeps memory bounded and never holds a long read lock
+    bounds = _bounds(prefix)
+    last = None
+    while True:
+        where = list(bounds)
+        if last is not None:
+            where.append(("key > ?", last))
+        condition = " AND ".join(clause for clause, _ in where) or "1"
+        query = (
+            f'SELECT key{columns} FROM "{table}" WHERE {condition} '
+            f"ORDER BY key LIMIT {_PAGE}"
+        )
+        rows = list(select(query, tuple(value for _, value in where)))
+        for row in rows:
+            if prefix is None or row[0].startswith(prefix):
+                yield row
+        if len(rows) < _PAGE:
+            return
+        last = rows[-1][0]
+
 
 class Sqlite:
     def __init__(self, path, create: bool = False):
@@ -16,7 +68,14 @@ class Sqlite:
         self._db = SqliteDict(filename=path, autocommit=True)
 
     def __del__(self):
-        self._db.close()
+        # the worker thread of sqlitedict is gone at interpreter shutdown,
+        # a blocking close would wait for it forever
+        db = getattr(self, "_db", None)
+        if db is None:
+            return
+        conn = db.conn
+        force = sys.is_finalizing() or conn is None or not conn.is_alive()
+        db.close(force=force)
 
     def exists(self, key: str) -> bool:
         return key in self._db
@@ -38,26 +97,102 @@ class Sqlite:
         except Exception:
             return False
 
+    def _select(self, column: str, keys: List[str]) -> Dict[str, Any]:
+        found = dict()
+        table = self._db.tablename
+        for chunk in _chunks(keys):
+            marks = ", ".join("?" * len(chunk))
+            query = f'SELECT key, {column} FROM "{table}" WHERE key IN ({marks})'
+            for key, value in self._db.conn.select(query, tuple(chunk)):
+                found[key] = value
+        return found
+
+    def exists_many(self, keys: Iterable[str]) -> List[bool]:
+        keys = list(keys)
+        found = self._select("1", keys)
+        return [key in found for key in keys]
+
+    def save_many(self, items) -> List[bool]:
+        items = as_items(items)
+        try:
+            self._db.update(items)
+            return [True] * len(items)
+        except Exception:
+            return [False] * len(items)
+
+    def load_many(self, keys: Iterable[str]) -> List[Any]:
+        keys = list(keys)
+        found = self._select("value", keys)
+        missed = [key for key in keys if key not in found]
+        if missed:
+            raise KeyError(missed[0])
+        return [self._db.decode(found[key]) for key in keys]
+
+    def delete_many(self, keys: Iterable[str]) -> List[bool]:
+        keys = list(keys)
+        exists = self.exists_many(keys)
+        keys = [(key,) for key, ok in zip(keys, exists) if ok]
+        query = f'DELETE FROM "{self._db.tablename}" WHERE key = ?'
+        try:
+            self._db.conn.executemany(query, keys)
+            self._db.commit()
+            return exists
+        except Exception:
+            return [False] * len(exists)
+
+    def _pages(self, columns: str, prefix: Optional[str]) -> Iterator[tuple]:
+        return _pages(self._db.conn.select, self._db.tablename, columns, prefix)
+
+    def keys(self, prefix: Optional[str] = None) -> Iterator[str]:
+        return (key for key, in self._pages("", prefix))
+
+    def scan(self, prefix: Optional[str] = None) -> Iterator[Tuple[str, int]]:
+        return self._pages(", length(value)", prefix)
+
 
 class SqliteTemp(Sqlite):
-    def __init__(self):
-        self._temp = tempfile.NamedTemporaryFile()
-        super().__init__(path=self._temp.name, create=True)
+    def __init__(self, share: str = "copy"):
+        # `reference` pickles only the path of the database, see `DriveTemp`
+        if share not in SHARING:
+            raise ValueError(f"share must be one of {SHARING}")
+        self._share = share
+        if share == "reference":
+            self._temp = SharedDirectory()
+            path = Path(self._temp.name, "storage.db")
+        else:
+            self._temp = tempfile.NamedTemporaryFile()
+            path = self._temp.name
+        super().__init__(path=path, create=True)
 
     def __del__(self):
         super().__del__()
-        self._temp.close()
+        temp = getattr(self, "_temp", None)
+        if temp is None:
+            return
+        if self._share == "reference":
+            temp.cleanup()
+        else:
+            temp.close()
 
     def __getstate__(self):
+        state = self.__dict__.copy()
+        if self._share == "reference":
+            state.pop("_db")
+            state["__path__"] = self._db.filename
+            return state
         with open(self._temp.name, "rb") as f:
             storage = f.read()
-        state = self.__dict__.copy()
         state.pop("_temp")
         state.pop("_db")
         state["__storage__"] = storage
         return state
 
     def __setstate__(self, state):
+        if "__path__" in state:
+            path = state.pop("__path__")
+            state["_db"] = SqliteDict(filename=path, autocommit=True)
+            self.__dict__ = state
+            return
         temp = tempfile.NamedTemporaryFile()
         storage = state.pop("__storage__")
         with open(temp.name, "wb") as f:
@@ -66,3 +201,294 @@ class SqliteTemp(Sqlite):
         state["_temp"] = temp
         state["_db"] = SqliteDict(filename=temp.name, autocommit=True)
         self.__dict__ = state
+
+
+SYNCHRONOUS = ("off", "normal", "full", "extra")
+
+
+class SqliteNative:
+    """Keeper over a plain `(key TEXT PRIMARY KEY, value BLOB)` table
+
+    Values are stored as they are, without another round of pickling. The
+    database runs in WAL mode, so readers in any process never block the
+    writer. Every thread gets its own connection, and batches are written
+    in one transaction. Values larger than `blob_size` are streamed with
+    incremental BLOB I/O where the sqlite3 module supports it.
+    """
+
+    _TABLE = "redast"
+
+    def __init__(
+        self,
+        path,
+        create: bool = False,
+        *,
+        synchronous: str = "normal",
+        mmap_size: int = 2**28,
+        timeout: float = 30.0,
+        blob_size: int = STREAM_CHUNK_SIZE,
+    ):
+        path = Path(path).expanduser().absolute()
+        if not create and not path.exists():
+            raise AssertionError
+        if synchronous not in SYNCHRONOUS:
+            raise ValueError(f"synchronous must be one of {SYNCHRONOUS}")
+        self._path = path
+        self._synchronous = synchronous
+        self._mmap_size = mmap_size
+        self._timeout = timeout
+        self._blob_size = blob_size
+        self._reset()
+        with self._conn:
+            self._conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{self._TABLE}" '
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL)"
+            )
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # connections are never shared with forked processes
+        if self._pid != os.getpid():
+            self._reset()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self._path,
+                timeout=self._timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self._synchronous}")
+            conn.execute(f"PRAGMA mmap_size={int(self._mmap_size)}")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def __del__(self):
+        if getattr(self, "_pid", None) == os.getpid():
+            self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ("_pid", "_local", "_connections", "_lock"):
+            state.pop(name)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        self._reset()
+
+    @staticmethod
+    def _assert_type_key(key):
+        assert isinstance(key, str)
+
+    @staticmethod
+    def _assert_type_data(data):
+        assert isinstance(data, BUFFER_TYPES)
+
+    def _select(self, column: str, keys: List[str]) -> Dict[str, Any]:
+        found = dict()
+        for chunk in _chunks(keys):
+            marks = ", ".join("?" * len(chunk))
+            query = f'SELECT key, {column} FROM "{self._TABLE}" WHERE key IN ({marks})'
+            found.update(self._conn.execute(query, chunk))
+        return found
+
+    def exists(self, key: str) -> bool:
+        self._assert_type_key(key)
+        query = f'SELECT 1 FROM "{self._TABLE}" WHERE key = ?'
+        return self._conn.execute(query, (key,)).fetchone() is not None
+
+    def save(self, key: str, data) -> bool:
+        self._assert_type_key(key)
+        self._assert_type_data(data)
+        query = f'INSERT OR REPLACE INTO "{self._TABLE}" VALUES (?, ?)'
+        try:
+            self._conn.execute(query, (key, data))
+            return True
+        except sqlite3.Error:
+            return False
+
+    def load(self, key: str) -> bytes:
+        self._assert_type_key(key)
+        query = f'SELECT value FROM "{self._TABLE}" WHERE key = ?'
+        row = self._conn.execute(query, (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return row[0]
+
+    def delete(self, key: str) -> bool:
+        self._assert_type_key(key)
+        query = f'DELETE FROM "{self._TABLE}" WHERE key = ?'
+        try:
+            return self._conn.execute(query, (key,)).rowcount > 0
+        except sqlite3.Error:
+            return False
+
+    def exists_many(self, keys: Iterable[str]) -> List[bool]:
+        keys = list(keys)
+        found = self._select("1", keys)
+        return [key in found for key in keys]
+
+    def save_many(self, items) -> List[bool]:
+        items = as_items(items)
+        for key, data in items:
+            self._assert_type_key(key)
+            self._assert_type_data(data)
+        query = f'INSERT OR REPLACE INTO "{self._TABLE}" VALUES (?, ?)'
+        try:
+            with self._transaction() as conn:
+                conn.executemany(query, items)
+            return [True] * len(items)
+        except sqlite3.Error:
+            return [False] * len(items)
+
+    def load_many(self, keys: Iterable[str]) -> List[bytes]:
+        keys = list(keys)
+        found = self._select("value", keys)
+        missed = [key for key in keys if key not in found]
+        if missed:
+            raise KeyError(missed[0])
+        return [found[key] for key in keys]
+
+    def delete_many(self, keys: Iterable[str]) -> List[bool]:
+        keys = list(keys)
+        query = f'DELETE FROM "{self._TABLE}" WHERE key = ?'
+        try:
+            with self._transaction() as conn:
+                exists = self.exists_many(keys)
+                conn.executemany(query, [(key,) for key in keys])
+            return exists
+        except sqlite3.Error:
+            return [False] * len(keys)
+
+    def _transaction(self) -> "_Transaction":
+        return _Transaction(self._conn)
+
+    def save_stream(self, key: str, chunks: Iterable[bytes]) -> bool:
+        self._assert_type_key(key)
+        conn = self._conn
+        if not hasattr(conn, "blobopen"):
+            return self.save(key, b"".join(chunks))
+        # the size of a blob is fixed when it is inserted,
+        # so the stream is spooled first
+        with tempfile.SpooledTemporaryFile(max_size=self._blob_size) as spool:
+            for chunk in chunks:
+                spool.write(chunk)
+            size = spool.tell()
+            spool.seek(0)
+            query = f'INSERT OR REPLACE INTO "{self._TABLE}" VALUES (?, zeroblob(?))'
+            try:
+                with self._transaction():
+                    rowid = conn.execute(query, (key, size)).lastrowid
+                    with conn.blobopen(self._TABLE, "value", rowid) as blob:
+                        for chunk in iter(lambda: spool.read(self._blob_size), b""):
+                            blob.write(chunk)
+                return True
+            except sqlite3.Error:
+                return False
+
+    def load_stream(self, key: str, chunk_size: int) -> Iterator[bytes]:
+        self._assert_type_key(key)
+        conn = self._conn
+        query = f'SELECT rowid, length(value) FROM "{self._TABLE}" WHERE key = ?'
+        row = conn.execute(query, (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        rowid, size = row
+
+        def stream():
+            if hasattr(conn, "blobopen"):
+                with conn.blobopen(self._TABLE, "value", rowid, readonly=True) as blob:
+                    yield from iter(lambda: blob.read(chunk_size), b"")
+                return
+            query = f'SELECT substr(value, ?, ?) FROM "{self._TABLE}" WHERE rowid = ?'
+            for offset in range(0, size, chunk_size):
+                args = (offset + 1, chunk_size, rowid)
+                yield conn.execute(query, args).fetchone()[0]
+
+        return stream()
+
+    def keys(self, prefix: Optional[str] = None) -> Iterator[str]:
+        rows = _pages(self._conn.execute, self._TABLE, "", prefix)
+        return (key for key, in rows)
+
+    def scan(self, prefix: Optional[str] = None) -> Iterator[Tuple[str, int]]:
+        return _pages(self._conn.execute, self._TABLE, ", length(value)", prefix)
+
+
+class _Transaction:
+    # explicit transactions on top of autocommit connections
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+        self._outer = conn.in_transaction
+
+    def __enter__(self) -> sqlite3.Connection:
+        if not self._outer:
+            self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._outer:
+            return
+        if exc_type is None:
+            self._conn.execute("COMMIT")
+        else:
+            self._conn.execute("ROLLBACK")
+
+
+class SqliteNativeTemp(SqliteNative):
+    def __init__(self, share: str = "copy", **kwargs):
+        if share not in SHARING:
+            raise ValueError(f"share must be one of {SHARING}")
+        self._share = share
+        if share == "reference":
+            self._temp = SharedDirectory()
+        else:
+            self._temp = tempfile.TemporaryDirectory()
+        super().__init__(path=Path(self._temp.name, "redast.db"), create=True, **kwargs)
+
+    def __del__(self):
+        if getattr(self, "_pid", None) == os.getpid():
+            super().__del__()
+            self._temp.cleanup()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        if self._share == "reference":
+            # other processes read the database file itself, WAL keeps it safe
+            return state
+        # the write-ahead log is merged into the database before it is copied
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        with open(self._path, "rb") as f:
+            storage = f.read()
+        state.pop("_temp")
+        state["__storage__"] = storage
+        return state
+
+    def __setstate__(self, state):
+        if "__storage__" not in state:
+            super().__setstate__(state)
+            return
+        temp = tempfile.TemporaryDirectory()
+        storage = state.pop("__storage__")
+        state["_temp"] = temp
+        state["_path"] = Path(temp.name, "redast.db")
+        with open(state["_path"], "wb") as f:
+            f.write(storage)
+        super().__setstate__(state)
@@ -1,3 +1,6 @@
 # The MIT License (MIT)
 # Copyright (c) 2022 Vladislav A. Proskurov
 # see LICENSE for full details
+
+from .s3 import *
+from .server import *
@@ -0,0 +1,535 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+__all__ = ("S3",)
+
+import hashlib
+import hmac
+import http.client
+import os
+import random
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+from ..core.packaging import BUFFER_TYPES, STREAM_CHUNK_SIZE
+from ..core.storage import as_items
+
+# statuses that are worth another attempt
+_RETRY = frozenset((408, 429, 500, 502, 503, 504))
+_UNSIGNED = "UNSIGNED-PAYLOAD"
+_MIN_PART_SIZE = 5 * 2**20
+
+
+class _Response:
+    def __init__(self, status: int, headers: Dict[str, str], data: bytes):
+        self.status = status
+        self.headers = headers
+        self.data = data
+
+
+class _Pool:
+    """Persistent HTTP connections to one host, reused between requests"""
+
+    def __init__(self, url: str, size: int, timeout: float):
+        parts = urlsplit(url)
+        if parts.scheme == "https":
+            self._connection = http.client.HTTPSConnection
+        elif parts.scheme == "http":
+            self._connection = http.client.HTTPConnection
+        else:
+            raise ValueError("url must start with http:// or https://")
+        self.host = parts.netloc
+        self._size = size
+        self._timeout = timeout
+        self._idle: deque = deque()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _acquire(self) -> http.client.HTTPConnection:
+        with self._lock:
+            # sockets must not be shared with a forked process
+            if self._pid != os.getpid():
+                self._idle.clear()
+                self._pid = os.getpid()
+            if self._idle:
+                return self._idle.pop()
+        return self._connection(self.host, timeout=self._timeout)
+
+    def _release(self, connection: http.client.HTTPConnection):
+        with self._lock:
+            if len(self._idle) < self._size and self._pid == os.getpid():
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def request(
+        self, method: str, target: str, headers: Dict[str, str], body
+    ) -> _Response:
+        connection = self._acquire()
+        try:
+            connection.request(method, target, body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+        except BaseException:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(connection)
+        headers = {name.lower(): value for name, value in response.getheaders()}
+        return _Response(response.status, headers, data)
+
+    def close(self):
+        with self._lock:
+            while self._idle:
+                self._idle.pop().close()
+
+
+def _local(tag: str) -> str:
+    # S3 responses are namespaced, other servers may omit the namespace
+    return tag.rsplit("}", 1)[-1]
+
+
+def _children(element, name: str) -> Iterator:
+    return (child for child in element if _local(child.tag) == name)
+
+
+def _text(element, name: str, default: Optional[str] = None) -> Optional[str]:
+    for child in _children(element, name):
+        return child.text or ""
+    return default
+
+
+class S3:
+    """Keeper over an S3-compatible object store or a plain HTTP object API
+
+    Objects are stored under `prefix` in the `bucket` with path-style
+    requests sent over a pool of persistent connections. Requests that
+    fail with a connection error or a transient status are retried with
+    exponential backoff. Objects larger than `part_size` are uploaded with
+    multipart uploads and downloaded with ranged requests, `workers` parts
+    at a time; S3 rejects parts smaller than 5 MiB except the last one, so
+    `part_size` is at least that. Requests are signed with AWS Signature
+    V4 when credentials are given and are sent unsigned otherwise.
+
+    With `cache_entries`, that many recently used objects no larger than a
+    part are kept in memory with their ETags, and loading them again asks
+    the server only whether they have changed.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        bucket: str,
+        *,
+        prefix: str = "",
+        access_key: Optional[str] = None,
+        secret_key: Optional[str] = None,
+        region: str = "us-east-1",
+        pool_size: int = 16,
+        workers: int = 8,
+        timeout: float = 60.0,
+        retries: int = 5,
+        backoff: float = 0.1,
+        part_size: int = 2**23,
+        cache_entries: int = 0,
+    ):
+        if (access_key is None) != (secret_key is None):
+            raise ValueError("access_key and secret_key must be given together")
+        if part_size < _MIN_PART_SIZE:
+            raise ValueError("part size must be at least 5 MiB")
+        self._url = url.rstrip("/")
+        self._root = urlsplit(self._url).path
+        self._bucket = bucket
+        self._prefix = prefix
+        self._access_key = access_key
+        self._secret_key = secret_key
+        self._region = region
+        self._pool = _Pool(self._url, pool_size, timeout)
+        self._workers = workers
+        self._retries = retries
+        self._backoff = backoff
+        self._part_size = part_size
+        self._cache_entries = cache_entries
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._executors: Dict[str, ThreadPoolExecutor] = dict()
+        self._executors_lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _executor(self, name: str) -> ThreadPoolExecutor:
+        # parts and batches use separate pools, so a batch of multipart
+        # uploads never waits for threads held by itself
+        with self._executors_lock:
+            if self._pid != os.getpid():
+                self._executors = dict()
+                self._pid = os.getpid()
+            if name not in self._executors:
+                self._executors[name] = ThreadPoolExecutor(
+                    self._workers, thread_name_prefix=f"redast-s3-{name}"
+                )
+            return self._executors[name]
+
+    def _map(self, fn, items: Iterable) -> List:
+        return list(self._executor("batch").map(fn, items))
+
+    @staticmethod
+    def _assert_type_key(key):
+        assert isinstance(key, str)
+
+    def _path(self, key: Optional[str] = None) -> str:
+        path = f"{self._root}/{self._bucket}"
+        if key is not None:
+            path += "/" + self._prefix + key
+        return quote(path, safe="/~")
+
+    def _sign(self, method: str, path: str, query: str, headers: Dict[str, str]):
+        now = datetime.now(timezone.utc)
+        stamp = now.strftime("%Y%m%dT%H%M%SZ")
+        day = stamp[:8]
+        headers["x-amz-date"] = stamp
+        headers["x-amz-content-sha256"] = _UNSIGNED
+        names = sorted(name.lower() for name in headers)
+        values = {name.lower(): str(value).strip() for name, value in headers.items()}
+        canonical = "\n".join(
+            [
+                method,
+                path,
+                query,
+                "".join(f"{name}:{values[name]}\n" for name in names),
+                ";".join(names),
+                _UNSIGNED,
+            ]
+        )
+        scope = f"{day}/{self._region}/s3/aws4_request"
+        digest = hashlib.sha256(canonical.encode()).hexdigest()
+        payload = f"AWS4-HMAC-SHA256\n{stamp}\n{scope}\n{digest}"
+        key = ("AWS4" + self._secret_key).encode()
+        for part in (day, self._region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        signature = hmac.new(key, payload.encode(), hashlib.sha256).hexdigest()
+        headers["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self._access_key}/{scope}, "
+            f"SignedHeaders={';'.join(names)}, Signature={signature}"
+        )
+
+    def _request(
+        self,
+        method: str,
+        key: Optional[str] = None,
+        *,
+        query: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        body=b"",
+    ) -> _Response:
+        path = self._path(key)
+        query = "&".join(
+            f"{quote(name, safe='~')}={quote(value, safe='~')}"
+            for name, value in sorted((query or {}).items())
+        )
+        target = f"{path}?{query}" if query else path
+        error: Exception = OSError(f"{method} {target} is not sent")
+        for attempt in range(self._retries + 1):
+            if attempt:
+                delay = self._backoff * 2 ** (attempt - 1)
+                time.sleep(delay * random.uniform(0.5, 1.5))
+            request = dict(headers or {})
+            request["Host"] = self._pool.host
+            request["Content-Length"] = str(memoryview(body).nbytes)
+            if self._access_key is not None:
+                self._sign(method, path, query, request)
+            try:
+                response = self._pool.request(method, target, request, body)
+            except (OSError, http.client.HTTPException) as e:
+                error = e
+                continue
+            if response.status not in _RETRY:
+                return response
+            error = OSError(f"{method} {target} failed with {response.status}")
+        raise error
+
+    @staticmethod
+    def _check(response: _Response, *expected: int):
+        if response.status not in expected:
+            message = response.data[:256].decode("utf-8", "replace")
+            raise OSError(f"request failed with {response.status}: {message}")
+
+    def _remember(self, key: str, etag: Optional[str], data):
+        if not self._cache_entries:
+            return
+        with self._cache_lock:
+            self._cache.pop(key, None)
+            if etag is None or len(data) > self._part_size:
+                return
+            self._cache[key] = (etag, bytes(data))
+            while len(self._cache) > self._cache_entries:
+                self._cache.popitem(last=False)
+
+    def _recall(self, key: str) -> Optional[Tuple[str, bytes]]:
+        if not self._cache_entries:
+            return None
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+            return entry
+
+    def exists(self, key: str) -> bool:
+        self._assert_type_key(key)
+        response = self._request("HEAD", key)
+        if response.status == 404:
+            return False
+        self._check(response, 200)
+        return True
+
+    def etag(self, key: str) -> str:
+        """Current ETag of an object, it changes whenever the object does"""
+        self._assert_type_key(key)
+        response = self._request("HEAD", key)
+        if response.status == 404:
+            raise KeyError(key)
+        self._check(response, 200)
+        return response.headers["etag"]
+
+    def save(self, key: str, data) -> bool:
+        self._assert_type_key(key)
+        assert isinstance(data, BUFFER_TYPES)
+        view = memoryview(data).cast("B")
+        try:
+            if len(view) > self._part_size:
+                etag = self._upload(key, self._slices(view))
+            else:
+                response = self._request("PUT", key, body=view)
+                self._check(response, 200)
+                etag = response.headers.get("etag")
+        except Exception:
+            # the object may or may not be replaced, so it is not cached
+            self._remember(key, None, b"")
+            return False
+        self._remember(key, etag, view)
+        return True
+
+    def _slices(self, view: memoryview) -> Iterator[memoryview]:
+        size = self._part_size
+        return (view[i : i + size] for i in range(0, len(view), size))
+
+    def _upload(self, key: str, parts: Iterable) -> str:
+        response = self._request("POST", key, query=dict(uploads=""))
+        self._check(response, 200)
+        upload = _text(ElementTree.fromstring(response.data), "UploadId")
+
+        def put(number: int, part) -> str:
+            query = dict(partNumber=str(number), uploadId=upload)
+            response = self._request("PUT", key, query=query, body=part)
+            self._check(response, 200)
+            return response.headers["etag"]
+
+        executor = self._executor("parts")
+        pending: deque = deque()
+        etags: List[str] = []
+        try:
+            # at most `workers` parts are held in memory at a time
+            for number, part in enumerate(parts, start=1):
+                pending.append(executor.submit(put, number, part))
+                if len(pending) >= self._workers:
+                    etags.append(pending.popleft().result())
+            while pending:
+                etags.append(pending.popleft().result())
+            body = "".join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                for number, etag in enumerate(etags, start=1)
+            )
+            body = f"<CompleteMultipartUpload>{body}</CompleteMultipartUpload>"
+            response = self._request(
+                "POST", key, query=dict(uploadId=upload), body=body.encode()
+            )
+            self._check(response, 200)
+            # an error can come with the status 200 after a long completion
+            root = ElementTree.fromstring(response.data)
+            if _local(root.tag) == "Error":
+                raise OSError(f"multipart upload failed: {_text(root, 'Message')}")
+            return _text(root, "ETag")
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            # a failed abort must not hide the error, the server expires
+            # abandoned uploads anyway
+            try:
+                self._request("DELETE", key, query=dict(uploadId=upload))
+            except Exception:
+                pass
+            raise
+
+    def _get(self, key: str, start: int, end: int, headers: Dict[str, str]):
+        headers = dict(headers, Range=f"bytes={start}-{end - 1}")
+        response = self._request("GET", key, headers=headers)
+        if response.status == 404:
+            raise KeyError(key)
+        if response.status == 412:
+            raise OSError(f"{key} has changed while it was being read")
+        return response
+
+    @staticmethod
+    def _total(response: _Response) -> int:
+        # content range of a partial response is `bytes start-end/total`
+        if response.status == 206:
+            return int(response.headers["content-range"].rsplit("/", 1)[1])
+        return len(response.data)
+
+    def load(self, key: str) -> bytes:
+        self._assert_type_key(key)
+        cached = self._recall(key)
+        headers = dict()
+        if cached is not None:
+            headers["If-None-Match"] = cached[0]
+        response = self._get(key, 0, self._part_size, headers)
+        if response.status == 304 and cached is not None:
+            return cached[1]
+        if response.status == 416:
+            # empty objects have no range to read
+            response = self._request("GET", key)
+        self._check(response, 200, 206)
+        etag = response.headers.get("etag")
+        total = self._total(response)
+        if total <= len(response.data):
+            self._remember(key, etag, response.data)
+            return response.data
+        data = bytearray(total)
+        data[: len(response.data)] = response.data
+        # the remaining parts are read only from the same version
+        pinned = {"If-Match": etag} if etag is not None else {}
+        starts = range(len(response.data), total, self._part_size)
+
+        def get(start: int):
+            end = min(start + self._part_size, total)
+            part = self._get(key, start, end, pinned)
+            self._check(part, 206)
+            data[start:end] = part.data
+
+        list(self._executor("parts").map(get, starts))
+        return bytes(data)
+
+    def delete(self, key: str) -> bool:
+        self._assert_type_key(key)
+        self._remember(key, None, b"")
+        # deletion of a missing object succeeds too, so it is checked first
+        if not self.exists(key):
+            return False
+        response = self._request("DELETE", key)
+        self._check(response, 200, 204)
+        return True
+
+    def exists_many(self, keys: Iterable[str]) -> List[bool]:
+        return self._map(self.exists, keys)
+
+    def save_many(self, items) -> List[bool]:
+        items = as_items(items)
+        return self._map(lambda item: self.save(*item), items)
+
+    def load_many(self, keys: Iterable[str]) -> List[bytes]:
+        return self._map(self.load, keys)
+
+    def delete_many(self, keys: Iterable[str]) -> List[bool]:
+        return self._map(self.delete, keys)
+
+    def save_stream(self, key: str, chunks: Iterable[bytes]) -> bool:
+        self._assert_type_key(key)
+        parts = self._parts(chunks)
+        first = next(parts, b"")
+        if len(first) < self._part_size:
+            return self.save(key, first)
+        self._remember(key, None, b"")
+        try:
+            self._upload(key, _prepend(first, parts))
+        except Exception:
+            return False
+        return True
+
+    def _parts(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        buffer = bytearray()
+        for chunk in chunks:
+            buffer += chunk
+            while len(buffer) >= self._part_size:
+                yield bytes(buffer[: self._part_size])
+                del buffer[: self._part_size]
+        if buffer:
+            yield bytes(buffer)
+
+    def load_stream(
+        self, key: str, chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        self._assert_type_key(key)
+        response = self._get(key, 0, chunk_size, {})
+        if response.status == 416:
+            response = self._request("GET", key)
+        self._check(response, 200, 206)
+        total = self._total(response)
+        pinned = {"If-Match": response.headers.get("etag", "*")}
+
+        def stream():
+            if response.data:
+                yield response.data
+            for start in range(len(response.data), total, chunk_size):
+                end = min(start + chunk_size, total)
+                part = self._get(key, start, end, pinned)
+                self._check(part, 206)
+                yield part.data
+
+        return stream()
+
+    def _list(self, prefix: Optional[str]) -> Iterator[Tuple[str, int]]:
+        query = {"list-type": "2", "prefix": self._prefix + (prefix or "")}
+        while True:
+            response = self._request("GET", query=query)
+            self._check(response, 200)
+            root = ElementTree.fromstring(response.data)
+            for item in _children(root, "Contents"):
+                key = _text(item, "Key")[len(self._prefix) :]
+                yield key, int(_text(item, "Size", "0"))
+            token = _text(root, "NextContinuationToken")
+            if _text(root, "IsTruncated") != "true" or not token:
+                return
+            query = dict(query, **{"continuation-token": token})
+
+    def keys(self, prefix: Optional[str] = None) -> Iterator[str]:
+        return (key for key, _ in self._list(prefix))
+
+    def scan(self, prefix: Optional[str] = None) -> Iterator[Tuple[str, int]]:
+        return self._list(prefix)
+
+    def close(self):
+        with self._executors_lock:
+            for executor in self._executors.values():
+                executor.shutdown()
+            self._executors = dict()
+        self._pool.close()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # connections, threads and cached objects are not transferred
+        state = dict(self.__dict__)
+        for name in ("_cache_lock", "_executors_lock", "_executors", "_cache"):
+            del state[name]
+        state["_pool"] = (self._url, self._pool._size, self._pool._timeout)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._pool = _Pool(*state["_pool"])
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._executors = dict()
+        self._executors_lock = threading.Lock()
+        self._pid = os.getpid()
+
+
+def _prepend(first: bytes, rest: Iterator[bytes]) -> Iterator[bytes]:
+    yield first
+    yield from rest
@@ -0,0 +1,279 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+__all__ = ("LocalServer",)
+
+import hashlib
+import re
+import threading
+import uuid
+import xml.etree.ElementTree as ElementTree
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+_RANGE = re.compile(r"bytes=(\d+)-(\d*)")
+_NAMESPACE = "http://s3.amazonaws.com/doc/2006-03-01/"
+# every part of a multipart upload except the last is at least that large
+_MIN_PART_SIZE = 5 * 2**20
+
+
+def _etag(data: bytes) -> str:
+    return f'"{hashlib.md5(data).hexdigest()}"'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # connections are kept alive, so clients can reuse them
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(
+        self,
+        status: int,
+        body: bytes = b"",
+        headers: Optional[Dict[str, str]] = None,
+        head: bool = False,
+    ):
+        self.send_response(status)
+        headers = dict(headers or {})
+        headers.setdefault("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _xml(self, status: int, tag: str, content: str):
+        body = f'<?xml version="1.0" encoding="UTF-8"?>\n<{tag} xmlns="{_NAMESPACE}">'
+        body += f"{content}</{tag}>"
+        self._reply(status, body.encode(), {"Content-Type": "application/xml"})
+
+    def _error(self, status: int, code: str, head: bool = False):
+        if head:
+            self._reply(status, head=True)
+        else:
+            self._xml(status, "Error", f"<Code>{code}</Code><Message>{code}</Message>")
+
+    def _parse(self) -> Tuple[str, Optional[str], Dict[str, str]]:
+        parts = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(parts.query, True).items()}
+        bucket, _, key = unquote(parts.path).lstrip("/").partition("/")
+        return bucket, key or None, query
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _handle(self, method: str):
+        server = self.server
+        body = self._body() if method in ("PUT", "POST") else b""
+        with server.lock:
+            server.requests[method] += 1
+            failure = server.failures.pop(0) if server.failures else None
+        if failure is not None:
+            self._error(failure, "SlowDown", head=method == "HEAD")
+            return
+        bucket, key, query = self._parse()
+        if key is None:
+            if method == "GET":
+                self._list(bucket, query)
+            else:
+                self._error(405, "MethodNotAllowed")
+            return
+        getattr(self, f"_{method.lower()}")(bucket, key, query, body)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_HEAD(self):
+        self._handle("HEAD")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def _get(self, bucket: str, key: str, query, body, head: bool = False):
+        with self.server.lock:
+            found = self.server.objects.get((bucket, key))
+        if found is None:
+            self._error(404, "NoSuchKey", head)
+            return
+        data, etag = found
+        match = self.headers.get("If-Match")
+        if match is not None and match not in ("*", etag):
+            self._error(412, "PreconditionFailed", head)
+            return
+        if self.headers.get("If-None-Match") == etag:
+            self._reply(304, headers={"ETag": etag}, head=True)
+            return
+        headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+        requested = _RANGE.fullmatch(self.headers.get("Range", ""))
+        if requested is None:
+            headers["Content-Length"] = str(len(data))
+            self._reply(200, data, headers, head)
+            return
+        start = int(requested.group(1))
+        end = int(requested.group(2) or len(data) - 1)
+        if start >= len(data):
+            headers["Content-Range"] = f"bytes */{len(data)}"
+            self._reply(416, headers=headers, head=head)
+            return
+        end = min(end, len(data) - 1)
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+        self._reply(206, data[start : end + 1], headers, head)
+
+    def _head(self, bucket: str, key: str, query, body):
+        self._get(bucket, key, query, body, head=True)
+
+    def _put(self, bucket: str, key: str, query, body):
+        server = self.server
+        if "uploadId" in query:
+            with server.lock:
+                parts = server.uploads.get(query["uploadId"])
+                if parts is None:
+                    self._error(404, "NoSuchUpload")
+                    return
+                parts[int(query["partNumber"])] = body
+            self._reply(200, headers={"ETag": _etag(body)})
+            return
+        etag = _etag(body)
+        with server.lock:
+            server.objects[bucket, key] = (body, etag)
+        self._reply(200, headers={"ETag": etag})
+
+    def _post(self, bucket: str, key: str, query, body):
+        server = self.server
+        if "uploads" in query:
+            upload = uuid.uuid4().hex
+            with server.lock:
+                server.uploads[upload] = dict()
+            content = f"<Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key>"
+            content += f"<UploadId>{upload}</UploadId>"
+            self._xml(200, "InitiateMultipartUploadResult", content)
+            return
+        with server.lock:
+            parts = server.uploads.pop(query.get("uploadId"), None)
+        if parts is None:
+            self._error(404, "NoSuchUpload")
+            return
+        chosen: List[bytes] = []
+        for part in ElementTree.fromstring(body):
+            number = int(part.findtext("PartNumber"))
+            if number not in parts or _etag(parts[number]) != part.findtext("ETag"):
+                self._error(400, "InvalidPart")
+                return
+            chosen.append(parts[number])
+        if any(len(part) < _MIN_PART_SIZE for part in chosen[:-1]):
+            self._error(400, "EntityTooSmall")
+            return
+        digests = b"".join(hashlib.md5(part).digest() for part in chosen)
+        etag = f'"{hashlib.md5(digests).hexdigest()}-{len(chosen)}"'
+        with server.lock:
+            server.objects[bucket, key] = (b"".join(chosen), etag)
+        content = f"<Key>{escape(key)}</Key><ETag>{escape(etag)}</ETag>"
+        self._xml(200, "CompleteMultipartUploadResult", content)
+
+    def _delete(self, bucket: str, key: str, query, body):
+        with self.server.lock:
+            if "uploadId" in query:
+                self.server.uploads.pop(query["uploadId"], None)
+            else:
+                self.server.objects.pop((bucket, key), None)
+        self._reply(204)
+
+    def _list(self, bucket: str, query: Dict[str, str]):
+        prefix = query.get("prefix", "")
+        limit = int(query.get("max-keys", 1000))
+        after = query.get("continuation-token", query.get("start-after", ""))
+        with self.server.lock:
+            keys = sorted(
+                (key, data)
+                for (name, key), (data, _) in self.server.objects.items()
+                if name == bucket and key.startswith(prefix) and key > after
+            )
+        page = keys[:limit]
+        content = f"<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix>"
+        content += f"<KeyCount>{len(page)}</KeyCount>"
+        for key, data in page:
+            content += f"<Contents><Key>{escape(key)}</Key>"
+            content += f"<Size>{len(data)}</Size></Contents>"
+        truncated = len(keys) > limit
+        content += f"<IsTruncated>{str(truncated).lower()}</IsTruncated>"
+        if truncated:
+            token = escape(page[-1][0])
+            content += f"<NextContinuationToken>{token}</NextContinuationToken>"
+        self._xml(200, "ListBucketResult", content)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int]):
+        super().__init__(address, _Handler)
+        self.lock = threading.Lock()
+        self.objects: Dict[Tuple[str, str], Tuple[bytes, str]] = dict()
+        self.uploads: Dict[str, Dict[int, bytes]] = dict()
+        self.requests: Counter = Counter()
+        self.failures: List[int] = list()
+
+
+class LocalServer:
+    """In-process stand-in for an S3-compatible object store, for testing
+
+    It keeps objects in memory and serves the requests the `S3` keeper
+    sends: objects with ranges, ETags and conditional requests, multipart
+    uploads with the 5 MiB minimum for all parts but the last, and paged
+    listing. Signatures are not checked and buckets
+    exist on first use. `fail` makes the next requests fail, so retries
+    can be tested.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._server = _Server((host, port))
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self) -> Dict[str, int]:
+        """Number of received requests by method"""
+        with self._server.lock:
+            return dict(self._server.requests)
+
+    def fail(self, count: int = 1, status: int = 503):
+        with self._server.lock:
+            self._server.failures.extend([status] * count)
+
+    def start(self) -> "LocalServer":
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._server.serve_forever, daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self) -> "LocalServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -3,3 +3,4 @@
 # see LICENSE for full details
 
 from .io import *
+from .share import *
@@ -0,0 +1,106 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+__all__ = ("SharedDirectory", "SHARING")
+
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None  # type: ignore
+
+# how temporary storages are pickled: with all their data or by reference
+SHARING = ("copy", "reference")
+
+
+@contextmanager
+def _locked(path: Path) -> Iterator[int]:
+    fd = os.open(path, os.O_RDWR)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield fd
+    finally:
+        os.close(fd)
+
+
+def _alive(pid: int) -> bool:
+    if os.name == "nt":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _attach(path: Path, delta: int) -> int:
+    # references are counted per process, so processes that were killed
+    # without releasing their references are dropped on the next change
+    with _locked(path) as fd:
+        counts: Dict[int, int] = dict()
+        for line in os.read(fd, 2**20).decode().split():
+            pid, count = map(int, line.split(":"))
+            counts[pid] = count
+        pid = os.getpid()
+        counts[pid] = counts.get(pid, 0) + delta
+        counts = {p: c for p, c in counts.items() if c > 0 and _alive(p)}
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, "\n".join(f"{p}:{c}" for p, c in counts.items()).encode())
+    return sum(counts.values())
+
+
+class SharedDirectory:
+    """Temporary directory shared by reference between processes of one host
+
+    Pickling passes only the path. Every unpickled copy attaches to the
+    directory and increments its reference count, and the directory is
+    removed when the last copy is cleaned up. References of processes that
+    have exited without cleaning up are dropped as well.
+    """
+
+    def __init__(self):
+        self._base = Path(tempfile.mkdtemp())
+        (self._base / "data").mkdir()
+        (self._base / "refs").touch()
+        _attach(self._base / "refs", 1)
+        self._pid = os.getpid()
+
+    @property
+    def name(self) -> str:
+        return str(self._base / "data")
+
+    def cleanup(self):
+        # copies inherited by forked processes never attached themselves
+        if self._pid != os.getpid():
+            return
+        self._pid = None
+        try:
+            count = _attach(self._base / "refs", -1)
+        except FileNotFoundError:
+            return
+        if count <= 0:
+            shutil.rmtree(self._base, ignore_errors=True)
+
+    def __del__(self):
+        if getattr(self, "_pid", None) is not None:
+            self.cleanup()
+
+    def __getstate__(self):
+        return dict(_base=self._base)
+
+    def __setstate__(self, state):
+        self._pid = None
+        self._base = state["_base"]
+        _attach(self._base / "refs", 1)
+        self._pid = os.getpid()
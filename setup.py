@@ -28,6 +28,13 @@ with open("README.md", "r", encoding="utf-8") as file:
 with open("requirements.txt", "r", encoding="utf-8") as file:
     REQUIREMENTS = file.read().splitlines()
 
+# optional compression codecs
+EXTRAS = dict(
+    zstd=["zstandard"],
+    lz4=["lz4"],
+    brotli=["brotli>=1.2"],
+)
+
 
 setup(
     name=NAME,
@@ -42,6 +49,7 @@ setup(
     packages=find_packages(include=(NAME,)),
     include_package_data=True,
     install_requires=REQUIREMENTS,
+    extras_require=EXTRAS,
     classifiers=CLASSIFIERS,
     python_requires=">=3.8",
 )
@@ -0,0 +1,25 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import pytest
+
+from redast import Drive, Memory, Pack, Sqlite, SqliteNative
+
+KEEPERS = dict(
+    Memory=lambda path: Memory(),
+    Drive=lambda path: Drive(path, create=True),
+    DriveSharded=lambda path: Drive(path, create=True, depth=2),
+    Sqlite=lambda path: Sqlite(path.with_suffix(".db"), create=True),
+    SqliteNative=lambda path: SqliteNative(path.with_suffix(".db"), create=True),
+    Pack=lambda path: Pack(path, create=True),
+)
+
+
+@pytest.fixture(params=list(KEEPERS))
+def keeper(request, tmp_path):
+    keeper = KEEPERS[request.param](tmp_path / "keeper")
+    yield keeper
+    close = getattr(keeper, "close", None)
+    if close is not None:
+        close()
@@ -0,0 +1,89 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from redast import AsyncAdapter, AsyncStorage, Memory, Storage
+
+
+class AsyncMemory:
+    # a native asynchronous keeper without batch methods
+    def __init__(self):
+        self._memory = dict()
+
+    async def exists(self, key) -> bool:
+        return key in self._memory
+
+    async def save(self, key, data) -> bool:
+        self._memory[key] = data
+        return True
+
+    async def load(self, key):
+        return self._memory[key]
+
+    async def delete(self, key) -> bool:
+        return self._memory.pop(key, None) is not None
+
+
+def test_blocking_keeper(keeper):
+    async def main():
+        storage = AsyncStorage(keeper)
+        key = await storage.push(b"data")
+        assert key == Storage(Memory()).hash(b"data")
+        assert await storage.load(key) == b"data"
+        keys = await storage.push_many([b"a", b"b"])
+        assert await storage.exists_many(keys + ["missing"]) == [True, True, False]
+        assert await storage.pop(keys[0]) == b"a"
+        assert not await storage.exists(keys[0])
+
+    asyncio.run(main())
+
+
+def test_pipe_and_link():
+    async def main():
+        storage = AsyncStorage(AsyncMemory(), executor=ThreadPoolExecutor(2))
+        pipe = storage.compression.pickling
+        data = [{"a": 1}, {"b": 2}]
+        keys = await pipe.push_many(data)
+        blocking = Storage(Memory()).compression.pickling
+        assert keys == [blocking.hash(item) for item in data]
+        assert await asyncio.gather(*[pipe.load(key) for key in keys]) == data
+        assert await pipe.load_many(keys) == data
+        link = pipe.link("name")
+        await link.push([1, 2, 3])
+        assert await link.exists() and await link.load() == [1, 2, 3]
+        assert await link.pop() == [1, 2, 3]
+        assert not await link.exists()
+
+    asyncio.run(main())
+
+
+def test_adapter_batch():
+    async def main():
+        keeper = AsyncAdapter(Memory(), workers=4)
+        await asyncio.gather(*[keeper.save(str(i), bytes([i])) for i in range(20)])
+        assert await keeper.load_many([str(i) for i in range(20)]) == [
+            bytes([i]) for i in range(20)
+        ]
+
+    asyncio.run(main())
+
+
+def test_adapter_close():
+    async def main():
+        async with AsyncAdapter(Memory(), workers=2) as keeper:
+            await keeper.save("key", b"data")
+        with pytest.raises(RuntimeError):
+            await keeper.load("key")
+
+        with ThreadPoolExecutor(1) as executor:
+            async with AsyncAdapter(Memory(), executor=executor) as keeper:
+                await keeper.save("key", b"data")
+            # a pool passed in is owned by the caller
+            assert await keeper.load("key") == b"data"
+
+    asyncio.run(main())
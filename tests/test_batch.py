@@ -0,0 +1,45 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+from redast import Storage, delete_many, exists_many, load_many, save_many
+from redast.core.storage import Link
+
+
+def test_keeper_batch(keeper):
+    items = {f"key{i}": bytes([i]) * (i + 1) for i in range(10)}
+    assert save_many(keeper, items) == [True] * 10
+    keys = list(items)
+    assert load_many(keeper, keys) == list(items.values())
+    assert exists_many(keeper, keys + ["missing"]) == [True] * 10 + [False]
+    assert delete_many(keeper, keys[:5] + ["missing"]) == [True] * 5 + [False]
+    assert exists_many(keeper, keys) == [False] * 5 + [True] * 5
+
+
+def test_storage_batch(keeper):
+    storage = Storage(keeper)
+    keys = storage.push_many([b"hello", b"world", b"hello"])
+    assert keys[0] == keys[2] == storage.hash(b"hello")
+    assert [bytes(d) for d in storage.load_many(keys)] == [b"hello", b"world", b"hello"]
+    assert storage.exists_many(keys[:2] + ["brokenkey"]) == [True, True, False]
+
+
+def test_pipe_batch(keeper):
+    pipe = Storage(keeper).compression.pickling
+    data = [dict(a=i) for i in range(5)]
+    keys = pipe.push_many(data)
+    assert keys == [pipe.hash(item) for item in data]
+    assert pipe.load_many(keys) == data
+    assert pipe.delete_many(keys) == [True] * 5
+
+
+def test_link_batch(keeper):
+    pipe = Storage(keeper).pickling
+    links = [pipe.link("batch", i) for i in range(4)]
+    data = [[i] * i for i in range(4)]
+    assert len(Link.push_many(links, data)) == 4
+    assert Link.load_many(links) == data
+    missing = pipe.link("missing")
+    assert Link.exists_many(links + [missing]) == [True] * 4 + [False]
+    assert Link.delete_many(links[:2]) == [True, True]
+    assert [link.exists() for link in links] == [False, False, True, True]
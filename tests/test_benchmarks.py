@@ -0,0 +1,77 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+from contextlib import ExitStack
+from pathlib import Path
+
+from redast import Memory
+
+ROOT = Path(__file__).resolve().parent.parent
+BENCHMARKS = ROOT / "benchmarks"
+
+
+def _run(script: str, *args) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    return subprocess.run(
+        [sys.executable, str(BENCHMARKS / script), *map(str, args)],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+
+
+def test_suite_and_compare(tmp_path):
+    before = tmp_path / "before.json"
+    run = _run(
+        "suite.py",
+        "--sizes",
+        "1KB,64KB",
+        "--filter",
+        "keeper/Memory/save/|hash/blake2b/|dedup",
+        "--budget",
+        "0.01",
+        "--output",
+        before,
+    )
+    assert run.returncode == 0, run.stderr
+    report = json.loads(before.read_text())
+    ids = [result["id"] for result in report["results"]]
+    assert "keeper/Memory/save/1KB" in ids
+    assert "hash/blake2b/64KB" in ids
+    assert "dedup/Chunker/split/64KB" in ids
+    assert report["meta"]["sizes"] == [2**10, 2**16]
+
+    assert _run("compare.py", before, before).returncode == 0
+    after = tmp_path / "after.json"
+    for result in report["results"]:
+        result["p50_us"] *= 2
+    after.write_text(json.dumps(report))
+    compared = _run("compare.py", before, after, "--threshold", "0.5")
+    assert compared.returncode == 1
+    assert f"{len(ids)} regressions" in compared.stdout
+
+
+def test_cache_miss_reads_the_source(monkeypatch):
+    spec = importlib.util.spec_from_file_location("suite", BENCHMARKS / "suite.py")
+    suite = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(suite)
+    loads = []
+
+    class Source(Memory):
+        def load(self, key):
+            loads.append(key)
+            return super().load(key)
+
+    monkeypatch.setattr(suite, "Memory", Source)
+    bench = suite.Suite(budget=0, min_ops=3, max_ops=3, pattern="cache/.*/miss")
+    with ExitStack() as stack:
+        suite.caches(bench, [2**10], stack)
+    assert len(bench.results) == 2
+    # every timed call and the warm up of both caches miss
+    assert len(loads) == 2 * 4
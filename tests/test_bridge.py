@@ -0,0 +1,36 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+from redast import Bridge, CacheDrive, Memory, Storage
+
+
+def test_digest_keys_are_kept():
+    src, dst = Memory(), Memory()
+    storage = Storage(Bridge(src, dst))
+    key = storage.push(b"data")
+    assert dst.load(key) == b"data"
+    assert storage.load(key) == b"data"
+
+
+def test_other_keys_are_hashed(tmp_path):
+    src = Memory()
+    cache = CacheDrive(src, tmp_path / "cache", create=True)
+    for key in ["../escaped", "/absolute", "dir/name", "UPPERCASE", ("a", 1)]:
+        assert cache.save(key, b"data")
+        assert cache.load(key) == b"data"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["cache"]
+    assert all(path.is_file() for path in (tmp_path / "cache").iterdir())
+    assert len(list((tmp_path / "cache").iterdir())) == 5
+
+
+def test_hits_and_misses():
+    src = Memory()
+    bridge = Bridge(src, Memory())
+    keys = Storage(src).push_many([b"a", b"b", b"c"])
+    assert bridge.load_many(keys) == [b"a", b"b", b"c"]
+    assert bridge.load_many(keys) == [b"a", b"b", b"c"]
+    assert bridge.stats == dict(hits=3, misses=3)
+    assert bridge.exists_many(keys + ["missing"]) == [True, True, True, False]
+    assert bridge.delete_many(keys[:1]) == [True]
+    assert not bridge.exists(keys[0])
@@ -0,0 +1,129 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+from redast import Collector, Drive, Memory, Storage
+
+
+def _marked(collector):
+    # steps until the garbage of the run is known
+    while not collector.report["objects"]:
+        collector.step(budget=0)
+
+
+def test_plain_pushes_survive(keeper):
+    storage = Storage(keeper)
+    plain = storage.push(b"plain")
+    link = storage.link("name")
+    link.push(b"first")
+    link.push(b"second")
+    dead = storage.link("dead")
+    storage.delete(dead.push(b"dead"))
+
+    report = Collector(storage).collect()
+    assert report["stale_markers"] == 1
+    assert report["deleted"] == 1
+    assert storage.load(plain) == b"plain"
+    assert storage.exists(storage.hash(b"first"))
+    assert link.load() == b"second"
+    assert not dead.exists()
+
+
+def test_unlinked():
+    storage = Storage(Memory()).pickling
+    link = storage.link("name")
+    link.push([1])
+    link.push([1, 2])
+    plain = storage.push("plain")
+    kept = storage.push("kept")
+
+    report = Collector(storage, unlinked=True, keep=[kept]).collect()
+    assert report["garbage"] == 2
+    assert report["deleted"] == 2
+    assert not storage.exists(plain)
+    assert storage.load(kept) == "kept"
+    assert link.load() == [1, 2]
+
+
+def test_link_pushed_again_while_stepping():
+    storage = Storage(Memory())
+    link = storage.link("name")
+    link.push(b"previous")
+    link.push(b"current")
+
+    collector = Collector(storage, unlinked=True, window=1)
+    _marked(collector)
+    assert collector.report["garbage"] == 1
+    # the previous object is found as garbage, then linked again
+    link.push(b"previous")
+    pushed = storage.push(b"pushed")
+    assert collector.collect()["deleted"] == 0
+    assert link.load() == b"previous"
+    assert storage.load(pushed) == b"pushed"
+
+    collector = Collector(storage, unlinked=True)
+    assert collector.collect()["deleted"] == 2
+    assert link.load() == b"previous"
+
+
+def test_dry_run():
+    storage = Storage(Memory())
+    storage.link("name").push(b"data")
+    storage.push(b"plain")
+    report = Collector(storage, unlinked=True, dry_run=True).collect()
+    assert report["garbage"] == 1
+    assert report["reclaimable_bytes"] == 5
+    assert report["deleted"] == 0
+    assert len(list(storage.keys())) == 3
+
+
+def test_legacy_marker():
+    storage = Storage(Memory())
+    link = storage.link("name")
+    key = storage.push(b"data")
+    storage.save(storage.hash("name"), key.encode())
+    assert link.exists()
+    assert link.load() == b"data"
+    assert Collector(storage).collect()["deleted"] == 0
+
+    link.push(b"other")
+    assert link.load() == b"other"
+    assert link.delete()
+    assert not link.exists()
+
+
+def test_markers_of_other_pipes():
+    storage = Storage(Memory())
+    encrypted = storage.encryption.pickling
+    secret = encrypted.link("secret")
+    secret.push([1, 2])
+    plain = storage.link("plain")
+    plain.push(b"plain")
+    orphan = storage.push(b"orphan")
+
+    # the target of the encrypted marker is unknown, so nothing unlinked goes
+    report = Collector(storage, unlinked=True).collect()
+    assert report["unreadable_markers"] == 1
+    assert report["deleted"] == 0
+    assert secret.load() == [1, 2]
+    assert storage.exists(orphan)
+
+    # plain markers are read by a collector of a pipe too
+    report = Collector(encrypted, unlinked=True).collect()
+    assert report["unreadable_markers"] == 0
+    assert report["deleted"] == 1
+    assert not storage.exists(orphan)
+    assert secret.load() == [1, 2]
+    assert plain.load() == b"plain"
+
+
+def test_sharded_markers(tmp_path):
+    storage = Storage(Drive(tmp_path, depth=1))
+    for i in range(20):
+        storage.link(f"name-{i}").push(bytes([i]))
+    # markers are spread over shards by their digests
+    markers = [key for key in storage.keys() if key.endswith(".link")]
+    assert len(markers) == 20
+    assert len({storage._keeper._path(key).parent for key in markers}) > 10
+    assert Collector(storage, unlinked=True).collect()["deleted"] == 0
+
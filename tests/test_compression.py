@@ -0,0 +1,91 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from redast import Compression, Memory, Storage
+from redast.core.compressors import STREAM_CHUNK_SIZE, registry
+
+CODECS = list(registry)
+DATA = b"".join(b"line %d of the text\n" % i for i in range(100_000))
+
+
+def chunked(data: bytes, size: int = 2**16):
+    return (data[i : i + size] for i in range(0, len(data), size))
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_roundtrip(codec):
+    compression = Compression(codec=codec)
+    packed = compression.forward(DATA)
+    assert len(packed) < len(DATA) // 4
+    assert compression.backward(packed) == DATA
+    assert compression.backward(memoryview(packed)) == DATA
+    streamed = b"".join(compression.forward_stream(chunked(DATA)))
+    assert compression.backward(streamed) == DATA
+    assert b"".join(compression.backward_stream(chunked(packed, 1000))) == DATA
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_codec_detection(codec):
+    # data of any codec is loaded by a pipe with any other codec
+    packed = Compression(codec=codec).forward(DATA)
+    for other in CODECS:
+        assert Compression(codec=other).backward(packed) == DATA
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_trailing_chunks(codec):
+    packed = Compression(codec=codec).forward(DATA)
+    chunks = [*chunked(packed, 1000), b"", b""]
+    assert b"".join(Compression(codec=codec).backward_stream(chunks)) == DATA
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_bounded_stream_output(codec):
+    # a small chunk of input expands in parts, not into the whole object
+    data = bytes(16 * STREAM_CHUNK_SIZE)
+    compressor = registry[codec]()
+    packed = compressor.compress(data)
+    assert len(packed) < STREAM_CHUNK_SIZE
+    parts = list(compressor.decompress_stream([packed, b""]))
+    assert max(map(len, parts)) <= 2 * STREAM_CHUNK_SIZE
+    assert b"".join(parts) == data
+    streamed = b"".join(compressor.compress_stream([data]))
+    assert max(map(len, compressor.decompress_stream([streamed]))) <= 2**21
+
+
+@pytest.mark.parametrize("codec", CODECS)
+@pytest.mark.parametrize("mode", ["ecb", "gcm"])
+def test_encrypted_stream(codec, mode):
+    pipe = Storage(Memory()).encryption(mode=mode).compression(codec=codec)
+    key = pipe.push_stream(chunked(DATA))
+    assert b"".join(pipe.load_stream(key)) == DATA
+    assert pipe.load(key) == DATA
+
+
+def test_dictionary():
+    samples = [b'{"user": %d, "name": "user%d"}' % (i, i) for i in range(1000)]
+    dictionary = Compression.train(samples, size=4096)
+    compression = Compression(codec="zstd", dictionary=dictionary)
+    sample = b'{"user": 5000, "name": "user5000"}'
+    packed = compression.forward(sample)
+    assert len(packed) < len(Compression(codec="zstd").forward(sample))
+    assert compression.backward(packed) == sample
+    # the prepared dictionary is left behind and prepared again
+    copy = pickle.loads(pickle.dumps(compression))
+    assert copy.backward(packed) == sample and copy.forward(sample) == packed
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_pickled_pipe(codec):
+    with ProcessPoolExecutor(2) as executor:
+        storage = Storage(Memory(), executor=executor)
+        pipe = storage.compression(codec=codec).pickling
+        data = [os.urandom(10) * i for i in range(20)]
+        assert pipe.load_many(pipe.push_many(data)) == data
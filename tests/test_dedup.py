@@ -0,0 +1,128 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import os
+import random
+
+import pytest
+
+from redast import Dedup, Drive, Memory, Storage
+from redast.core import dedup
+from redast.core.dedup import Chunker
+
+
+def _reference(chunker, data):
+    data = memoryview(data).cast("B")
+    ends, start = [], 0
+    while start < len(data):
+        start = chunker.cut(data, start)
+        ends.append(start)
+    return ends
+
+
+def _ends(chunks):
+    ends, total = [], 0
+    for chunk in chunks:
+        total += len(chunk)
+        ends.append(total)
+    return ends
+
+
+@pytest.mark.parametrize("avg_size, min_size, max_size", [
+    (64, None, None),
+    (64, 1, None),
+    (256, 256, 256),
+    (2**12, 10, 2**13),
+])
+@pytest.mark.parametrize("size", [0, 1, 63, 1000, 100_000])
+def test_boundaries(avg_size, min_size, max_size, size):
+    rng = random.Random(size)
+    data = bytes(rng.getrandbits(8) for _ in range(size))
+    chunker = Chunker(avg_size, min_size=min_size, max_size=max_size)
+    expected = _reference(chunker, data)
+    assert _ends(chunker.split(data)) == expected
+    for step in (1, 7, 4096):
+        chunks = (data[i : i + step] for i in range(0, size, step))
+        assert _ends(chunker.split_stream(chunks)) == expected
+
+
+def test_boundaries_without_numpy(monkeypatch):
+    data = os.urandom(50_000)
+    chunker = Chunker(256)
+    expected = _ends(chunker.split(data))
+    monkeypatch.setattr(dedup, "_numpy", lambda: None)
+    assert _ends(chunker.split(data)) == expected
+    assert _ends(chunker.split_stream([data[:999], data[999:]])) == expected
+
+
+def test_shared_chunks():
+    keeper = Dedup(Memory(), avg_size=2**10)
+    storage = Storage(keeper)
+    data = os.urandom(2**17)
+    first = storage.push(data)
+    second = storage.push(data[: 2**16] + b"changed" + data[2**16 :])
+    assert storage.load(first) == data
+    assert storage.load(second)[2**16 : 2**16 + 7] == b"changed"
+    assert keeper.stats["reused_bytes"] > 2**16
+    assert keeper.stats["stored_bytes"] < 2**17 + 2**14
+
+    storage.delete(first)
+    assert storage.load(second)[: 2**16] == data[: 2**16]
+    storage.delete(second)
+    assert list(keeper._keeper.keys()) == []
+
+
+def test_failed_save():
+    class Failing(Memory):
+        fail = False
+
+        def save(self, key, data):
+            if self.fail and key == "key":
+                return False
+            return super().save(key, data)
+
+        def delete(self, key):
+            return False if self.fail and key == "key" else super().delete(key)
+
+    inner = Failing()
+    keeper = Dedup(inner, avg_size=2**10)
+    data = os.urandom(2**14)
+    keeper.save("key", data)
+    before = dict(inner.scan())
+    inner.fail = True
+    # the old object keeps its chunks and the new chunks are not leaked
+    assert not keeper.save("key", os.urandom(2**14))
+    assert not keeper.delete("key")
+    assert keeper.load("key") == data
+    assert dict(inner.scan()) == before
+    inner.fail = False
+    keeper.delete("key")
+    assert list(inner.keys()) == []
+
+
+def test_sharded_keys(tmp_path):
+    drive = Drive(tmp_path, depth=1)
+    keeper = Dedup(drive, avg_size=2**10)
+    keeper.save("key", os.urandom(2**14))
+    shards = {path.name for path in tmp_path.iterdir()}
+    # chunks and their counts are spread over shards by their digests
+    assert len(shards) > 4
+
+
+def test_streams():
+    keeper = Dedup(Memory(), avg_size=2**10, verify=True)
+    data = os.urandom(2**16)
+    keeper.save_stream("key", (data[i : i + 1000] for i in range(0, len(data), 1000)))
+    assert b"".join(keeper.load_stream("key")) == data
+    assert keeper.size("key") == len(data)
+
+
+def test_verify():
+    inner = Memory()
+    keeper = Dedup(inner, avg_size=2**10, verify=True)
+    keeper.save("key", os.urandom(2**12))
+    chunk = next(key for key in inner.keys() if key.endswith(".chunk"))
+    inner.save(chunk, b"corrupted")
+    with pytest.raises(ValueError):
+        keeper.load("key")
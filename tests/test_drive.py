@@ -0,0 +1,100 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import pytest
+
+from redast import CacheDrive, CacheMemory, Drive, Storage, TieredStore
+
+
+def test_sharded_layout(tmp_path):
+    drive = Drive(tmp_path, depth=2, width=2)
+    key = Storage(drive).push(b"data")
+    assert (tmp_path / key[:2] / key[2:4] / key).read_bytes() == b"data"
+    # keys shorter than the shards are padded
+    drive.save("a", b"short")
+    assert (tmp_path / "a_" / "__" / "a").read_bytes() == b"short"
+    assert drive.load("a") == b"short"
+
+
+def test_reshard(tmp_path):
+    flat = Drive(tmp_path)
+    keys = Storage(flat).push_many([bytes([i]) for i in range(20)])
+    sharded = Drive(tmp_path, depth=1, fallback=True)
+    # objects of the previous layout are found until they are moved
+    assert all(sharded.exists_many(keys))
+    assert sharded.reshard() == 20
+    assert sharded.reshard() == 0
+    assert not any((tmp_path / key).exists() for key in keys)
+    strict = Drive(tmp_path, depth=1)
+    assert strict.load_many(keys) == [bytes([i]) for i in range(20)]
+    assert sorted(strict.keys()) == sorted(keys)
+
+
+def test_stale_copies(tmp_path):
+    Drive(tmp_path).save("key", b"old")
+    sharded = Drive(tmp_path, depth=1, fallback=True)
+    sharded.save("key", b"new")
+    sharded.save("other", b"new")
+    Drive(tmp_path).save("other", b"old")
+    assert sharded.reshard() == 0
+    assert not (tmp_path / "key").exists()
+    assert sharded.load_many(["key", "other"]) == [b"new", b"new"]
+
+    Drive(tmp_path).save("key", b"old")
+    assert sharded.delete("key")
+    assert not sharded.exists("key")
+    Drive(tmp_path).save("other", b"old")
+    assert sharded.delete_many(["other", "missing"]) == [True, False]
+    assert not sharded.exists("other")
+
+
+def test_atomic_write(tmp_path):
+    drive = Drive(tmp_path, durability="file")
+    assert drive.save("key", b"old")
+
+    def broken():
+        yield b"partial"
+        raise OSError("disk is full")
+
+    assert not drive.save_stream("key", broken())
+    # the previous version is intact and no temporary file is left behind
+    assert drive.load("key") == b"old"
+    assert [path.name for path in tmp_path.iterdir()] == ["key"]
+    assert list(drive.keys()) == ["key"]
+
+
+def test_durability(tmp_path):
+    for durability in ("none", "file", "batch"):
+        drive = Drive(tmp_path / durability, create=True, durability=durability)
+        assert drive.save_many({"a": b"1", "b": b"2"}) == [True, True]
+        assert drive.load_many(["a", "b"]) == [b"1", b"2"]
+    with pytest.raises(ValueError):
+        Drive(tmp_path, durability="always")
+
+
+def test_memory_map(tmp_path):
+    drive = Drive(tmp_path / "src", create=True, memory_map=True)
+    key = Storage(drive).push(b"mapped" * 1000)
+    data = drive.load(key)
+    assert isinstance(data, memoryview) and data == b"mapped" * 1000
+    # mapped buffers are saved again like bytes
+    assert drive.save("copy", data) and drive.save_many({"copy2": data}) == [True]
+    assert drive.load("copy") == drive.load("copy2") == data
+
+
+@pytest.mark.parametrize("cache", ["drive", "memory", "tiered"])
+def test_memory_map_cache(tmp_path, cache):
+    src = Drive(tmp_path / "src", create=True, memory_map=True)
+    if cache == "drive":
+        keeper = CacheDrive(src, tmp_path / "cache", create=True, max_entries=2)
+    elif cache == "memory":
+        keeper = CacheMemory(src, max_entries=2)
+    else:
+        upper = Drive(tmp_path / "upper", create=True, memory_map=True)
+        keeper = TieredStore([upper, src], max_entries=[2])
+    storage = Storage(keeper).pickling(out_of_band=True)
+    keys = storage.push_many([list(range(i)) for i in range(5)])
+    for _ in range(2):
+        assert storage.load_many(keys) == [list(range(i)) for i in range(5)]
+        assert [storage.load(key) for key in reversed(keys)][-1] == []
@@ -0,0 +1,107 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import os
+
+import pytest
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from redast import Drive, Encryption, Memory, Storage
+from redast.core.packaging import ENCRYPTION_MODES
+
+SECRET = Encryption.generate_key()
+
+
+def pipe(keeper, mode: str):
+    storage = Storage(keeper, encryption_key=SECRET, encryption_mode=mode)
+    return storage.encryption.pickling
+
+
+@pytest.mark.parametrize("mode", ENCRYPTION_MODES)
+def test_roundtrip(mode):
+    encryption = Encryption(key=SECRET, mode=mode)
+    for data in [b"", b"topsecret", os.urandom(100_000)]:
+        packed = encryption.forward(data)
+        assert data not in packed or not data
+        assert encryption.backward(packed) == data
+        assert encryption.backward(memoryview(packed)) == data
+
+
+@pytest.mark.parametrize("mode", ENCRYPTION_MODES)
+def test_deterministic_keys(mode):
+    storage = pipe(Memory(), mode)
+    assert storage.push({"a": 1}) == storage.push({"a": 1})
+    assert storage.push({"a": 1}) != storage.push({"a": 2})
+
+
+@pytest.mark.parametrize("mode", ENCRYPTION_MODES)
+def test_link_of_rebuilt_pipe(tmp_path, mode):
+    pipe(Drive(tmp_path), mode).link("name").push([1, 2, 3])
+    # a new storage with the same key finds the link
+    link = pipe(Drive(tmp_path), mode).link("name")
+    assert link.exists() and link.load() == [1, 2, 3]
+
+
+@pytest.mark.parametrize("mode", ["gcm", "chacha20"])
+def test_tampering(mode):
+    encryption = Encryption(key=SECRET, mode=mode)
+    packed = bytearray(encryption.forward(b"topsecret"))
+    packed[-1] ^= 1
+    with pytest.raises(Exception):
+        encryption.backward(bytes(packed))
+
+
+def test_random_nonce_data_loads():
+    # objects encrypted by earlier versions used random nonces
+    encryption = Encryption(key=SECRET, mode="gcm")
+    nonce = os.urandom(12)
+    packed = nonce + AESGCM(encryption._secret).encrypt(nonce, b"old", None)
+    assert encryption.backward(packed) == b"old"
+
+
+def test_gcm_stream():
+    storage = Storage(Memory(), encryption_key=SECRET, encryption_mode="gcm")
+    data = os.urandom(3 * 2**20 + 5)
+    chunks = (data[i : i + 4096] for i in range(0, len(data), 4096))
+    key = storage.encryption.push_stream(chunks)
+    # streamed data is encrypted exactly like whole data
+    assert key == storage.encryption.push(data)
+    assert b"".join(storage.encryption.load_stream(key)) == data
+
+
+def test_gcm_stream_is_verified_first():
+    storage = Storage(Memory(), encryption_key=SECRET, encryption_mode="gcm")
+    data = os.urandom(2**20)
+    key = storage.encryption.push(data)
+    packed = bytearray(storage.load(key))
+    packed[-1] ^= 1
+    chunks = [packed[i : i + 4096] for i in range(0, len(packed), 4096)]
+    # no plaintext is given out before the tag is checked
+    with pytest.raises(InvalidTag):
+        next(Encryption(key=SECRET, mode="gcm").backward_stream(chunks))
+    with pytest.raises(ValueError):
+        next(Encryption(key=SECRET, mode="gcm").backward_stream([packed[:20]]))
+
+
+def test_chacha20_stream():
+    encryption = Encryption(key=SECRET, mode="chacha20")
+    assert not encryption.streaming
+    with pytest.raises(TypeError):
+        encryption.forward_stream([b"data"])
+    storage = Storage(Memory(), encryption_key=SECRET, encryption_mode="chacha20")
+    pipe = storage.encryption.compression
+    assert not pipe._conveyor.streaming
+    # the chacha20 stage of a stream is encrypted whole
+    key = pipe.push_stream([b"da", b"ta"])
+    assert key == pipe.push(b"data")
+    assert b"".join(pipe.load_stream(key)) == b"data"
+
+
+def test_password():
+    first = Encryption(password="password", seed=1, kdf="pbkdf2")
+    second = Encryption(password="password", seed=1, kdf="pbkdf2")
+    assert first.key == second.key != Encryption(password="password", seed=2).key
+    with pytest.raises(ValueError):
+        Encryption(password="password")
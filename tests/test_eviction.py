@@ -0,0 +1,81 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import time
+
+import pytest
+
+from redast import Bounded, CacheDrive, CacheMemory, CachePack, Memory, Storage
+
+
+def test_lru():
+    bounded = Bounded(Memory(), max_entries=2)
+    bounded.save("a", b"1")
+    bounded.save("b", b"2")
+    bounded.load("a")
+    bounded.save("c", b"3")
+    assert [bounded.exists(key) for key in "abc"] == [True, False, True]
+    assert bounded.stats == dict(entries=2, bytes=2, evictions=1)
+
+
+def test_lfu():
+    bounded = Bounded(Memory(), policy="lfu", max_entries=2)
+    bounded.save("a", b"1")
+    bounded.save("b", b"2")
+    for _ in range(3):
+        bounded.load("b")
+    # ties of the least used keys are broken by recency
+    bounded.save("c", b"3")
+    assert [bounded.exists(key) for key in "abc"] == [False, True, True]
+
+
+def test_max_bytes():
+    bounded = Bounded(Memory(), max_bytes=10)
+    for key in "abcd":
+        bounded.save(key, b"x" * 4)
+    assert bounded.stats["bytes"] == 8 and bounded.stats["entries"] == 2
+
+
+def test_max_bytes_of_objects():
+    bounded = Bounded(Memory(), max_bytes=10_000)
+    # the contents of containers count, not only their headers
+    for key in "abcd":
+        payload = [bytes([i]) * 1000 for i in range(4)]
+        bounded.save(key, dict(payload=payload, text=key * 1000))
+    assert bounded.stats["entries"] == 1
+    assert 5000 < bounded.stats["bytes"] <= 10_000
+
+
+def test_ttl():
+    bounded = Bounded(Memory(), ttl=0.05)
+    bounded.save("a", b"1")
+    assert bounded.exists("a")
+    time.sleep(0.1)
+    assert not bounded.exists("a")
+    with pytest.raises(KeyError):
+        bounded.load("a")
+
+
+def test_cache_memory():
+    cache = CacheMemory(Memory(), max_entries=3)
+    storage = Storage(cache)
+    keys = storage.push_many([bytes([i]) for i in range(10)])
+    assert storage.load_many(keys) == [bytes([i]) for i in range(10)]
+    assert cache.stats["entries"] == 3
+
+
+@pytest.mark.parametrize("cache_type", [CacheDrive, CachePack])
+def test_reopened_cache(tmp_path, cache_type):
+    src = Memory()
+    root = tmp_path / "cache"
+    cache = cache_type(src, root, create=True)
+    keys = Storage(cache).push_many([bytes([i]) * 100 for i in range(10)])
+    getattr(cache._dst, "close", lambda: None)()
+    # objects cached by the previous process count against the limits
+    cache = cache_type(src, root, max_entries=4, max_bytes=1000)
+    assert cache.stats["entries"] == 10 and cache.stats["bytes"] == 1000
+    Storage(cache).push(b"new" * 100)
+    assert cache.stats["entries"] == 4 and cache.stats["bytes"] == 600
+    assert len(list(cache._dst._keeper.keys())) == 4
+    assert Storage(cache).load_many(keys) == [bytes([i]) * 100 for i in range(10)]
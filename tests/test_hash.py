@@ -0,0 +1,130 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import hashlib
+import os
+
+import cloudpickle
+import numpy as np
+import pytest
+
+from redast import Memory, Storage
+from redast.core.hash import (
+    TREE_CHUNK_SIZE,
+    HashMemo,
+    TreeHash,
+    encode,
+    verify_proof,
+)
+
+PLAIN = [
+    "text",
+    b"bytes",
+    1,
+    1.5,
+    True,
+    None,
+    [1, "a", (2.0, None)],
+    {"a": [1, 2], "b": {"c": b"d"}},
+    np.arange(10),
+]
+
+
+@pytest.mark.parametrize("data", PLAIN)
+def test_keys_are_stable(data):
+    # keys do not depend on the pickler that encodes the object
+    expected = data if isinstance(data, bytes) else cloudpickle.dumps(data)
+    assert bytes(encode(data)) == expected
+
+
+def test_object_arrays():
+    data = np.array([lambda x: x + 1, 2], dtype=object)
+    assert encode(data) == cloudpickle.dumps(data)
+    storage = Storage(Memory()).pickling
+    key = storage.push(data)
+    assert storage.load(key)[0](1) == 2
+
+
+def test_memo():
+    calls = []
+
+    def fn(data):
+        calls.append(data)
+        return str(data)
+
+    memo = HashMemo(fn, 2)
+    assert [memo(1), memo(1.0), memo(True), memo(1)] == ["1", "1.0", "True", "1"]
+    assert calls == [1, 1.0, True, 1]
+    assert memo(True) == "True"
+    assert len(calls) == 4
+    # objects without a memo key are always hashed
+    memo({"a": 1})
+    memo({"a": 1})
+    assert len(calls) == 6
+
+
+def test_storage_memo():
+    storage = Storage(Memory(), hash_memo=16)
+    assert storage.link("name")._marker == Storage(Memory()).link("name")._marker
+    # equal floats with different encodings do not share a memo entry
+    for value in (0.0, -0.0, (1, 0.0), (1, -0.0)):
+        expected = Storage(Memory()).link(value)._marker
+        assert storage.link(value)._marker == expected
+    assert storage.link(-0.0)._marker != storage.link(0.0)._marker
+
+
+def _reference(data, size):
+    # the documented layout of the tree digest
+    def h(*parts):
+        hasher = hashlib.blake2b()
+        for part in parts:
+            hasher.update(part)
+        return hasher.digest()
+
+    level = [h(b"\x00", data[i : i + size]) for i in range(0, len(data), size)]
+    level = level or [h(b"\x00", b"")]
+    while len(level) > 1:
+        pairs = range(0, len(level) - 1, 2)
+        upper = [h(b"\x01", level[i], level[i + 1]) for i in pairs]
+        level = upper + level[len(level) - len(level) % 2 :]
+    return level[0].hex()
+
+
+@pytest.mark.parametrize("size", [0, 3, 4, 9, 16, 21])
+def test_tree(size):
+    tree_hash = TreeHash("blake2b", chunk_size=4)
+    data = os.urandom(size)
+    tree = tree_hash.tree(data)
+    assert tree.hexdigest() == _reference(data, 4)
+    hasher = tree_hash()
+    for i in range(0, size, 3):
+        hasher.update(data[i : i + 3])
+    assert hasher.hexdigest() == tree.hexdigest()
+    for index in range(len(tree)):
+        chunk = data[index * 4 : index * 4 + 4]
+        assert verify_proof(tree_hash, tree.hexdigest(), chunk, tree.proof(index))
+        assert not verify_proof(tree_hash, tree.hexdigest(), b"!", tree.proof(index))
+
+
+def test_verified_stream():
+    storage = Storage(Memory(), hashing="blake2b-tree")
+    data = os.urandom(TREE_CHUNK_SIZE + 10)
+    key = storage.push(data)
+    assert key == storage.push_stream([data[:100], data[100:]])
+    assert key == _reference(data, TREE_CHUNK_SIZE)
+    tree = storage.tree(key)
+    assert len(tree) == 2
+    assert b"".join(storage.load_stream(key, verify=True)) == data
+    assert b"".join(storage.load_stream(key, 2**20, verify=tree)) == data
+
+    storage.save(key, b"?" + data[1:])
+    chunks = storage.load_stream(key, TREE_CHUNK_SIZE, verify=tree)
+    with pytest.raises(ValueError):
+        next(chunks)
+    chunks = storage.load_stream(key, TREE_CHUNK_SIZE, verify=True)
+    assert len(next(chunks)) == TREE_CHUNK_SIZE
+    with pytest.raises(ValueError):
+        next(chunks)
+    with pytest.raises(ValueError):
+        Storage(Memory()).tree(key)
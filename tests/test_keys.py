@@ -0,0 +1,69 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import pytest
+
+from redast import CacheMemory, Memory, Sqlite, Storage
+from redast.core.storage import iter_keys, scan
+
+KEYS = ["a", "ab", "abc", "abd", "b", "ba", "bz" + chr(0x10FFFF)]
+
+
+def test_keys(keeper):
+    for key in KEYS:
+        keeper.save(key, key.encode())
+    assert sorted(iter_keys(keeper)) == KEYS
+    assert sorted(iter_keys(keeper, "ab")) == ["ab", "abc", "abd"]
+    assert sorted(iter_keys(keeper, "b")) == ["b", "ba", "bz" + chr(0x10FFFF)]
+    assert sorted(iter_keys(keeper, "c")) == []
+    # sqlitedict reports the size of the pickled value
+    sizes = dict(scan(keeper, "a"))
+    assert sorted(sizes) == KEYS[:4]
+    assert all(size >= len(key) for key, size in sizes.items())
+
+
+def test_storage_keys(keeper):
+    storage = Storage(keeper)
+    key = storage.push(b"data")
+    pipe = storage.compression
+    packed = pipe.push(b"packed")
+    assert sorted(storage.keys()) == sorted([key, packed])
+    assert list(pipe.keys(key[:8])) == [key]
+    assert dict(pipe.scan()) == dict(storage.scan())
+    assert dict(storage.scan())[key] >= 4
+
+
+def test_bridge_keys():
+    src = Memory()
+    bridge = CacheMemory(src)
+    bridge.save("key", b"data")
+    bridge.load("key")
+    assert list(bridge.keys()) == ["key"]
+    assert list(bridge.scan("k")) == [("key", 4)]
+
+
+def test_sqlite_pages(tmp_path):
+    keeper = Sqlite(tmp_path / "keys.db", create=True)
+    keys = [f"key-{i:05}" for i in range(2500)]
+    keeper.save_many((key, b"") for key in keys)
+    assert list(keeper.keys()) == keys
+    assert list(keeper.keys("key-01")) == keys[1000:2000]
+
+
+def test_not_scannable():
+    class Plain:
+        def exists(self, key):
+            return False
+
+        def save(self, key, data):
+            return True
+
+        def load(self, key):
+            raise KeyError(key)
+
+        def delete(self, key):
+            return False
+
+    with pytest.raises(TypeError):
+        iter_keys(Plain())
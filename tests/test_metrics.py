@@ -0,0 +1,99 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import pytest
+
+from redast import (
+    CacheMemory,
+    Instrument,
+    Measured,
+    Memory,
+    OpenTelemetryInstrument,
+    PrometheusInstrument,
+    Recorder,
+    Storage,
+    TieredStore,
+)
+
+
+def test_storage_and_pipes():
+    recorder = Recorder()
+    storage = Storage(Memory(), instrument=recorder)
+    pipe = storage.compression.pickling
+    key = pipe.push([1, 2, 3] * 100)
+    assert pipe.load(key) == [1, 2, 3] * 100
+    storage.save_many({"a": b"xy", "b": b"z"})
+    storage.load_many(["a", "b"])
+
+    snapshot = recorder.snapshot()
+    operations = snapshot["operations"]
+    assert operations["Memory.save"]["count"] == 1
+    assert operations["Memory.save_many"]["bytes"] == 3
+    assert operations["Storage.hash"]["count"] == 1
+    stages = snapshot["stages"]
+    compressed = stages["Compression.forward"]
+    assert compressed["bytes_in"] == stages["Pickling.forward"]["bytes_out"]
+    assert compressed["ratio"] < 1
+    assert stages["Compression.backward"]["count"] == 1
+    recorder.reset()
+    assert recorder.snapshot() == dict(operations={}, stages={}, caches={})
+
+
+def test_uninstrumented():
+    keeper = Memory()
+    storage = Storage(keeper)
+    assert storage._keeper is keeper
+    assert storage.compression._conveyor._instrument is None
+
+
+def test_measured_keeper():
+    calls = []
+
+    class Counting(Instrument):
+        def operation(self, component, name, seconds, size):
+            calls.append((component, name, size))
+
+    keeper = Measured(Memory(), Counting())
+    keeper.save("key", b"data")
+    assert keeper.load("key") == b"data"
+    assert calls == [("Memory", "save", 4), ("Memory", "load", 4)]
+
+
+def test_caches():
+    recorder = Recorder()
+    cache = CacheMemory(Memory(), instrument=recorder)
+    cache._src.save("key", b"data")
+    cache.load("key")
+    cache.load("key")
+    assert recorder.snapshot()["caches"]["CacheMemory[0]"] == dict(hits=1, misses=1)
+
+    recorder.reset()
+    tiers = [Memory(), Memory()]
+    store = TieredStore(tiers, instrument=recorder)
+    tiers[1].save("key", b"data")
+    store.load("key")
+    store.load("key")
+    with pytest.raises(KeyError):
+        store.load("missing")
+    caches = recorder.snapshot()["caches"]
+    assert caches["TieredStore[0]"]["hits"] == 1
+    assert caches["TieredStore[1]"]["hits"] == 1
+    assert caches["TieredStore[2]"]["misses"] == 1
+
+
+@pytest.mark.parametrize(
+    "instrument, module",
+    [
+        (PrometheusInstrument, "prometheus_client"),
+        (OpenTelemetryInstrument, "opentelemetry"),
+    ],
+)
+def test_optional_instruments(instrument, module):
+    try:
+        __import__(module)
+    except ImportError:
+        with pytest.raises(ImportError, match="install"):
+            instrument()
+    else:
+        assert isinstance(instrument(), Instrument)
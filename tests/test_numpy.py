@@ -0,0 +1,44 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from redast import NumpyArray
+
+
+def _pack(packager, array):
+    return packager.forward(array)
+
+
+@pytest.mark.parametrize("delta", [False, True])
+@pytest.mark.parametrize("shuffle", [False, True])
+@pytest.mark.parametrize(
+    "array",
+    [
+        np.arange(12, dtype=np.int32).reshape(3, 4),
+        np.asfortranarray(np.linspace(0, 1, 20).reshape(4, 5)),
+        np.array([], dtype=np.float16),
+        np.array([(1, 2.0)], dtype=[("a", "<i2"), ("b", ">f8")]),
+    ],
+)
+def test_round_trip(array, delta, shuffle):
+    packager = NumpyArray(delta=delta, shuffle=shuffle)
+    loaded = NumpyArray().backward(packager.forward(array))
+    assert loaded.dtype == array.dtype
+    assert np.array_equal(loaded, array)
+    with pytest.raises(TypeError):
+        packager.forward(np.array([1, None], dtype=object))
+
+
+def test_pickling():
+    packager = pickle.loads(pickle.dumps(NumpyArray(delta=True, shuffle=True)))
+    array = np.arange(100)
+    assert np.array_equal(packager.backward(packager.forward(array)), array)
+    with ProcessPoolExecutor(1) as executor:
+        packed = executor.submit(_pack, packager, array).result()
+    assert np.array_equal(packager.backward(packed), array)
@@ -0,0 +1,155 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import gc
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from redast import CachePack, Memory, Pack
+
+
+def test_reopen(tmp_path):
+    pack = Pack(tmp_path, create=True, segment_size=100)
+    for i in range(20):
+        pack.save(f"key-{i}", bytes([i]) * 10)
+    pack.save("key-0", b"new")
+    pack.delete("key-1")
+    assert pack.stats["segments"] > 1
+    pack.close()
+
+    pack = Pack(tmp_path)
+    assert pack.load("key-0") == b"new"
+    assert not pack.exists("key-1")
+    assert pack.load("key-19") == bytes([19]) * 10
+    assert len(list(pack.keys())) == 19
+    pack.close()
+
+
+def test_replay_without_close(tmp_path):
+    pack = Pack(tmp_path, create=True)
+    pack.save("key", b"data")
+    pack.delete_many(["key"])
+    pack.save_many([("other", b"other")])
+    # the index is written only on close, the records are replayed instead
+    pack._file.flush()
+    reopened = Pack(tmp_path)
+    assert list(reopened.keys()) == ["other"]
+    assert reopened.load("other") == b"other"
+    reopened.close()
+
+
+def test_torn_tail(tmp_path):
+    pack = Pack(tmp_path, create=True)
+    pack.save("kept", b"kept")
+    pack.close()
+    path = next(tmp_path.glob("*.seg"))
+    size = path.stat().st_size
+    with open(path, "ab") as file:
+        file.write(b"RDPK\x00 torn record")
+
+    with pytest.warns(UserWarning):
+        pack = Pack(tmp_path)
+    assert path.stat().st_size == size
+    assert pack.load("kept") == b"kept"
+    pack.save("after", b"after")
+    pack.close()
+    assert Pack(tmp_path).load("after") == b"after"
+
+
+def test_compact(tmp_path):
+    pack = Pack(tmp_path, create=True, segment_size=1000, compact_ratio=0.5)
+    for i in range(100):
+        pack.save(f"key-{i}", os.urandom(100))
+    kept = {f"key-{i}": pack.load(f"key-{i}") for i in range(0, 100, 10)}
+    pack.delete_many([f"key-{i}" for i in range(100) if f"key-{i}" not in kept])
+    before = pack.stats
+
+    assert pack.compact() == len(kept)
+    after = pack.stats
+    assert after["bytes"] < before["bytes"] // 4
+    assert after["live_bytes"] == before["live_bytes"]
+    assert {key: pack.load(key) for key in pack.keys()} == kept
+    pack.close()
+
+    pack = Pack(tmp_path)
+    assert {key: pack.load(key) for key in pack.keys()} == kept
+    pack.close()
+
+
+def test_compact_keeps_tombstones(tmp_path):
+    pack = Pack(tmp_path, create=True, segment_size=250, compact_ratio=0.9)
+    # segments: first, second | deleted, alive | tombstone, temp, temp2
+    pack.save_many([("first", b"x" * 100), ("second", b"x" * 130)])
+    pack.save_many([("deleted", b"x" * 100), ("alive", b"x" * 130)])
+    pack.delete("deleted")
+    pack.save_many([("temp", b"x" * 100), ("temp2", b"x" * 100)])
+    pack.delete_many(["temp", "temp2"])
+    assert pack.compact() == 0
+    assert pack.stats["segments"] == 3
+    pack.close()
+    # the tombstone must survive as long as the deleted record does
+    os.remove(tmp_path / "index")
+    pack = Pack(tmp_path)
+    assert sorted(pack.keys()) == ["alive", "first", "second"]
+    pack.close()
+
+
+def test_background(tmp_path):
+    pack = Pack(tmp_path, create=True, segment_size=100, background=True)
+    for i in range(10):
+        pack.save(f"key-{i}", b"x" * 100)
+    pack.delete_many([f"key-{i}" for i in range(9)])
+    deadline = time.monotonic() + 5
+    while pack.stats["bytes"] > 600 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pack.stats["bytes"] <= 600
+    assert pack.load("key-9") == b"x" * 100
+    pack.close()
+
+
+def test_concurrent_compaction(tmp_path, recwarn):
+    pack = Pack(tmp_path, create=True, segment_size=100, background=True)
+    for round in range(20):
+        for i in range(10):
+            pack.save(f"key-{i}", bytes([round]) * 100)
+        pack.delete_many([f"key-{i}" for i in range(9)])
+        # a manual compaction races the one of the background worker
+        with ThreadPoolExecutor(2) as executor:
+            for future in [executor.submit(pack.compact) for _ in range(2)]:
+                future.result()
+        assert pack.load("key-9") == bytes([round]) * 100
+    pack.close()
+    # failures of the background worker are only warned about
+    assert not [w for w in recwarn if "compaction" in str(w.message)]
+    pack = Pack(tmp_path)
+    assert list(pack.keys()) == ["key-9"]
+    pack.close()
+
+
+def test_cache_pack(tmp_path):
+    src = Memory()
+    cache = CachePack(src, tmp_path, create=True, max_entries=2)
+    for i in range(4):
+        cache.save(f"key-{i}", bytes([i]))
+        cache.load(f"key-{i}")
+    assert [cache.load(f"key-{i}") for i in range(4)] == [bytes([i]) for i in range(4)]
+    assert cache.stats["hits"] == 4
+
+
+def test_del_never_raises(tmp_path, monkeypatch):
+    unraisable = []
+    monkeypatch.setattr(sys, "unraisablehook", unraisable.append)
+    pack = Pack(tmp_path, create=True)
+
+    def close():
+        raise OSError("closed at shutdown")
+
+    pack.close = close
+    del pack
+    gc.collect()
+    assert unraisable == []
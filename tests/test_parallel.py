@@ -0,0 +1,46 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import pickle
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from redast import Memory, Recorder, Storage
+
+CHAINS = ["pickling", "compression.pickling", "encryption.compression.pickling"]
+EXECUTORS = dict(thread=ThreadPoolExecutor, process=ProcessPoolExecutor)
+
+
+def chain(storage, names: str):
+    for name in names.split("."):
+        storage = getattr(storage, name)
+    return storage
+
+
+@pytest.fixture(params=list(EXECUTORS), scope="module")
+def executor(request):
+    with EXECUTORS[request.param](2) as executor:
+        yield executor
+
+
+@pytest.mark.parametrize("names", CHAINS)
+def test_batch(executor, names):
+    storage = Storage(Memory(), executor=executor, window=8)
+    pipe = chain(storage, names)
+    data = [dict(item=i, payload=b"x" * i) for i in range(50)]
+    keys = pipe.push_many(data)
+    # parallel packing gives the same keys in the same order
+    assert keys == [chain(storage, names).hash(item) for item in data]
+    assert pipe.load_many(keys) == data
+    assert pipe.save_many(zip([f"key{i}" for i in range(3)], data)) == [True] * 3
+    assert pipe.load_many([f"key{i}" for i in range(3)]) == data[:3]
+
+
+def test_instrumented(executor):
+    recorder = Recorder()
+    pipe = Storage(Memory(), executor=executor, instrument=recorder).pickling
+    assert pipe.load_many(pipe.push_many(list(range(10)))) == list(range(10))
+    conveyor = pickle.loads(pickle.dumps(pipe._conveyor))
+    assert conveyor._instrument is None
@@ -0,0 +1,49 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+from redast import Compression, Memory, Pickling, Storage
+
+
+def test_pipes_are_cached():
+    storage = Storage(Memory())
+    assert storage.compression is storage.compression
+    assert storage.compression.pickling is storage.compression.pickling
+    assert storage.compression(level=9) is storage.compression(level=9)
+    assert storage.compression(level=9) is not storage.compression(level=1)
+    # unhashable arguments build a new pipe every time
+    dictionary = bytearray(b"dictionary")
+    assert storage.compression(codec="zstd", dictionary=dictionary) is not (
+        storage.compression(codec="zstd", dictionary=dictionary)
+    )
+
+
+def test_fused_conveyor():
+    storage = Storage(Memory())
+    pipe = storage.encryption.compression.pickling
+    packers = [type(packer) for packer in pipe._conveyor._packers]
+    assert packers[:2] == [Pickling, Compression] and pipe._base is storage
+    key = pipe.push({"a": 1})
+    # every pipe of the chain sees the same data
+    assert storage.encryption.compression.load(key) == Pickling().forward({"a": 1})
+    assert pipe.load(key) == {"a": 1}
+
+
+def test_pipes_of_different_storages():
+    first, second = Storage(Memory()), Storage(Memory())
+    assert first.pickling is not second.pickling
+    assert first.pickling.push([1]) == second.pickling.push([1])
+
+
+def test_pipe_cache_is_bounded():
+    storage = Storage(Memory())
+    first = storage.encoding(encoding="name-0")
+    for i in range(1, 200):
+        storage.encoding(encoding=f"name-{i}")
+    assert len(storage._pipes) <= 128
+    assert storage.encoding(encoding="name-0") is not first
+    # recently used pipes stay cached
+    pipe = storage.encoding(encoding="utf-8")
+    for i in range(200):
+        storage.encoding(encoding=f"name-{i}")
+        assert storage.encoding(encoding="utf-8") is pipe
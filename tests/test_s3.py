@@ -0,0 +1,104 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import os
+import pickle
+
+import pytest
+
+from redast import S3, LocalServer
+
+PART = 5 * 2**20
+
+
+@pytest.fixture
+def server():
+    with LocalServer() as server:
+        yield server
+
+
+def test_objects(server):
+    keeper = S3(server.url, "bucket", prefix="p/")
+    assert keeper.save("key", b"data")
+    assert keeper.save("empty", b"")
+    assert keeper.exists("key") and not keeper.exists("missing")
+    assert keeper.load("key") == b"data"
+    assert keeper.load("empty") == b""
+    assert keeper.load_many(["key", "empty"]) == [b"data", b""]
+    with pytest.raises(KeyError):
+        keeper.load("missing")
+    assert sorted(keeper.keys()) == ["empty", "key"]
+    assert dict(keeper.scan("k")) == {"key": 4}
+    assert keeper.delete("key") and not keeper.delete("key")
+    clone = pickle.loads(pickle.dumps(keeper))
+    assert clone.load("empty") == b""
+
+
+def test_multipart(server):
+    keeper = S3(server.url, "bucket", part_size=PART, workers=2)
+    data = os.urandom(2 * PART + 10)
+    keeper.save("key", data)
+    assert server.requests["POST"] == 2
+    assert keeper.load("key") == data
+    assert keeper.etag("key").endswith('-3"')
+    chunks = [data[i : i + 2**20] for i in range(0, len(data), 2**20)]
+    keeper.save_stream("stream", chunks)
+    assert b"".join(keeper.load_stream("stream", 3 * 2**20)) == data
+
+
+def test_part_size(server):
+    with pytest.raises(ValueError):
+        S3(server.url, "bucket", part_size=PART - 1)
+    keeper = S3(server.url, "bucket", part_size=PART)
+    # the server rejects small parts just as S3 does
+    keeper._part_size = 2**20
+    assert not keeper.save("key", os.urandom(2**20 + 1))
+    assert not keeper.exists("key")
+    assert server._server.uploads == {}
+
+
+def test_failed_abort(server, monkeypatch):
+    keeper = S3(server.url, "bucket")
+    request = keeper._request
+
+    def failing(method, *args, **kwargs):
+        if method == "DELETE":
+            raise OSError("abort failed")
+        return request(method, *args, **kwargs)
+
+    monkeypatch.setattr(keeper, "_request", failing)
+    # the error of the upload is raised, not the one of its abort
+    with pytest.raises(OSError, match="EntityTooSmall"):
+        keeper._upload("key", [b"small", b"last"])
+
+
+def test_retries(server):
+    keeper = S3(server.url, "bucket", backoff=0.001)
+    keeper.save("key", b"data")
+    server.fail(2)
+    assert keeper.load("key") == b"data"
+    server.fail(3, status=500)
+    with pytest.raises(OSError):
+        S3(server.url, "bucket", retries=2, backoff=0.001).load("key")
+
+    # failed saves return False, as in any other keeper
+    keeper = S3(server.url, "bucket", retries=0, cache_entries=1)
+    keeper.load("key")
+    server.fail(1)
+    assert not keeper.save("key", b"new")
+    server.fail(1)
+    assert keeper.save_many({"key": b"new", "other": b"other"}).count(False) == 1
+    server.fail(1)
+    assert not keeper.save_stream("stream", [b"data"])
+
+
+def test_cache(server):
+    keeper = S3(server.url, "bucket", cache_entries=1)
+    keeper.save("key", b"data")
+    assert keeper.load("key") == b"data"
+    S3(server.url, "bucket").save("key", b"new")
+    assert keeper.load("key") == b"new"
+    before = server.requests["GET"]
+    assert keeper.load("key") == b"new"
+    assert server.requests["GET"] == before + 1
@@ -0,0 +1,86 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import gc
+import os
+import pickle
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from redast import DriveTemp, SqliteNativeTemp, SqliteTemp
+from redast.tool import SharedDirectory
+
+
+def _save(keeper, key, data):
+    keeper.save(key, data)
+    return keeper.load(key)
+
+
+def test_references():
+    shared = SharedDirectory()
+    path = Path(shared.name)
+    clone = pickle.loads(pickle.dumps(shared))
+    assert clone.name == shared.name
+    shared.cleanup()
+    assert path.exists()
+    clone.cleanup()
+    assert not path.exists()
+
+
+def test_dead_references():
+    shared = SharedDirectory()
+    path = Path(shared.name)
+    # the pid of a process that has exited
+    dead = subprocess.run(
+        [sys.executable, "-c", "import os; print(os.getpid())"],
+        capture_output=True,
+        check=True,
+    )
+    refs = path.parent / "refs"
+    with open(refs, "a") as file:
+        file.write(f"\n{int(dead.stdout)}:1")
+    shared.cleanup()
+    assert not path.exists()
+
+
+@pytest.mark.parametrize("temp", [DriveTemp, SqliteTemp])
+def test_reference(temp):
+    keeper = temp(share="reference")
+    keeper.save("key", b"data")
+    for _ in range(100):
+        keeper.save(os.urandom(8).hex(), os.urandom(1000))
+    assert len(pickle.dumps(keeper)) < 1000
+    with ProcessPoolExecutor(1) as executor:
+        assert executor.submit(_save, keeper, "other", b"other").result() == b"other"
+    assert keeper.load("other") == b"other"
+    assert keeper.load("key") == b"data"
+    path = Path(keeper._temp.name)
+    del keeper
+    assert not path.exists()
+
+
+@pytest.mark.parametrize("temp", [DriveTemp, SqliteTemp])
+def test_copy(temp):
+    keeper = temp()
+    keeper.save("key", b"data")
+    with ProcessPoolExecutor(1) as executor:
+        assert executor.submit(_save, keeper, "other", b"other").result() == b"other"
+    assert keeper.load("key") == b"data"
+    assert not keeper.exists("other")
+    with pytest.raises(ValueError):
+        temp(share="link")
+
+
+def test_failed_init(monkeypatch):
+    unraisable = []
+    monkeypatch.setattr(sys, "unraisablehook", unraisable.append)
+    for temp in (DriveTemp, SqliteTemp, SqliteNativeTemp):
+        with pytest.raises(ValueError):
+            temp(share="link")
+    gc.collect()
+    assert unraisable == []
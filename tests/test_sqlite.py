@@ -0,0 +1,93 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from redast import SqliteNative, SqliteNativeTemp
+
+
+def _load(keeper, key):
+    return keeper.load(key)
+
+
+def test_wal(tmp_path):
+    keeper = SqliteNative(tmp_path / "wal.db", create=True, synchronous="full")
+    assert keeper._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert keeper._conn.execute("PRAGMA synchronous").fetchone()[0] == 2
+    with pytest.raises(ValueError):
+        SqliteNative(tmp_path / "wal.db", synchronous="sometimes")
+    with pytest.raises(AssertionError):
+        SqliteNative(tmp_path / "missing.db")
+    keeper.close()
+
+
+def test_threads(tmp_path):
+    keeper = SqliteNative(tmp_path / "threads.db", create=True)
+
+    def write(n):
+        keeper.save_many((f"{n}-{i}", bytes([n])) for i in range(100))
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(list(keeper.keys())) == 400
+    assert keeper.load("3-99") == b"\x03"
+    assert len(keeper._connections) == 5
+    keeper.close()
+    assert keeper.load("0-0") == b"\x00"
+
+
+def test_batch_is_one_transaction(tmp_path):
+    keeper = SqliteNative(tmp_path / "batch.db", create=True)
+    keeper.save("key", b"old")
+    with pytest.raises(AssertionError):
+        keeper.save_many([("key", b"new"), ("other", "not bytes")])
+    assert keeper.load("key") == b"old"
+    assert not keeper.exists("other")
+    with pytest.raises(KeyError):
+        keeper.load_many(["key", "other"])
+    assert keeper.delete_many(["key", "other"]) == [True, False]
+    keeper.close()
+
+
+def test_blob_stream(tmp_path):
+    keeper = SqliteNative(tmp_path / "blob.db", create=True, blob_size=10)
+    data = bytes(range(256)) * 4
+    chunks = (data[i : i + 100] for i in range(0, len(data), 100))
+    assert keeper.save_stream("key", chunks)
+    assert keeper.load("key") == data
+    assert b"".join(keeper.load_stream("key", 33)) == data
+    assert list(keeper.scan()) == [("key", len(data))]
+    keeper.close()
+
+
+def test_pickle(tmp_path):
+    keeper = SqliteNative(tmp_path / "pickle.db", create=True)
+    keeper.save("key", b"data")
+    clone = pickle.loads(pickle.dumps(keeper))
+    assert clone._path == keeper._path
+    assert clone.load("key") == b"data"
+    with ProcessPoolExecutor(1) as executor:
+        assert executor.submit(_load, keeper, "key").result() == b"data"
+    clone.close()
+    keeper.close()
+
+
+@pytest.mark.parametrize("share", ["copy", "reference"])
+def test_temp(share):
+    keeper = SqliteNativeTemp(share=share)
+    keeper.save("key", b"data")
+    clone = pickle.loads(pickle.dumps(keeper))
+    assert clone.load("key") == b"data"
+    clone.save("other", b"other")
+    # only a reference shares the database with the original
+    assert keeper.exists("other") == (share == "reference")
+    with pytest.raises(ValueError):
+        SqliteNativeTemp(share="link")
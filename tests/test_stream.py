@@ -0,0 +1,51 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import os
+
+import pytest
+
+from redast import Storage, load_stream, save_stream
+
+DATA = os.urandom(3 * 2**20 + 123)
+CHAINS = ["compression", "encryption", "encryption.compression"]
+
+
+def chunked(data: bytes, size: int = 2**16):
+    return (data[i : i + size] for i in range(0, len(data), size))
+
+
+def test_keeper_stream(keeper):
+    assert save_stream(keeper, "key", chunked(DATA))
+    assert b"".join(load_stream(keeper, "key", 2**20)) == DATA
+
+
+def test_push_stream(keeper):
+    storage = Storage(keeper)
+    key = storage.push_stream(chunked(DATA))
+    assert key == storage.hash(DATA)
+    assert b"".join(storage.load_stream(key, 2**18)) == DATA
+
+
+@pytest.mark.parametrize("chain", CHAINS)
+def test_pipe_stream(keeper, chain):
+    pipe = Storage(keeper)
+    for name in chain.split("."):
+        pipe = getattr(pipe, name)
+    key = pipe.push_stream(chunked(DATA))
+    assert pipe.load(key) == DATA
+    assert b"".join(pipe.load_stream(key)) == DATA
+    # streamed and whole objects are packed the same way
+    assert pipe.push(DATA) == key
+
+
+def test_link_stream(keeper):
+    link = Storage(keeper).compression.link(b"stream")
+    link.push_stream(chunked(DATA))
+    assert b"".join(link.load_stream()) == DATA
+
+
+def test_stream_unsupported(keeper):
+    with pytest.raises(TypeError):
+        Storage(keeper).pickling.push_stream(chunked(DATA))
@@ -0,0 +1,88 @@
+# The MIT License (MIT)
+# Copyright (c) 2022 Vladislav A. Proskurov
+# see LICENSE for full details
+
+import pytest
+
+from redast import Drive, Memory, Recorder, TieredStore
+
+
+def test_promotion(tmp_path):
+    top, middle, last = Memory(), Drive(tmp_path, create=True), Memory()
+    last.save("key", b"data")
+    store = TieredStore([top, middle, last])
+    assert store.load("key") == b"data"
+    assert top.exists("key") and not middle.exists("key")
+    assert store.load("key") == b"data"
+    assert store.stats["hits"] == [1, 0, 1]
+    assert store.stats["promotions"] == 1
+    with pytest.raises(KeyError):
+        store.load("missing")
+    assert store.stats["misses"] == 1
+
+
+def test_demotion():
+    top, middle, last = Memory(), Memory(), Memory()
+    store = TieredStore([top, middle, last], max_entries=[2, 4])
+    store.save_many((f"key-{i}", bytes([i])) for i in range(4))
+    assert sorted(top.keys()) == ["key-2", "key-3"]
+    assert sorted(middle.keys()) == ["key-0", "key-1"]
+    assert store.load_many(["key-0", "key-3"]) == [b"\x00", b"\x03"]
+    assert store.stats["hits"] == [1, 1, 0]
+    # a newer object replaces the copy in the middle tier
+    store.save("key-0", b"new")
+    assert not middle.exists("key-0")
+    assert store.load("key-0") == b"new"
+
+
+def test_write_back():
+    top, last = Memory(), Memory()
+    store = TieredStore([top, last], write="back", max_entries=[2])
+    store.save_many((f"key-{i}", bytes([i])) for i in range(3))
+    # the evicted object was written back, the others are still dirty
+    assert list(last.keys()) == ["key-0"]
+    assert store.stats["dirty"] == 2
+    assert sorted(store.keys()) == ["key-0", "key-1", "key-2"]
+    assert dict(store.scan("key-2")) == {"key-2": 1}
+    assert store.flush() == 2
+    assert sorted(last.keys()) == ["key-0", "key-1", "key-2"]
+    assert store.stats["dirty"] == 0
+
+    store.save("key-3", b"\x03")
+    assert store.delete("key-3")
+    assert store.flush() == 0
+    assert not store.exists("key-3")
+
+
+def test_scan_without_loading():
+    class Counting(Memory):
+        loads = 0
+
+        def load(self, key):
+            Counting.loads += 1
+            return super().load(key)
+
+    store = TieredStore([Counting(), Memory()], write="back")
+    store.save_many({"a": b"xy", "b": [b"z" * 100]})
+    sizes = dict(store.scan())
+    assert sizes["a"] == 2 and sizes["b"] > 100
+    assert Counting.loads == 0
+
+
+def test_instrument():
+    recorder = Recorder()
+    store = TieredStore([Memory(), Memory()], instrument=recorder)
+    store.save("key", b"data")
+    store.load("key")
+    with pytest.raises(KeyError):
+        store.load("missing")
+    assert store.stats["hits"] == [1, 0]
+
+
+def test_arguments():
+    with pytest.raises(ValueError):
+        TieredStore([Memory()])
+    with pytest.raises(ValueError):
+        TieredStore([Memory(), Memory()], write="around")
+    with pytest.raises(ValueError):
+        TieredStore([Memory(), Memory()], max_entries=[1, 1])